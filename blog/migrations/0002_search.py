@@ -0,0 +1,49 @@
+# Generated by Django 5.0.3 on 2026-10-19 07:59
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+# Поисковый вектор обновляется триггером при любой записи, в том числе update()
+BLOG_TRIGGER = """
+CREATE FUNCTION blog_blog_search_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('russian', coalesce(NEW.title, '')), 'A') ||
+        setweight(to_tsvector('russian', coalesce(NEW.description, '')), 'B');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER blog_blog_search_update
+    BEFORE INSERT OR UPDATE OF title, description ON blog_blog
+    FOR EACH ROW EXECUTE FUNCTION blog_blog_search_update();
+
+UPDATE blog_blog SET title = title;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='blog',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(blank=True, editable=False, null=True, verbose_name='поисковый вектор'),
+        ),
+        migrations.AddIndex(
+            model_name='blog',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='blog_search_idx'),
+        ),
+        migrations.RunSQL(
+            BLOG_TRIGGER,
+            reverse_sql="""
+                DROP TRIGGER blog_blog_search_update ON blog_blog;
+                DROP FUNCTION blog_blog_search_update();
+            """,
+        ),
+    ]
@@ -1,3 +1,5 @@
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
 
 from config.settings import NULLABLE
@@ -9,6 +11,8 @@ class Blog(models.Model):
     image = models.ImageField(upload_to='blog/', verbose_name='изображение', **NULLABLE)
     views_count = models.IntegerField(default=0, verbose_name='количество просмотров')
     published_date = models.DateTimeField(verbose_name='дата публикации', auto_now_add=True)
+    # Заполняется триггером базы данных из title и description
+    search_vector = SearchVectorField(verbose_name='поисковый вектор', editable=False, **NULLABLE)
 
     def __str__(self):
         return f'Название блога: {self.title}'
@@ -16,3 +20,6 @@ class Blog(models.Model):
     class Meta:
         verbose_name = 'Блог'
         verbose_name_plural = 'Блоги'
+        indexes = [
+            GinIndex(fields=['search_vector'], name='blog_search_idx'),
+        ]
@@ -0,0 +1,15 @@
+from django import template
+
+from blog.thumbnails import thumbnail_url
+
+register = template.Library()
+
+
+@register.simple_tag
+def thumbnail(field_file, size='small'):
+    """
+    Возвращает адрес уменьшенной копии изображения.
+
+    Пример: <img src="{% thumbnail object.image 'small' %}">
+    """
+    return thumbnail_url(field_file, size)
@@ -0,0 +1,139 @@
+"""
+Уменьшенные копии изображений блога и аватаров.
+
+Варианты хранятся рядом с оригиналом (blog/photo.jpg -> blog/photo.small.jpg)
+и создаются лениво: при первом запросе через представление thumbnail или заранее,
+в фоновом потоке после загрузки файла. Вариант считается устаревшим, если
+оригинал изменен позже него; адрес варианта содержит время изменения оригинала,
+поэтому его можно кешировать в браузере бессрочно.
+"""
+import os
+import tempfile
+
+from django.core.files.storage import default_storage
+from django.db.models.signals import post_save
+from django.urls import reverse
+from PIL import Image, ImageOps
+
+from blog.models import Blog
+from mailing.buffers import BatchBuffer
+
+# Максимальные размеры вариантов (ширина, высота); пропорции сохраняются
+SIZES = {
+    'small': (400, 400),
+    'medium': (1200, 1200),
+    'avatar': (128, 128),
+}
+# Каталоги загрузок, из которых разрешено строить варианты
+SOURCE_DIRS = ('blog/', 'users/')
+JPEG_QUALITY = 85
+
+
+def variant_name(name, size):
+    """Возвращает имя файла варианта size для оригинала name."""
+    stem, ext = os.path.splitext(name)
+    return f'{stem}.{size}{ext}'
+
+
+def is_source(name):
+    """Проверяет, что из файла name можно строить варианты."""
+    return name.startswith(SOURCE_DIRS) and not any(
+        os.path.splitext(os.path.splitext(name)[0])[1] == f'.{size}' for size in SIZES
+    )
+
+
+def source_version(name):
+    """Возвращает версию оригинала - время его изменения - или None, если файла нет."""
+    try:
+        return int(os.stat(default_storage.path(name)).st_mtime)
+    except OSError:
+        return None
+
+
+def is_fresh(name, size):
+    """Проверяет, что вариант существует и создан не раньше последнего изменения оригинала."""
+    try:
+        source = os.stat(default_storage.path(name)).st_mtime
+        variant = os.stat(default_storage.path(variant_name(name, size))).st_mtime
+    except OSError:
+        return False
+    return variant >= source
+
+
+def generate(name, size):
+    """
+    Создает вариант size изображения name, если его нет или он устарел.
+
+    Args:
+        name (str): Имя оригинала в хранилище медиафайлов.
+        size (str): Ключ из SIZES.
+
+    Returns:
+        str: Путь к файлу варианта.
+    """
+    path = default_storage.path(variant_name(name, size))
+    if is_fresh(name, size):
+        return path
+
+    with Image.open(default_storage.path(name)) as image:
+        image_format = image.format
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail(SIZES[size])
+        options = {}
+        if image_format == 'JPEG':
+            image = image.convert('RGB')
+            options = {'quality': JPEG_QUALITY, 'optimize': True, 'progressive': True}
+        # Запись во временный файл и переименование: параллельный запрос не увидит недописанный файл.
+        # Имя уникально и для потоков одного процесса
+        fd, tmp_path = tempfile.mkstemp(suffix='.tmp', dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, 'wb') as tmp:
+                image.save(tmp, format=image_format, **options)
+            # mkstemp создает файл с правами 0600, а варианты может отдавать веб-сервер
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+    return path
+
+
+def thumbnail_url(field_file, size):
+    """
+    Возвращает адрес варианта size для файла из ImageField.
+
+    Returns:
+        str: Адрес варианта с версией оригинала или пустая строка, если файла нет.
+    """
+    if not field_file or size not in SIZES:
+        return ''
+    version = source_version(field_file.name)
+    if version is None:
+        return ''
+    return f'{reverse("blog:thumbnail", args=[size, field_file.name])}?v={version}'
+
+
+def generate_batch(batch):
+    for name in set(batch):
+        for size in SIZES:
+            try:
+                generate(name, size)
+            except (OSError, ValueError, Image.DecompressionBombError):
+                # Поврежденный или неподдерживаемый файл: вариант не создается, отдается оригинал
+                continue
+
+
+pending = BatchBuffer(generate_batch, interval=1.0, batch_size=20, maxlen=10_000)
+
+
+def on_image_saved(sender, instance, **kwargs):
+    """Ставит варианты загруженного изображения в очередь фоновой генерации."""
+    field_file = instance.image if sender is Blog else instance.avatar
+    if field_file and is_source(field_file.name):
+        pending.append(field_file.name)
+
+
+def connect_signals():
+    """Подключает генерацию вариантов после сохранения; вызывается из BlogConfig.ready()."""
+    post_save.connect(on_image_saved, sender=Blog, dispatch_uid='blog.thumbnails.blog')
+    post_save.connect(on_image_saved, sender='users.User', dispatch_uid='blog.thumbnails.user')
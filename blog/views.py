@@ -1,9 +1,17 @@
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.http import Http404
+from django.core.cache import cache
+from django.core.exceptions import SuspiciousFileOperation
+from django.db.models import F
+from django.http import FileResponse, Http404
 from django.urls import reverse_lazy, reverse
-from django.views.generic import CreateView, UpdateView, ListView, DetailView, DeleteView
+from django.views.generic import View, CreateView, UpdateView, DeleteView
+
+from PIL import Image
 
 from blog.models import Blog
+from blog.thumbnails import SIZES, generate, is_source
+from mailing.search import ranked, search_response
+from config.asyncviews import arender
 
 
 class BlogCreateView(LoginRequiredMixin, CreateView):
@@ -62,44 +70,56 @@ class BlogUpdateView(LoginRequiredMixin, UpdateView):
         return self.object
 
 
-class BlogListView(ListView):
+class BlogListView(View):
     """
     Представление для отображения списка постов в блоге.
 
+    Асинхронное: список постов загружается через асинхронный ORM до рендеринга шаблона
+    и кешируется на cache_timeout секунд асинхронными вызовами кеша.
+
     Атрибуты:
-        model (Blog): Модель, с которой будет работать это представление.
+        template_name (str): Имя шаблона для отображения.
+        cache_timeout (int): Время хранения списка постов в кеше, секунд.
     """
-    model = Blog
+    template_name = 'blog/blog_list.html'
+    cache_key = 'blog_list'
+    cache_timeout = 60
 
-    def get_queryset(self, *args, **kwargs):
+    def get_queryset(self):
         """
         Возвращает набор данных для отображения списка постов.
 
         Может быть переопределено для добавления дополнительных фильтров или сортировки.
         """
-        queryset = super().get_queryset(*args, **kwargs)
-        return queryset
+        return Blog.objects.all()
+
+    async def get(self, request):
+        object_list = await cache.aget(self.cache_key)
+        if object_list is None:
+            object_list = [blog async for blog in self.get_queryset()]
+            await cache.aset(self.cache_key, object_list, self.cache_timeout)
+        return await arender(request, self.template_name, {'object_list': object_list, 'blog_list': object_list})
 
 
-class BlogDetailView(DetailView):
+class BlogDetailView(View):
     """
     Представление для отображения деталей поста в блоге.
 
+    Асинхронное: счетчик просмотров увеличивается одним UPDATE на стороне базы,
+    без чтения и сохранения всего объекта, поэтому одновременные просмотры не теряются.
+
     Атрибуты:
-        model (Blog): Модель, с которой будет работать это представление.
+        template_name (str): Имя шаблона для отображения.
     """
-    model = Blog
-
-    def get_object(self, queryset=None):
-        """
-        Возвращает объект для отображения, увеличивая счетчик просмотров.
+    template_name = 'blog/blog_detail.html'
 
-        Счетчик просмотров увеличивается каждый раз, когда пост отображается.
-        """
-        self.object = super().get_object(queryset)
-        self.object.views_count += 1
-        self.object.save()
-        return self.object
+    async def get(self, request, pk):
+        await Blog.objects.filter(pk=pk).aupdate(views_count=F('views_count') + 1)
+        try:
+            blog = await Blog.objects.aget(pk=pk)
+        except Blog.DoesNotExist:
+            raise Http404
+        return await arender(request, self.template_name, {'object': blog, 'blog': blog})
 
 
 class BlogDeleteView(DeleteView):
@@ -122,3 +142,28 @@ class BlogDeleteView(DeleteView):
         Только администраторы могут удалять посты.
         """
         return self.request.user.is_staff
+
+
+def thumbnail(request, size, name):
+    """
+    Отдает уменьшенную копию изображения, создавая её при первом запросе.
+
+    Адрес варианта содержит версию оригинала (см. thumbnail_url), поэтому ответ
+    кешируется браузером и прокси бессрочно.
+    """
+    if size not in SIZES or not is_source(name):
+        raise Http404
+    try:
+        path = generate(name, size)
+    except (OSError, ValueError, SuspiciousFileOperation, Image.DecompressionBombError):
+        raise Http404
+    response = FileResponse(open(path, 'rb'))
+    response['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
+
+
+def blog_search(request):
+    """
+    Полнотекстовый поиск постов блога (JSON, по страницам).
+    """
+    return search_response(request, Blog.objects.all(), ranked, ('title', 'published_date'))
@@ -0,0 +1,32 @@
+"""
+Вспомогательные функции для асинхронных представлений.
+
+Шаблоны рендерятся синхронно прямо в цикле событий, поэтому все данные для них
+(пользователь, его права, queryset'ы) должны быть получены заранее: любой
+ленивый запрос к базе из шаблона завершится ошибкой SynchronousOnlyOperation.
+"""
+from asgiref.sync import sync_to_async
+from django.shortcuts import render
+
+
+async def arender(request, template_name, context=None):
+    """
+    Асинхронный аналог render.
+
+    Заранее загружает пользователя и его права, чтобы контекстные процессоры
+    auth (user, perms) не обращались к базе во время рендеринга шаблона.
+
+    Args:
+        request (HttpRequest): Текущий запрос.
+        template_name (str): Имя шаблона.
+        context (dict, optional): Контекст шаблона; queryset'ы в нем должны быть уже вычислены.
+
+    Returns:
+        HttpResponse: Ответ с отрендеренным шаблоном.
+    """
+    user = await request.auser()
+    request.user = user
+    if user.is_authenticated:
+        # Права кешируются в объекте пользователя, шаблон берет их из кеша
+        await sync_to_async(user.get_all_permissions)()
+    return render(request, template_name, context)
@@ -0,0 +1,115 @@
+"""
+Постоянные соединения с базой данных и работа через pgbouncer.
+
+Модуль считает открытые процессом соединения и обработанные запросы, чтобы
+видеть, насколько соединения переиспользуются, и предоставляет stream_values -
+потоковое чтение, которое работает и без серверных курсоров (в режиме пулера
+транзакций они недоступны).
+"""
+import os
+import threading
+from collections import Counter
+
+from django.conf import settings
+from django.core.signals import request_started
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+lock = threading.Lock()
+stats = {'requests': 0, 'connections': Counter()}
+
+
+def on_connection_created(sender, connection, **kwargs):
+    with lock:
+        stats['connections'][connection.alias] += 1
+
+
+def on_request_started(sender, **kwargs):
+    with lock:
+        stats['requests'] += 1
+
+
+def connect_signals():
+    """Подключает счетчики; вызывается из MailingConfig.ready()."""
+    connection_created.connect(on_connection_created, dispatch_uid='config.db.connection_created')
+    request_started.connect(on_request_started, dispatch_uid='config.db.request_started')
+
+
+def connection_stats():
+    """
+    Возвращает статистику соединений текущего процесса и сервера PostgreSQL.
+
+    Returns:
+        dict: Количество запросов, открытых соединений по псевдонимам баз,
+        доля запросов, обслуженных уже открытым соединением, и число соединений
+        на стороне сервера для каждой базы.
+    """
+    with lock:
+        requests = stats['requests']
+        opened = dict(stats['connections'])
+    result = {
+        'pid': os.getpid(),
+        'requests': requests,
+        'connections_opened': opened,
+        # Соединения фоновых потоков (полосы отправки, буферы) тоже учитываются, поэтому доля - оценка снизу
+        'reuse_rate': round(max(1 - sum(opened.values()) / requests, 0.0), 3) if requests else None,
+        'server_connections': {},
+        'settings': {},
+    }
+    for alias in settings.DATABASES:
+        db_settings = settings.DATABASES[alias]
+        result['settings'][alias] = {
+            'conn_max_age': db_settings.get('CONN_MAX_AGE', 0),
+            'conn_health_checks': db_settings.get('CONN_HEALTH_CHECKS', False),
+            'pooler_mode': db_settings.get('DISABLE_SERVER_SIDE_CURSORS', False),
+        }
+        if connections[alias].vendor == 'postgresql':
+            with connections[alias].cursor() as cursor:
+                cursor.execute('SELECT count(*) FROM pg_stat_activity WHERE datname = current_database()')
+                result['server_connections'][alias] = cursor.fetchone()[0]
+    return result
+
+
+def estimated_count(model, using='default'):
+    """
+    Возвращает оценку числа строк таблицы модели по статистике PostgreSQL (pg_class.reltuples).
+
+    Оценка обновляется ANALYZE/autovacuum и не требует полного прохода по таблице,
+    в отличие от COUNT(*).
+
+    Returns:
+        int | None: Оценка числа строк или None, если статистики нет или база не PostgreSQL.
+    """
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass', [model._meta.db_table])
+        row = cursor.fetchone()
+    # -1 - таблица еще ни разу не анализировалась
+    return row[0] if row and row[0] >= 0 else None
+
+
+def stream_values(queryset, fields, chunk_size=2000):
+    """
+    Потоково читает строки queryset.values(*fields) пачками по chunk_size.
+
+    С серверными курсорами используется обычный .iterator(). В режиме пулера
+    (DISABLE_SERVER_SIDE_CURSORS) .iterator() загрузил бы весь результат в память,
+    поэтому строки читаются постраничной выборкой по первичному ключу.
+    """
+    pk = queryset.model._meta.pk.attname
+    if not settings.DATABASES[queryset.db].get('DISABLE_SERVER_SIDE_CURSORS'):
+        yield from queryset.values(*fields).iterator(chunk_size=chunk_size)
+        return
+
+    fields = tuple(fields) if pk in fields else (pk, *fields)
+    queryset = queryset.values(*fields).order_by(pk)
+    last = None
+    while True:
+        page = queryset if last is None else queryset.filter(**{f'{pk}__gt': last})
+        rows = list(page[:chunk_size])
+        yield from rows
+        if len(rows) < chunk_size:
+            return
+        last = rows[-1][pk]
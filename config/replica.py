@@ -0,0 +1,108 @@
+"""
+Маршрутизация чтения на реплику PostgreSQL.
+
+Запросы на чтение уходят на реплику только внутри replica_reads() (или в
+представлениях с ReplicaReadMixin); все остальное, включая планировщик рассылок
+и любые записи, работает с основной базой. После собственной записи пользователь
+на REPLICA_PIN_SECONDS секунд закрепляется за основной базой, чтобы сразу видеть
+свои изменения, несмотря на задержку репликации.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+REPLICA = 'replica'
+PIN_COOKIE = 'pin_primary'
+
+read_from_replica = ContextVar('read_from_replica', default=False)
+pinned_to_primary = ContextVar('pinned_to_primary', default=False)
+
+
+@contextmanager
+def replica_reads():
+    """Направляет запросы на чтение внутри блока на реплику, если она настроена."""
+    token = read_from_replica.set(True)
+    try:
+        yield
+    finally:
+        read_from_replica.reset(token)
+
+
+class ReplicaRouter:
+    """
+    Роутер баз данных: чтение внутри replica_reads() - с реплики, остальное - с основной базы.
+    """
+
+    def db_for_read(self, model, **hints):
+        if REPLICA in settings.DATABASES and read_from_replica.get() and not pinned_to_primary.get():
+            return REPLICA
+        return 'default'
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплика содержит те же данные, что и основная база
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == 'default'
+
+
+class ReplicaPinningMiddleware:
+    """
+    Закрепляет пользователя за основной базой после его собственной записи.
+
+    Любой небезопасный запрос (POST, PUT, PATCH, DELETE) ставит короткоживущую cookie;
+    пока она есть, чтение не уходит на реплику. Сессия и база данных для этого не нужны.
+    Работает как с синхронными, так и с асинхронными представлениями.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = pinned_to_primary.set(PIN_COOKIE in request.COOKIES)
+        try:
+            response = self.get_response(request)
+        finally:
+            pinned_to_primary.reset(token)
+        return self.pin(request, response)
+
+    async def __acall__(self, request):
+        token = pinned_to_primary.set(PIN_COOKIE in request.COOKIES)
+        try:
+            response = await self.get_response(request)
+        finally:
+            pinned_to_primary.reset(token)
+        return self.pin(request, response)
+
+    def pin(self, request, response):
+        if request.method not in ('GET', 'HEAD', 'OPTIONS', 'TRACE'):
+            response.set_cookie(PIN_COOKIE, '1', max_age=settings.REPLICA_PIN_SECONDS, httponly=True, samesite='Lax')
+        return response
+
+
+class ReplicaReadMixin:
+    """
+    Миксин для представлений только на чтение (отчеты, списки): запросы идут на реплику.
+
+    Шаблон рендерится внутри блока, чтобы ленивые запросы из шаблона тоже ушли на реплику.
+    """
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return super().dispatch(request, *args, **kwargs)
+        with replica_reads():
+            response = super().dispatch(request, *args, **kwargs)
+            if hasattr(response, 'render') and not getattr(response, 'is_rendered', True):
+                response.render()
+        return response
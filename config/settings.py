@@ -13,6 +13,7 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 from pathlib import Path
 
 from dotenv import load_dotenv
+import json
 import os
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -41,6 +42,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
 
     'mailing',
     'users',
@@ -55,6 +57,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'config.replica.ReplicaPinningMiddleware',
 ]
 
 ROOT_URLCONF = 'config.urls'
@@ -86,10 +89,31 @@ DATABASES = {
         'ENGINE': 'django.db.backends.postgresql',
         'NAME': os.getenv('DB_NAME'),
         'USER': os.getenv('DB_USER'),
-        'PASSWORD': os.getenv('DB_PASS')
+        'PASSWORD': os.getenv('DB_PASS'),
+        # Постоянные соединения с проверкой перед повторным использованием. По умолчанию выключены:
+        # под ASGI (uvicorn) Django не переиспользует соединения между запросами, и каждое открытое
+        # соединение остается висеть. Под WSGI (gunicorn) или с python manage.py run задайте, например, 60
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', 0)),
+        'CONN_HEALTH_CHECKS': True,
+        # Режим pgbouncer (пулинг транзакций): серверные курсоры недоступны
+        'DISABLE_SERVER_SIDE_CURSORS': os.getenv('DB_POOLER_MODE') == 'True',
     }
 }
 
+# Реплика для отчетов и списков (см. config/replica.py)
+if os.getenv('DB_REPLICA_HOST'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'HOST': os.getenv('DB_REPLICA_HOST'),
+        'PORT': os.getenv('DB_REPLICA_PORT', ''),
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['config.replica.ReplicaRouter']
+
+# Сколько секунд после своей записи пользователь читает только с основной базы
+REPLICA_PIN_SECONDS = int(os.getenv('REPLICA_PIN_SECONDS', 5))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -139,16 +163,75 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
-EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
+# Письма распределяются между SMTP-серверами EMAIL_RELAYS (см. mailing/transport.py);
+# если список пуст, используется единственный сервер EMAIL_HOST
+EMAIL_BACKEND = 'mailing.transport.RouterBackend'
 EMAIL_HOST = os.getenv("EMAIL_HOST")
 EMAIL_PORT = os.getenv("EMAIL_PORT")
 EMAIL_HOST_USER = os.getenv("EMAIL_HOST_USER")
 EMAIL_HOST_PASSWORD = os.getenv('EMAIL_HOST_PASSWORD')
 EMAIL_USE_SSL = True
+EMAIL_TIMEOUT = int(os.getenv('EMAIL_TIMEOUT', 10))
+# JSON-список серверов: [{"name": "main", "host": "smtp.yandex.ru", "port": 465, "username": "...",
+# "password": "...", "use_ssl": true, "weight": 3}, ...]
+EMAIL_RELAYS = json.loads(os.getenv('EMAIL_RELAYS') or '[]')
 
 DEFAULT_FROM_EMAIL = EMAIL_HOST_USER
 SERVER_EMAIL = EMAIL_HOST_USER
 
+# Адрес сервиса для ссылок в письмах (отслеживание открытий и переходов)
+SITE_URL = os.getenv('SITE_URL', 'http://127.0.0.1:8000')
+# Период и размер пачки фоновой записи событий отслеживания
+TRACKING_FLUSH_INTERVAL = float(os.getenv('TRACKING_FLUSH_INTERVAL', 2))
+TRACKING_BATCH_SIZE = int(os.getenv('TRACKING_BATCH_SIZE', 1000))
+
+# Подпись писем DKIM: домен, селектор и путь к закрытому ключу в формате PEM
+DKIM_DOMAIN = os.getenv('DKIM_DOMAIN')
+DKIM_SELECTOR = os.getenv('DKIM_SELECTOR')
+DKIM_PRIVATE_KEY_PATH = os.getenv('DKIM_PRIVATE_KEY_PATH')
+
+# Количество временных отказов, после которого адрес попадает в список подавления
+BOUNCE_SOFT_LIMIT = int(os.getenv('BOUNCE_SOFT_LIMIT', 3))
+
+# Планировщик отправки (см. mailing/scheduler.py): писем на единицу веса владельца за круг,
+# одновременных рассылок одного владельца и писем владельца в час (0 - без ограничения).
+# Значения по умолчанию для пользователей без записи SendingQuota
+SCHEDULER_QUANTUM = int(os.getenv('SCHEDULER_QUANTUM', 100))
+SCHEDULER_CONCURRENCY = int(os.getenv('SCHEDULER_CONCURRENCY', 2))
+SCHEDULER_HOURLY_LIMIT = int(os.getenv('SCHEDULER_HOURLY_LIMIT', 0))
+
+# Полосы отправки (см. mailing/lanes.py): потоки, скорость (писем в секунду, 0 - без ограничения)
+# и параметры SMTP-соединения. Служебные письма могут уходить через отдельную учетную запись
+MAIL_LANES = {
+    'transactional': {
+        'workers': int(os.getenv('LANE_TRANSACTIONAL_WORKERS', 2)),
+        'rate': float(os.getenv('LANE_TRANSACTIONAL_RATE', 0)),
+        'connection': {
+            key: value for key, value in {
+                'username': os.getenv('EMAIL_TRANSACTIONAL_HOST_USER'),
+                'password': os.getenv('EMAIL_TRANSACTIONAL_HOST_PASSWORD'),
+            }.items() if value
+        },
+    },
+    'scheduled': {
+        'workers': int(os.getenv('LANE_SCHEDULED_WORKERS', 1)),
+        'rate': float(os.getenv('LANE_SCHEDULED_RATE', 0)),
+    },
+    'bulk': {
+        'workers': int(os.getenv('LANE_BULK_WORKERS', 1)),
+        'rate': float(os.getenv('LANE_BULK_RATE', 0)),
+    },
+}
+# Запуски с аудиторией от этого размера отправляются в полосе bulk
+MAIL_BULK_THRESHOLD = int(os.getenv('MAIL_BULK_THRESHOLD', 10000))
+
+# Сколько часов хранятся ключи доставки (mailing/delivery.py) после начала периода; ключи
+# незавершенных запусков хранятся до их завершения
+DELIVERY_RETENTION_HOURS = int(os.getenv('DELIVERY_RETENTION_HOURS', 24))
+
+# Каталог результатов профилирования python manage.py run --profile/--memory/--timings
+PROFILE_DIR = os.getenv('PROFILE_DIR') or os.path.join(BASE_DIR, 'profiles')
+
 CRONJOBS = [
     ('0 0 * * *', 'services.cron.send_email'),
 ]
@@ -160,6 +243,9 @@ LOGIN_REDIRECT_URL = '/'
 LOGOUT_REDIRECT_URL = '/'
 LOGIN_URL = 'user:login'
 
+# Срок хранения области видимости пользователя в сессии, секунд (см. mailing/permissions.py)
+PERMISSION_SCOPE_TTL = int(os.getenv('PERMISSION_SCOPE_TTL', 300))
+
 CACHE_ENABLED = os.getenv('CACHE_ENABLED') == 'True'
 
 if CACHE_ENABLED:
@@ -1,27 +1,142 @@
 from django.contrib import admin
+from django.core.paginator import Paginator
+from django.utils.functional import cached_property
 
-from mailing.models import Client, Message, Newsletter, Logs
+from config.db import estimated_count
+from mailing import control
+from mailing.models import Client, Message, Newsletter, Logs, Run, Segment, SendingQuota, Suppression
+from mailing.search import ranked, search_clients
+from mailing.segments import refresh_segment
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Пагинатор списков больших таблиц: без фильтров число строк берется из статистики PostgreSQL.
+
+    Точный COUNT(*) выполняется только для отфильтрованных списков и небольших таблиц.
+    """
+    # Меньше этого числа строк точный подсчет дешевле, чем неточность оценки
+    ESTIMATE_THRESHOLD = 100_000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = estimated_count(queryset.model, queryset.db)
+            if estimate is not None and estimate >= self.ESTIMATE_THRESHOLD:
+                return estimate
+        return super().count
+
+
+class SearchVectorAdminMixin:
+    """
+    Поиск в админке по индексу полнотекстового поиска вместо icontains по каждому полю.
+    """
+    search = staticmethod(ranked)
+
+    def get_search_results(self, request, queryset, search_term):
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset, False
+        return self.search(queryset, search_term), False
 
 
 @admin.register(Client)
-class ClientAdmin(admin.ModelAdmin):
+class ClientAdmin(SearchVectorAdminMixin, admin.ModelAdmin):
     list_display = ('fio', 'email',)
     search_fields = ('fio', 'email',)
+    search = staticmethod(search_clients)
 
 
 @admin.register(Message)
-class MessageAdmin(admin.ModelAdmin):
+class MessageAdmin(SearchVectorAdminMixin, admin.ModelAdmin):
     list_display = ('subject', 'body',)
     search_fields = ('subject', 'body',)
 
 
 @admin.register(Newsletter)
 class NewsletterAdmin(admin.ModelAdmin):
-    list_display = ('status', 'periodicity',)
+    list_display = ('status', 'periodicity', 'is_paused', 'rate_limit', 'owner',)
+    # Ограничение скорости меняется прямо в списке и доходит до потоков отправки за CONTROL_TTL секунд
+    list_editable = ('rate_limit',)
+    list_filter = ('status', 'is_paused',)
+    list_select_related = ('owner',)
     search_fields = ('status', 'periodicity',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    actions = ('pause', 'resume', 'abort',)
+
+    @admin.action(description='Приостановить выбранные рассылки')
+    def pause(self, request, queryset):
+        updated = control.pause(queryset)
+        self.message_user(request, f'Приостановлено рассылок: {updated}')
+
+    @admin.action(description='Возобновить выбранные рассылки')
+    def resume(self, request, queryset):
+        updated = control.resume(queryset)
+        self.message_user(request, f'Возобновлено рассылок: {updated}')
+
+    @admin.action(description='Отменить текущие запуски выбранных рассылок')
+    def abort(self, request, queryset):
+        updated = control.abort(queryset)
+        self.message_user(request, f'Отменены запуски рассылок: {updated}')
 
 
 @admin.register(Logs)
 class LogsAdmin(admin.ModelAdmin):
-    list_display = ('attempt', 'attempt_time', 'response',)
-    search_fields = ('client', 'newsletter',)
+    list_display = ('attempt', 'attempt_time', 'response', 'bounce_type', 'client', 'newsletter', 'retry',)
+    list_filter = ('attempt', 'bounce_type',)
+    list_select_related = ('client', 'newsletter',)
+    # Точное совпадение по индексированным полям вместо icontains по связанным объектам
+    search_fields = ('=client__email', '=message_id',)
+    date_hierarchy = 'attempt_time'
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    actions = ('resend_failed',)
+
+    @admin.action(description='Повторить отправку неудачных попыток')
+    def resend_failed(self, request, queryset):
+        updated = queryset.filter(attempt=False, newsletter__isnull=False, client__isnull=False).update(retry=True)
+        self.message_user(request, f'Отмечено для повторной отправки: {updated}. Письма уйдут при следующем запуске рассылок')
+
+
+@admin.register(Suppression)
+class SuppressionAdmin(admin.ModelAdmin):
+    list_display = ('email', 'reason', 'created_at',)
+    list_filter = ('reason',)
+    search_fields = ('email',)
+
+
+@admin.register(Segment)
+class SegmentAdmin(admin.ModelAdmin):
+    list_display = ('name', 'email_domain', 'client_owner', 'refreshed_at',)
+    list_select_related = ('client_owner',)
+    search_fields = ('name',)
+    readonly_fields = ('refreshed_at',)
+    actions = ('refresh',)
+
+    @admin.action(description='Пересчитать состав выбранных сегментов')
+    def refresh(self, request, queryset):
+        for segment in queryset:
+            added, removed = refresh_segment(segment)
+            self.message_user(request, f'{segment}: добавлено {added}, удалено {removed}')
+
+
+@admin.register(Run)
+class RunAdmin(admin.ModelAdmin):
+    list_display = ('newsletter', 'period', 'started_at', 'finished_at', 'recipients_count',)
+    list_select_related = ('newsletter',)
+    date_hierarchy = 'started_at'
+    # Снимок аудитории неизменяем: запуски только просматриваются
+    readonly_fields = ('newsletter', 'period', 'started_at', 'finished_at', 'recipients_count',)
+
+    def has_add_permission(self, request):
+        return False
+
+
+@admin.register(SendingQuota)
+class SendingQuotaAdmin(admin.ModelAdmin):
+    list_display = ('owner', 'weight', 'concurrency', 'hourly_limit',)
+    list_select_related = ('owner',)
+    search_fields = ('=owner__email',)
+    raw_id_fields = ('owner',)
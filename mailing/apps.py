@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class MailingConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'mailing'
+
+    def ready(self):
+        from config import db
+        from mailing import segments
+
+        db.connect_signals()
+        segments.connect_signals()
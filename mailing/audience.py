@@ -0,0 +1,127 @@
+"""
+Аудитория рассылки: выбор получателей, снимок запуска и массовое изменение состава.
+
+В начале каждого запуска получатели копируются в таблицу RunRecipient одним
+INSERT ... SELECT, и отправка читает только этот снимок: изменения клиентов
+рассылки во время запуска не меняют его состав. Добавление и удаление клиентов
+рассылки выполняется одним запросом к промежуточной таблице Newsletter.client,
+без загрузки объектов и построчных INSERT.
+"""
+from django.db import connection, transaction
+from django.db.models import Exists, OuterRef, QuerySet
+from django.db.models.functions import Lower
+
+from mailing.models import Client, Newsletter, Run, RunRecipient, SegmentMember, Suppression
+
+
+def get_recipients(newsletter):
+    """
+    Возвращает клиентов рассылки, на адреса которых разрешена отправка.
+
+    Аудитория - выбранные вручную клиенты и участники сегмента рассылки из
+    материализованной таблицы состава (правила сегмента при отправке не вычисляются).
+    Адреса из списка подавления (отказы, жалобы, ручные блокировки) отсекаются
+    без учета регистра одним анти-джойном (NOT EXISTS) на стороне базы данных.
+    """
+    through = Newsletter.client.through.objects.filter(newsletter_id=newsletter.pk, client_id=OuterRef('pk'))
+    audience = Exists(through)
+    if newsletter.segment_id:
+        members = SegmentMember.objects.filter(segment_id=newsletter.segment_id, client_id=OuterRef('pk'))
+        audience |= Exists(members)
+    # Адреса в списке подавления хранятся в нижнем регистре
+    suppressed = Suppression.objects.filter(email=Lower(OuterRef('email')))
+    return Client.objects.filter(audience).filter(~Exists(suppressed))
+
+
+def as_queryset(clients):
+    """Приводит клиентов (queryset или список id) к queryset'у клиентов."""
+    if isinstance(clients, QuerySet) and clients.model is Client:
+        return clients
+    return Client.objects.filter(pk__in=clients)
+
+
+def insert_clients(table, owner_column, owner_id, clients):
+    """
+    Копирует id клиентов из queryset'а в таблицу связей одним INSERT ... SELECT.
+
+    Args:
+        table (str): Таблица связей с уникальной парой (owner_column, client_id).
+        owner_column (str): Столбец владельца связи (newsletter_id или run_id).
+        owner_id (int): Значение столбца владельца.
+        clients (QuerySet): Клиенты, которых нужно добавить.
+
+    Returns:
+        int: Количество добавленных строк; уже существующие связи пропускаются.
+    """
+    clients_sql, params = clients.values('id').query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {table} ({owner_column}, client_id) '
+            f'SELECT %s, selected.id FROM ({clients_sql}) AS selected '
+            f'ON CONFLICT ({owner_column}, client_id) DO NOTHING',
+            [owner_id, *params],
+        )
+        return cursor.rowcount
+
+
+def add_clients(newsletter, clients):
+    """
+    Добавляет клиентов в рассылку одним запросом.
+
+    Сигнал m2m_changed не отправляется.
+
+    Args:
+        newsletter (Newsletter): Рассылка.
+        clients (QuerySet | Iterable[int]): Клиенты или их id; несуществующие id пропускаются.
+
+    Returns:
+        int: Количество добавленных клиентов.
+    """
+    return insert_clients(Newsletter.client.through._meta.db_table, 'newsletter_id', newsletter.pk, as_queryset(clients))
+
+
+def remove_clients(newsletter, clients):
+    """
+    Удаляет клиентов из рассылки одним DELETE.
+
+    Сигнал m2m_changed не отправляется.
+
+    Returns:
+        int: Количество удаленных связей.
+    """
+    through = Newsletter.client.through.objects.filter(newsletter_id=newsletter.pk)
+    if isinstance(clients, QuerySet):
+        through = through.filter(client_id__in=as_queryset(clients).values('id'))
+    else:
+        through = through.filter(client_id__in=list(clients))
+    return through.delete()[0]
+
+
+@transaction.atomic
+def snapshot(newsletter, clients=None, period=None):
+    """
+    Создает запуск рассылки и фиксирует его аудиторию.
+
+    Args:
+        newsletter (Newsletter): Запускаемая рассылка.
+        clients (QuerySet | None): Id клиентов, которыми нужно ограничить аудиторию
+            (например, для повторной отправки неудачных попыток).
+        period (datetime | None): Окно расписания, за которое отправляется запуск (ключ
+            идемпотентности, см. mailing/delivery.py); по умолчанию - время запуска.
+
+    Returns:
+        Run: Запуск с заполненным снимком получателей.
+    """
+    recipients = get_recipients(newsletter)
+    if clients is not None:
+        recipients = recipients.filter(pk__in=clients)
+    run = Run.objects.create(newsletter=newsletter)
+    run.period = period or run.started_at
+    run.recipients_count = insert_clients(RunRecipient._meta.db_table, 'run_id', run.pk, recipients)
+    Run.objects.filter(pk=run.pk).update(recipients_count=run.recipients_count, period=run.period)
+    return run
+
+
+def run_recipients(run):
+    """Возвращает клиентов из снимка аудитории запуска."""
+    return Client.objects.filter(Exists(RunRecipient.objects.filter(run_id=run.pk, client_id=OuterRef('pk'))))
@@ -0,0 +1,205 @@
+import os
+import re
+from email import message_from_binary_file, message_from_bytes, policy
+from email.utils import parseaddr
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
+from django.db.models.functions import Lower
+from django.utils import timezone
+
+from mailing.models import Logs
+from mailing.services import suppress_emails
+
+STATUS_RE = re.compile(r'([245])\.\d{1,3}\.\d{1,3}')
+
+
+def parse_bounce(message):
+    """
+    Разбирает уведомление о недоставке (DSN, RFC 3464).
+
+    Args:
+        message (email.message.Message): Входящее письмо из почтового ящика для отказов.
+
+    Returns:
+        list[dict]: Описание отказа для каждого получателя с ключами email, message_id,
+        bounce_type ('hard' или 'soft'), status и diagnostic. Пустой список,
+        если письмо не является уведомлением об отказе.
+    """
+    original_id = None
+    recipients = []
+    for part in message.walk():
+        content_type = part.get_content_type()
+        if content_type in ('message/rfc822', 'text/rfc822-headers') and original_id is None:
+            original_id = _original_message_id(part)
+        elif content_type == 'message/delivery-status':
+            recipients.extend(_delivery_status_fields(part))
+
+    # Некоторые серверы не присылают machine-readable часть, только заголовок
+    if not recipients and message.get('X-Failed-Recipients'):
+        for address in message['X-Failed-Recipients'].split(','):
+            recipients.append({'Final-Recipient': address, 'Action': 'failed'})
+
+    bounces = []
+    for fields in recipients:
+        action = fields.get('Action', '').strip().lower()
+        if action not in ('failed', 'delayed'):
+            continue
+        email = parseaddr(fields.get('Final-Recipient', '').split(';')[-1])[1]
+        if not email:
+            continue
+        match = STATUS_RE.search(fields.get('Status', ''))
+        status = match.group(0) if match else None
+        if status:
+            bounce_type = 'hard' if status.startswith('5') else 'soft'
+        else:
+            bounce_type = 'hard' if action == 'failed' else 'soft'
+        bounces.append({
+            'email': email,
+            'message_id': original_id,
+            'bounce_type': bounce_type,
+            'status': status,
+            'diagnostic': fields.get('Diagnostic-Code', '').strip() or None,
+        })
+    return bounces
+
+
+def _original_message_id(part):
+    """Возвращает Message-ID исходного письма, вложенного в уведомление."""
+    payload = part.get_payload()
+    if isinstance(payload, list) and payload:
+        return payload[0].get('Message-ID', '').strip() or None
+    if isinstance(payload, str):
+        headers = message_from_bytes(payload.encode('utf-8', 'replace'), policy=policy.compat32)
+        return headers.get('Message-ID', '').strip() or None
+    return None
+
+
+def _delivery_status_fields(part):
+    """Возвращает поля каждого получателя из части message/delivery-status."""
+    payload = part.get_payload()
+    if isinstance(payload, list):
+        # Первая группа полей описывает сообщение целиком, остальные - получателей
+        return [dict(group.items()) for group in payload[1:]]
+    groups = re.split(r'\r?\n\r?\n', str(payload).strip())
+    fields = []
+    for group in groups[1:]:
+        headers = message_from_bytes(group.encode('utf-8', 'replace'), policy=policy.compat32)
+        fields.append(dict(headers.items()))
+    return fields
+
+
+def iter_maildir(path, limit=None):
+    """
+    Потоково перебирает необработанные письма в каталоге Maildir.
+
+    Читаются только файлы из new/, по одному за раз, поэтому размер ящика не влияет
+    на потребление памяти. Контрольной точкой служит сам Maildir: обработанное
+    письмо перемещается в cur/ функцией mark_maildir_seen.
+
+    Yields:
+        tuple[str, email.message.Message]: Путь к файлу и разобранное письмо.
+    """
+    new_dir = os.path.join(path, 'new')
+    count = 0
+    with os.scandir(new_dir) as entries:
+        for entry in entries:
+            if not entry.is_file() or entry.name.startswith('.'):
+                continue
+            with open(entry.path, 'rb') as f:
+                message = message_from_binary_file(f, policy=policy.compat32)
+            yield entry.path, message
+            count += 1
+            if limit and count >= limit:
+                return
+
+
+def mark_maildir_seen(paths):
+    """Перемещает обработанные письма из new/ в cur/ с флагом S."""
+    created = set()
+    for file_path in paths:
+        directory, name = os.path.split(file_path)
+        cur_dir = os.path.join(os.path.dirname(directory), 'cur')
+        if cur_dir not in created:
+            # Каталога cur/ может еще не быть; без него письма обработались бы повторно
+            os.makedirs(cur_dir, exist_ok=True)
+            created.add(cur_dir)
+        os.replace(file_path, os.path.join(cur_dir, f'{name.split(":")[0]}:2,S'))
+
+
+def iter_mbox(path, offset=0, limit=None):
+    """
+    Потоково перебирает письма mbox-файла, начиная с заданного смещения.
+
+    Файл читается построчно, в памяти хранится только текущее письмо.
+
+    Yields:
+        tuple[int, email.message.Message]: Смещение конца письма в файле и разобранное письмо.
+    """
+    count = 0
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        lines = []
+        position = offset
+        for line in f:
+            if line.startswith(b'From ') and lines:
+                yield position, message_from_bytes(b''.join(lines), policy=policy.compat32)
+                count += 1
+                if limit and count >= limit:
+                    return
+                lines = []
+            if not (line.startswith(b'From ') and not lines):
+                lines.append(line)
+            position += len(line)
+        if lines:
+            yield position, message_from_bytes(b''.join(lines), policy=policy.compat32)
+
+
+@transaction.atomic
+def apply_bounces(bounces):
+    """
+    Сохраняет пачку отказов в базе данных.
+
+    Отказ прикрепляется к строке Logs с совпадающим Message-ID. Адреса с жестким
+    отказом сразу попадают в список подавления, адреса с временными отказами -
+    после settings.BOUNCE_SOFT_LIMIT таких отказов.
+
+    Args:
+        bounces (list[dict]): Результаты parse_bounce.
+
+    Returns:
+        int: Количество обновленных строк Logs.
+    """
+    if not bounces:
+        return 0
+    now = timezone.now()
+    by_message_id = {bounce['message_id']: bounce for bounce in bounces if bounce['message_id']}
+    logs = list(Logs.objects.filter(message_id__in=by_message_id).select_related('client'))
+    for log in logs:
+        bounce = by_message_id[log.message_id]
+        log.bounce_type = bounce['bounce_type']
+        log.bounce_status = bounce['status']
+        log.bounce_diagnostic = bounce['diagnostic']
+        log.bounced_at = now
+        if log.client is not None:
+            # Адрес клиента приоритетнее адреса из уведомления, регистр может отличаться
+            bounce['email'] = log.client.email
+    Logs.objects.bulk_update(logs, ['bounce_type', 'bounce_status', 'bounce_diagnostic', 'bounced_at'])
+
+    # Адреса сравниваются без учета регистра, как в списке подавления
+    hard = {bounce['email'].lower() for bounce in bounces if bounce['bounce_type'] == 'hard'}
+    soft = {bounce['email'].lower() for bounce in bounces if bounce['bounce_type'] == 'soft'} - hard
+    if soft:
+        repeated = (
+            Logs.objects.filter(bounce_type='soft')
+            .annotate(email=Lower('client__email'))
+            .filter(email__in=soft)
+            .values('email')
+            .annotate(total=Count('id'))
+            .filter(total__gte=settings.BOUNCE_SOFT_LIMIT)
+            .values_list('email', flat=True)
+        )
+        hard.update(repeated)
+    suppress_emails(hard, 'bounce', comment='Автоматически по уведомлению о недоставке')
+    return len(logs)
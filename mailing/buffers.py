@@ -0,0 +1,65 @@
+import atexit
+import logging
+import threading
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+
+class BatchBuffer:
+    """
+    Кольцевой буфер в памяти процесса с фоновой записью пачками.
+
+    Обработчик запроса только добавляет запись в deque (без обращений к базе данных),
+    а фоновый поток раз в interval секунд или при накоплении batch_size записей
+    передает накопленное функции flush одним списком. При переполнении буфера
+    самые старые записи вытесняются, чтобы всплеск трафика не съел память процесса.
+
+    Атрибуты:
+        flush (Callable[[list], None]): Функция пакетной записи.
+        interval (float): Максимальная задержка записи в секундах.
+        batch_size (int): Размер пачки, при котором запись начинается досрочно.
+        maxlen (int): Емкость кольцевого буфера.
+    """
+
+    def __init__(self, flush, interval=2.0, batch_size=1000, maxlen=100_000):
+        self.flush = flush
+        self.interval = interval
+        self.batch_size = batch_size
+        self.items = deque(maxlen=maxlen)
+        self.wakeup = threading.Event()
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.thread = None
+
+    def append(self, item):
+        self.items.append(item)
+        if self.thread is None:
+            self.start()
+        if len(self.items) >= self.batch_size:
+            self.wakeup.set()
+
+    def start(self):
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name='batch-buffer-flusher', daemon=True)
+                self.thread.start()
+                atexit.register(self.drain)
+
+    def run(self):
+        while True:
+            self.wakeup.wait(self.interval)
+            self.wakeup.clear()
+            self.drain()
+
+    def drain(self):
+        """Записывает все накопленные записи пачками по batch_size."""
+        with self.flush_lock:
+            while self.items:
+                batch = []
+                while self.items and len(batch) < self.batch_size:
+                    batch.append(self.items.popleft())
+                try:
+                    self.flush(batch)
+                except Exception:
+                    logger.exception('Не удалось записать пачку из %s записей', len(batch))
@@ -0,0 +1,78 @@
+"""
+Управление идущими рассылками: пауза, возобновление, ограничение скорости и отмена запуска.
+
+Источник истины - поля рассылки is_paused, rate_limit и aborted_at. Потоки отправки
+между порциями писем читают запись управления из кеша (не чаще раза в CONTROL_POLL
+секунд); при промахе она читается из базы одним запросом по первичному ключу и
+кешируется на CONTROL_TTL секунд. Изменения через функции модуля сразу сбрасывают
+кеш, а изменения другими путями (например, в списке админки) вступают в силу не
+позже чем через CONTROL_TTL секунд.
+"""
+from django.core.cache import cache
+from django.utils import timezone
+
+from mailing.models import Newsletter
+
+# Срок хранения записи управления в кеше, секунд
+CONTROL_TTL = 2
+# Как часто поток отправки проверяет запись управления, секунд
+CONTROL_POLL = 1
+ACTIONS = ('pause', 'resume', 'throttle', 'abort')
+
+
+def control_key(newsletter_id):
+    return f'newsletter-control:{newsletter_id}'
+
+
+def get_control(newsletter_id):
+    """
+    Возвращает запись управления рассылкой.
+
+    Returns:
+        dict: paused - рассылка приостановлена, rate - ограничение скорости (писем в секунду
+        или None), aborted_at - запуски, начатые не позже этого момента, отменяются.
+    """
+    key = control_key(newsletter_id)
+    record = cache.get(key)
+    if record is None:
+        row = Newsletter.objects.filter(pk=newsletter_id).values('is_paused', 'rate_limit', 'aborted_at').first() or {}
+        record = {
+            'paused': row.get('is_paused', False),
+            'rate': row.get('rate_limit'),
+            'aborted_at': row.get('aborted_at'),
+        }
+        cache.set(key, record, CONTROL_TTL)
+    return record
+
+
+def apply(newsletters, **fields):
+    """
+    Изменяет поля управления рассылок одним UPDATE и сбрасывает их записи в кеше.
+
+    Returns:
+        int: Количество измененных рассылок.
+    """
+    ids = list(newsletters.values_list('pk', flat=True))
+    updated = Newsletter.objects.filter(pk__in=ids).update(**fields)
+    cache.delete_many([control_key(pk) for pk in ids])
+    return updated
+
+
+def pause(newsletters):
+    """Приостанавливает рассылки; идущие запуски сохраняют контрольную точку."""
+    return apply(newsletters, is_paused=True)
+
+
+def resume(newsletters):
+    """Возобновляет рассылки; запуски продолжаются с контрольной точки."""
+    return apply(newsletters, is_paused=False)
+
+
+def throttle(newsletters, rate):
+    """Ограничивает скорость отправки рассылок (писем в секунду); None снимает ограничение."""
+    return apply(newsletters, rate_limit=rate)
+
+
+def abort(newsletters):
+    """Отменяет текущие запуски рассылок; следующие запуски по расписанию не затрагиваются."""
+    return apply(newsletters, aborted_at=timezone.now())
@@ -1,75 +1,337 @@
 import smtplib
-from datetime import datetime, timedelta
+import threading
+import time
+from datetime import timedelta
+from itertools import islice
 
-import pytz
-from django.conf import settings
-from django.core.mail import send_mail
+from django.core.mail import get_connection
+from django.template import TemplateSyntaxError
+from django.utils import timezone
 
-from mailing.models import Client, Message, Newsletter, Logs
+from mailing import lanes
+from mailing.audience import run_recipients, snapshot
+from mailing.control import CONTROL_POLL, get_control
+from mailing.delivery import CLAIM_BATCH_SIZE, claim, prune, release
+from mailing.dkim import get_signer
+from mailing.lanes import RateLimiter
+from mailing.models import Newsletter, Logs, Run
+from mailing.personalization import CompiledMessage, iter_recipients, personalize
+from mailing.profiling import phase, timed
+from mailing.progress import ProgressCounter
+
+PERIODS = {
+    'daily': timedelta(days=1),
+    'weekly': timedelta(days=7),
+    'monthly': timedelta(days=30),
+}
+
+# Количество строк логов, после которого они записываются в базу
+LOGS_BATCH_SIZE = 1000
+sent_lock = threading.Lock()
+
+
+def skip_sent(rows, message_pk, sent):
+    """Пропускает адреса, на которые сообщение уже отправлено в этом запуске."""
+    for row in rows:
+        key = (message_pk, row['email'])
+        # Множество общее для потоков полос отправки
+        with sent_lock:
+            if key in sent:
+                continue
+            sent.add(key)
+        yield row
+
+
+class Job:
+    """
+    Отправка одного запуска рассылки порциями для планировщика (mailing/scheduler.py).
+
+    Получатели снимка обходятся по возрастанию id. Логи записываются пачками, и вместе
+    с ними сохраняется контрольная точка - id последнего обработанного клиента, поэтому
+    прерванный запуск продолжается с нее. Перед каждой пачкой получателей занимаются
+    ключи доставки (mailing/delivery.py), поэтому пересекающиеся и повторные запуски
+    одного периода не отправляют писем повторно. Между письмами
+    проверяется запись управления рассылкой (mailing/control.py): пауза, ограничение
+    скорости и отмена вступают в силу в течение нескольких секунд.
+
+    Атрибуты:
+        run (Run): Запуск со снимком аудитории.
+        owner_id (int | None): Владелец рассылки, по которому планировщик распределяет отправку.
+        connection: Соединение почтового бэкенда; полоса отправки назначает свое.
+        limiter (RateLimiter | None): Бюджет скорости полосы отправки.
+        throttle (RateLimiter | None): Ограничение скорости, заданное для рассылки.
+        paused (bool): Рассылка приостановлена.
+        done (bool): Все получатели снимка обработаны или запуск отменен.
+    """
+
+    def __init__(self, run, compiled, sent, signer=None, connection=None, limiter=None):
+        self.run = run
+        self.newsletter = run.newsletter
+        self.owner_id = self.newsletter.owner_id
+        self.compiled = compiled
+        self.connection = connection
+        self.sent = sent
+        self.signer = signer
+        self.limiter = limiter
+        self.emails = None
+        self.logs = []
+        self.last_client_id = run.last_client_id
+        # Занятые ключи доставки, письма по которым еще не отправлены, и ключи неудачных попыток
+        self.pending = set()
+        self.failed = []
+        self.throttle = None
+        self.paused = False
+        self.aborted = False
+        self.control_checked = None
+        self.suspended = False
+        self.progress = None
+        self.done = False
+
+    def check_control(self):
+        """Применяет запись управления рассылкой; кеш опрашивается не чаще раза в CONTROL_POLL секунд."""
+        now = time.monotonic()
+        if self.control_checked is not None and now - self.control_checked < CONTROL_POLL:
+            return
+        self.control_checked = now
+        record = get_control(self.newsletter.pk)
+        self.aborted = bool(record['aborted_at'] and record['aborted_at'] >= self.run.started_at)
+        self.paused = record['paused']
+        if record['rate'] != (self.throttle.rate if self.throttle else None):
+            self.throttle = RateLimiter(record['rate']) if record['rate'] else None
+
+    @property
+    def stopped(self):
+        return self.paused or self.aborted
+
+    @property
+    def state(self):
+        """Состояние запуска для счетчиков прогресса."""
+        if self.aborted:
+            return 'aborted'
+        if self.done:
+            return 'finished'
+        if self.paused:
+            return 'paused'
+        return 'suspended' if self.suspended else 'running'
+
+    def start(self):
+        recipients = run_recipients(self.run).order_by('pk')
+        if self.last_client_id is not None:
+            recipients = recipients.filter(pk__gt=self.last_client_id)
+        rows = self.claimed(skip_sent(iter_recipients(recipients), self.newsletter.message_id, self.sent))
+        emails = personalize(self.newsletter, self.compiled, timed(rows, 'query'), self.connection, self.signer)
+        self.emails = timed(emails, 'render')
+        self.progress = ProgressCounter(self.run)
+
+    def claimed(self, rows):
+        """Пропускает получателей, письмо которым за период запуска уже отправлено или отправляется."""
+        rows = iter(rows)
+        while batch := list(islice(rows, CLAIM_BATCH_SIZE)):
+            ids = claim(self.run, [row['id'] for row in batch])
+            self.pending |= ids
+            for row in batch:
+                if row['id'] in ids:
+                    yield row
+
+    def step(self, limit):
+        """
+        Отправляет не больше limit писем.
+
+        Returns:
+            int: Количество отправленных писем; меньше limit, если получатели закончились
+            или рассылка приостановлена либо отменена.
+        """
+        self.check_control()
+        if self.stopped:
+            return self.stop()
+        if self.emails is None:
+            self.start()
+        count = 0
+        for row, message_id, email in self.emails:
+            for limiter in (self.limiter, self.throttle):
+                if limiter is not None:
+                    limiter.acquire()
+            try:
+                # Отправка письма
+                with phase('smtp'):
+                    email.send(fail_silently=False)
+                attempt = True
+                response = 'Рассылка успешно отправлена'
+            except smtplib.SMTPException as e:
+                attempt = False
+                response = f'Ошибка при отправке письма: {str(e)}'[:100]
+            # Логирование попытки отправки для каждого клиента
+            self.logs.append(Logs(
+                attempt=attempt, attempt_time=timezone.now(), response=response, newsletter=self.newsletter,
+                client_id=row['id'], message_id=message_id,
+            ))
+            self.last_client_id = row['id']
+            self.pending.discard(row['id'])
+            if not attempt:
+                self.failed.append(row['id'])
+            self.progress.add(attempt)
+            self.progress.publish()
+            count += 1
+            if len(self.logs) >= LOGS_BATCH_SIZE:
+                self.checkpoint()
+            if count >= limit:
+                return count
+            self.check_control()
+            if self.stopped:
+                return count + self.stop()
+        self.done = True
+        self.checkpoint()
+        return count
+
+    def stop(self):
+        """Сохраняет прогресс приостановленного запуска или завершает отмененный."""
+        if self.aborted:
+            self.done = True
+            self.checkpoint()
+        elif self.logs:
+            self.checkpoint()
+        elif self.progress is not None:
+            self.progress.publish(self.state)
+        return 0
+
+    def suspend(self):
+        """Сохраняет прогресс запуска, снятого с обслуживания до следующего вызова send_email."""
+        self.suspended = True
+        self.checkpoint()
+
+    def checkpoint(self):
+        """
+        Записывает накопленные логи, сохраняет прогресс запуска и публикует его счетчики.
+
+        Ключи доставки неудачных попыток освобождаются, а у завершенного или снятого
+        с обслуживания запуска - и ключи получателей, до которых он не дошел.
+        """
+        with phase('flush'):
+            Logs.objects.bulk_create(self.logs)
+            self.logs = []
+            released, self.failed = self.failed, []
+            if self.done or self.suspended:
+                released += self.pending
+                self.pending = set()
+            release(self.run, released)
+            progress = {'last_client_id': self.last_client_id, 'is_aborted': self.aborted}
+            if self.done:
+                progress['finished_at'] = timezone.now()
+            Run.objects.filter(pk=self.run.pk).update(**progress)
+        if self.progress is not None:
+            self.progress.publish(self.state, force=True)
+
+
+def compile_message(message):
+    """Компилирует сообщение рассылки; сообщение с ошибкой в шаблоне не отправляется, пока его не исправят."""
+    try:
+        return CompiledMessage(message)
+    except TemplateSyntaxError:
+        return None
+
+
+def send_newsletter(newsletter, connection, sent, clients=None, period=None):
+    """
+    Отправляет сообщение рассылки всем её получателям вне планировщика.
+
+    Аудитория фиксируется снимком в начале запуска, поэтому изменения клиентов
+    рассылки во время отправки на него не влияют. Получатели читаются потоково,
+    письма персонализируются по одному, а логи записываются пачками, поэтому
+    потребление памяти не зависит от размера аудитории. Если передан clients
+    (queryset id клиентов), письма получают только эти клиенты рассылки; period -
+    период запуска для ключей доставки (см. snapshot).
+    """
+    compiled = compile_message(newsletter.message)
+    if compiled is None:
+        return
+    job = Job(snapshot(newsletter, clients, period), compiled, sent, get_signer(), connection)
+    while not (job.done or job.paused):
+        job.step(LOGS_BATCH_SIZE)
+    if not job.done:
+        job.suspend()
+
+
+def resend_failed(connection, sent, since=None):
+    """
+    Повторно отправляет письма по неудачным попыткам, отмеченным для повтора в админке.
+
+    Получатели выбираются одним подзапросом к логам на каждую рассылку. После отправки
+    одним UPDATE снимаются отметки только с клиентов, которым письмо рассылки успешно
+    отправлено начиная с since (по умолчанию - с начала повтора), в том числе другим
+    запуском этого вызова send_email. Остальные отметки (сообщение с ошибкой в шаблоне,
+    приостановленный запуск, неудачная попытка) остаются до следующего вызова.
+    """
+    since = since or timezone.now()
+    retry = Logs.objects.filter(retry=True)
+    # Повторы одного часа делят ключи доставки, поэтому пересекающиеся вызовы не повторяют письмо дважды
+    period = timezone.now().replace(minute=0, second=0, microsecond=0)
+    newsletters = Newsletter.objects.filter(
+        pk__in=retry.values('newsletter_id'), message__isnull=False, is_paused=False,
+    ).select_related('message')
+    for newsletter in newsletters:
+        marked = retry.filter(newsletter=newsletter)
+        send_newsletter(newsletter, connection, sent, clients=marked.values('client_id'), period=period)
+        delivered = Logs.objects.filter(newsletter=newsletter, attempt=True, attempt_time__gte=since)
+        marked.filter(client_id__in=delivered.values('client_id')).update(retry=False)
 
 
 def send_email():
     """
-    Отправляет электронные письма всем клиентам в соответствии с запланированными рассылками.
+    Отправляет электронные письма клиентам в соответствии с запланированными рассылками.
 
-    Функция проверяет статус каждой рассылки и отправляет письма всем клиентам,
-    ведет логирование каждой попытки отправки и обновляет статус рассылок в зависимости от времени.
+    Функция проверяет статус каждой рассылки и обновляет его в зависимости от времени,
+    а для наступивших рассылок фиксирует аудиторию и передает запуск в полосу отправки
+    (scheduled или bulk по размеру аудитории, см. mailing/lanes.py). Полосы работают
+    параллельно, а внутри полосы планировщик чередует отправку между владельцами
+    рассылок с учетом их квот.
+    Незавершенные запуски (прерванные или остановленные часовым лимитом) продолжаются
+    с контрольной точки, новый запуск для такой рассылки не создается. Письмо рассылки
+    клиенту отправляется не больше одного раза за окно расписания, даже если вызовы
+    send_email пересекаются или повторяются после перезапуска (mailing/delivery.py).
+    Адреса из списка подавления пропускаются, а одно и то же сообщение отправляется на адрес
+    не больше одного раза за вызов, даже если адрес входит в несколько пересекающихся рассылок.
+    Приостановленные рассылки не обрабатываются; в конце запуска повторяются неудачные
+    попытки, отмеченные для повтора, и удаляются ключи доставки завершенных периодов.
     """
-    # Получение всех клиентов и их email
-    clients = Client.objects.all()
-    clients_email = []
-    for client in clients:
-        clients_email.append(getattr(client, 'email'))
-
-    # Получение всех сообщений и их содержимого
-    messages = Message.objects.all()
-    message_subject = []
-    message_body = []
-    for message in messages:
-        message_subject.append(getattr(message, 'subject'))
-        message_body.append(getattr(message, 'body'))
-
-    # Получение текущего времени с учетом часового пояса
-    newsletters = Newsletter.objects.all()
-    naive_datetime = datetime.now()
-    now = naive_datetime.replace(tzinfo=pytz.utc)
+    now = timezone.now()
+    # Пары (сообщение, адрес), уже отправленные в этом вызове
+    sent = set()
+    newsletters = Newsletter.objects.filter(is_paused=False).select_related('message')
+    unfinished = Run.objects.filter(
+        finished_at__isnull=True, newsletter__is_paused=False, newsletter__message__isnull=False,
+    ).select_related('newsletter__message')
+
+    signer = get_signer()
+    jobs = []
+
+    def schedule(run):
+        compiled = compile_message(run.newsletter.message)
+        if compiled is not None:
+            jobs.append(Job(run, compiled, sent, signer))
+
+    resumed = set()
+    for run in unfinished:
+        resumed.add(run.newsletter_id)
+        schedule(run)
 
     for newsletter in newsletters:
         if newsletter.start_time < now < newsletter.end_time:
-            for i in range(len(message_subject)):
-                newsletter.status = 'запущена'
-                try:
-                    # Отправка письма
-                    send_mail(
-                        subject=message_subject[i],
-                        message=message_body[i],
-                        from_email=settings.EMAIL_HOST_USER,
-                        recipient_list=clients_email,
-                        fail_silently=False,
-                    )
-                    attempt = True
-                    response = 'Рассылка успешно отправлена'
-                except smtplib.SMTPException as e:
-                    attempt = False
-                    response = f'Ошибка при отправке письма: {str(e)}'
-                finally:
-                    # Логирование попытки отправки для каждого клиента
-                    for client in newsletter.client.all():
-                        (Logs.objects.create(
-                            attempt=attempt, attempt_time=now, response=response, newsletter=newsletter, client=client
-                        )).save()
-
-                # Обновление времени начала следующей рассылки в зависимости от периодичности
-                if newsletter.periodicity == 'Ежедневно':
-                    newsletter.start_time += timedelta(days=1, hours=0, minutes=0)
-                elif newsletter.periodicity == 'Еженедельно':
-                    newsletter.start_time += timedelta(days=7, hours=0, minutes=0)
-                elif newsletter.periodicity == 'Ежемесячно':
-                    newsletter.start_time += timedelta(days=30, hours=0, minutes=0)
+            newsletter.status = 'запущена'
+            if newsletter.message is not None and newsletter.pk not in resumed:
+                schedule(snapshot(newsletter, period=newsletter.start_time))
+
+            # Обновление времени начала следующей рассылки в зависимости от периодичности
+            newsletter.start_time += PERIODS.get(newsletter.periodicity, timedelta())
 
         elif now > newsletter.end_time:
             newsletter.status = 'завершена'
         elif now < newsletter.start_time:
             newsletter.status = 'создана'
 
-        newsletter.save()
+        # Только изменяемые поля: пауза, поставленная в админке во время запуска, не затирается
+        newsletter.save(update_fields=['status', 'start_time'])
+
+    lanes.dispatch(jobs, now)
+    with get_connection() as connection:
+        resend_failed(connection, sent, since=now)
+    prune()
@@ -0,0 +1,102 @@
+"""
+Ключи идемпотентности доставки: письмо рассылки клиенту за период отправляется один раз.
+
+Перед отправкой очередной пачки получателей запуск одним INSERT ... ON CONFLICT DO
+NOTHING RETURNING занимает ключи (рассылка, период, клиент) в таблице Delivery и
+отправляет письма только тем, чьи ключи занял сам. Уникальный индекс гарантирует,
+что пересекающиеся вызовы send_email (два cron или перезапущенный manage.py run)
+не отправят одно письмо дважды, а продолженный после сбоя запуск пропускает уже
+отправленных получателей без обращения к логам.
+
+Ключ занимается до отправки. Ключи неудачных попыток и получателей, до которых
+остановленный запуск не дошел, освобождаются, чтобы их можно было отправить
+повторно. Ключи последней пачки процесса, завершившегося аварийно, остаются
+занятыми: такие письма не отправляются повторно (не больше CLAIM_BATCH_SIZE на запуск).
+
+Ключ нужен, пока запуск его периода может начаться или продолжиться: send_email
+удаляет (prune) ключи периодов старше DELIVERY_RETENTION_HOURS, у которых не
+осталось незавершенных запусков, поэтому таблица не растет вместе с логами.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+
+from mailing.models import Delivery, Run
+
+# Сколько получателей занимается одним запросом
+CLAIM_BATCH_SIZE = 100
+# Сколько ключей удаляется одним запросом при очистке
+PRUNE_BATCH_SIZE = 10_000
+
+
+def run_period(run):
+    """Период запуска для ключей; у запусков, созданных до появления поля, - время запуска."""
+    return run.period or run.started_at
+
+
+def claim(run, client_ids):
+    """
+    Занимает ключи доставки запуска для клиентов одним запросом.
+
+    Args:
+        run (Run): Запуск рассылки.
+        client_ids (list[int]): Клиенты очередной пачки.
+
+    Returns:
+        set[int]: Клиенты, ключи которых занял этот вызов; остальным письмо за период
+        уже отправлено или отправляется другим запуском.
+    """
+    if not client_ids:
+        return set()
+    table = Delivery._meta.db_table
+    now, period = timezone.now(), run_period(run)
+    values = ', '.join(['(%s, %s, %s, %s)'] * len(client_ids))
+    params = [value for client_id in client_ids for value in (run.newsletter_id, client_id, period, now)]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {table} (newsletter_id, client_id, period, created_at) VALUES {values} '
+            f'ON CONFLICT (newsletter_id, period, client_id) DO NOTHING RETURNING client_id',
+            params,
+        )
+        return {row[0] for row in cursor.fetchall()}
+
+
+def release(run, client_ids):
+    """
+    Освобождает ключи доставки запуска одним DELETE, чтобы письма можно было отправить повторно.
+
+    Returns:
+        int: Количество освобожденных ключей.
+    """
+    if not client_ids:
+        return 0
+    return Delivery.objects.filter(
+        newsletter_id=run.newsletter_id, period=run_period(run), client_id__in=list(client_ids),
+    ).delete()[0]
+
+
+def prune(now=None):
+    """
+    Удаляет ключи доставки завершенных периодов пачками по PRUNE_BATCH_SIZE.
+
+    Период считается завершенным, если он начался раньше чем DELIVERY_RETENTION_HOURS
+    назад и у рассылки нет незавершенных запусков этого периода.
+
+    Returns:
+        int: Количество удаленных ключей.
+    """
+    now = now or timezone.now()
+    unfinished = Run.objects.filter(newsletter_id=OuterRef('newsletter_id'), finished_at__isnull=True).filter(
+        # У запусков, созданных до появления поля period, период - время запуска (run_period)
+        Q(period=OuterRef('period')) | Q(period__isnull=True, started_at=OuterRef('period'))
+    )
+    expired = Delivery.objects.filter(
+        period__lt=now - timedelta(hours=settings.DELIVERY_RETENTION_HOURS),
+    ).filter(~Exists(unfinished))
+    deleted = 0
+    while ids := list(expired.values_list('pk', flat=True)[:PRUNE_BATCH_SIZE]):
+        deleted += Delivery.objects.filter(pk__in=ids).delete()[0]
+    return deleted
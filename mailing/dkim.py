@@ -0,0 +1,130 @@
+import base64
+import hashlib
+import re
+import time
+from collections import OrderedDict
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+# Заголовки, которые подписываются, если присутствуют в письме
+SIGNED_HEADERS = (
+    'from', 'to', 'subject', 'date', 'message-id', 'mime-version', 'content-type',
+    'list-unsubscribe', 'list-unsubscribe-post',
+)
+WSP_RE = re.compile(rb'[ \t]+')
+FOLD_RE = re.compile(rb'\r\n(?=[ \t])')
+
+# Хеши тел писем: одинаковое тело канонизируется и хешируется один раз
+BODY_HASH_CACHE_SIZE = 256
+body_hashes = OrderedDict()
+
+
+def canonicalize_body(body):
+    """Канонизация тела письма по алгоритму relaxed (RFC 6376, 3.4.4)."""
+    lines = [WSP_RE.sub(b' ', line).rstrip(b' ') for line in body.split(b'\r\n')]
+    while lines and lines[-1] == b'':
+        lines.pop()
+    return b'\r\n'.join(lines) + b'\r\n' if lines else b''
+
+
+def canonicalize_header(name, value):
+    """Канонизация заголовка по алгоритму relaxed (RFC 6376, 3.4.2)."""
+    value = WSP_RE.sub(b' ', FOLD_RE.sub(b'', value)).strip(b' ')
+    return name.strip().lower() + b':' + value
+
+
+def body_hash(body):
+    """Возвращает bh= для тела письма, используя кеш для повторяющихся тел."""
+    key = hashlib.blake2b(body, digest_size=16).digest()
+    if key in body_hashes:
+        body_hashes.move_to_end(key)
+        return body_hashes[key]
+    digest = base64.b64encode(hashlib.sha256(canonicalize_body(body)).digest())
+    body_hashes[key] = digest
+    if len(body_hashes) > BODY_HASH_CACHE_SIZE:
+        body_hashes.popitem(last=False)
+    return digest
+
+
+def split_message(raw):
+    """Разделяет письмо на список заголовков (имя, значение) и тело."""
+    head, _, body = raw.partition(b'\r\n\r\n')
+    headers = []
+    for line in re.split(rb'\r\n(?![ \t])', head):
+        name, _, value = line.partition(b':')
+        headers.append((name, value))
+    return headers, body
+
+
+class DKIMSigner:
+    """
+    Подпись писем DKIM (rsa-sha256, relaxed/relaxed).
+
+    Закрытый ключ читается и разбирается один раз на процесс (см. get_signer),
+    хеш тела вычисляется один раз для каждого уникального тела, а для каждого
+    получателя подписываются только канонизированные заголовки.
+
+    Атрибуты:
+        domain (str): Домен подписи (тег d=).
+        selector (str): Селектор DNS-записи с открытым ключом (тег s=).
+        private_key: Разобранный закрытый RSA-ключ.
+    """
+
+    def __init__(self, domain, selector, private_key):
+        self.domain = domain
+        self.selector = selector
+        self.private_key = private_key
+
+    def sign(self, raw, bh=None):
+        """
+        Добавляет в начало письма заголовок DKIM-Signature.
+
+        Args:
+            raw (bytes): Письмо с разделителями строк CRLF.
+            bh (bytes, optional): Готовый хеш тела, если он уже известен.
+
+        Returns:
+            bytes: Подписанное письмо.
+        """
+        from cryptography.hazmat.primitives import hashes
+        from cryptography.hazmat.primitives.asymmetric import padding
+
+        headers, body = split_message(raw)
+        if bh is None:
+            bh = body_hash(body)
+
+        # При повторе заголовка подписывается последний экземпляр (RFC 6376, 5.4.2)
+        present = {}
+        for name, value in headers:
+            present[name.strip().lower()] = (name, value)
+        signed = [name for name in SIGNED_HEADERS if name.encode() in present]
+
+        dkim_value = (
+            f' v=1; a=rsa-sha256; c=relaxed/relaxed; d={self.domain}; s={self.selector};'
+            f' t={int(time.time())}; h={":".join(signed)}; bh='
+        ).encode() + bh + b'; b='
+        data = b''.join(
+            canonicalize_header(*present[name.encode()]) + b'\r\n' for name in signed
+        ) + canonicalize_header(b'DKIM-Signature', dkim_value)
+        signature = self.private_key.sign(data, padding.PKCS1v15(), hashes.SHA256())
+        return b'DKIM-Signature:' + dkim_value + base64.b64encode(signature) + b'\r\n' + raw
+
+
+@lru_cache(maxsize=None)
+def get_signer():
+    """
+    Возвращает подписывающий объект процесса или None, если DKIM не настроен.
+
+    Ключ читается из settings.DKIM_PRIVATE_KEY_PATH один раз при первом вызове.
+    """
+    if not (settings.DKIM_DOMAIN and settings.DKIM_SELECTOR and settings.DKIM_PRIVATE_KEY_PATH):
+        return None
+    try:
+        from cryptography.hazmat.primitives.serialization import load_pem_private_key
+    except ImportError:
+        raise ImproperlyConfigured('Для подписи DKIM требуется пакет cryptography')
+    with open(settings.DKIM_PRIVATE_KEY_PATH, 'rb') as f:
+        private_key = load_pem_private_key(f.read(), password=None)
+    return DKIMSigner(settings.DKIM_DOMAIN, settings.DKIM_SELECTOR, private_key)
@@ -1,12 +1,15 @@
 from django import forms
+from django.template import TemplateSyntaxError
+from django.urls import reverse_lazy
 
 from mailing.models import Client, Message, Newsletter
+from mailing.personalization import CompiledMessage
 
 
 class ClientForm(forms.ModelForm):
     class Meta:
         model = Client
-        fields = ('fio', 'email', 'comment',)
+        fields = ('fio', 'email', 'comment', 'attributes',)
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -24,11 +27,47 @@ class MessageForm(forms.ModelForm):
         for field_name, field in self.fields.items():
             field.widget.attrs['class'] = 'form-control'
 
+    def clean(self):
+        cleaned_data = super().clean()
+        for field_name in ('subject', 'body'):
+            try:
+                CompiledMessage.compile(cleaned_data.get(field_name) or '')
+            except TemplateSyntaxError as e:
+                self.add_error(field_name, f'Ошибка в шаблоне: {e}')
+        return cleaned_data
+
+
+class ClientAutocompleteWidget(forms.SelectMultiple):
+    """
+    Выбор клиентов с автодополнением.
+
+    В разметку попадают только уже выбранные клиенты, остальные подгружаются
+    скриптом по мере ввода через mailing:client_autocomplete, поэтому размер
+    страницы не зависит от числа клиентов.
+    """
+
+    class Media:
+        js = ('js/client_autocomplete.js',)
+
+    def __init__(self, attrs=None):
+        super().__init__(attrs)
+        self.attrs['data-autocomplete-url'] = reverse_lazy('mailing:client_autocomplete')
+
+    def optgroups(self, name, value, attrs=None):
+        selected = [pk for pk in value if pk]
+        queryset = self.choices.queryset.filter(pk__in=selected) if selected else self.choices.queryset.none()
+        options = [
+            self.create_option(name, str(client.pk), self.choices.field.label_from_instance(client), True, index)
+            for index, client in enumerate(queryset)
+        ]
+        return [(None, options, 0)]
+
 
 class NewsletterForm(forms.ModelForm):
     class Meta:
         model = Newsletter
-        fields = ('start_time', 'end_time', 'periodicity', 'status', 'client', 'message')
+        fields = ('start_time', 'end_time', 'periodicity', 'status', 'client', 'segment', 'message')
+        widgets = {'client': ClientAutocompleteWidget}
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
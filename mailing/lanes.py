@@ -0,0 +1,227 @@
+"""
+Полосы отправки писем с разным приоритетом.
+
+transactional - служебные письма (подтверждение регистрации, новый пароль): отправляются
+    в фоновых потоках веб-процесса сразу после постановки в очередь, не задерживая ответ
+    и не дожидаясь рассылок;
+scheduled - запуски рассылок с аудиторией меньше MAIL_BULK_THRESHOLD;
+bulk - крупные запуски рассылок.
+
+У каждой полосы свои потоки, свои SMTP-соединения (для служебных писем можно задать
+отдельную учетную запись) и свой бюджет скорости, поэтому крупная рассылка не занимает
+ресурсы, зарезервированные за остальными полосами. Настройки полос - settings.MAIL_LANES.
+"""
+import atexit
+import logging
+import queue
+import smtplib
+import threading
+import time
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import connections
+from django.utils import timezone
+
+from mailing.scheduler import FairScheduler, load_allowances
+
+logger = logging.getLogger(__name__)
+
+TRANSACTIONAL = 'transactional'
+SCHEDULED = 'scheduled'
+BULK = 'bulk'
+# Сколько секунд при завершении процесса ждать отправки служебных писем из очереди
+DRAIN_TIMEOUT = 10
+
+
+class RateLimiter:
+    """
+    Ограничитель скорости (token bucket), общий для всех потоков полосы.
+
+    Атрибуты:
+        rate (float): Писем в секунду; 0 - без ограничения.
+        capacity (float): Сколько писем можно отправить подряд без ожидания.
+    """
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = burst or max(rate, 1)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Ждет, пока бюджет скорости позволит отправить следующее письмо."""
+        if not self.rate:
+            return
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0
+        if wait:
+            time.sleep(wait)
+
+
+class Lane:
+    """
+    Полоса отправки: зарезервированные потоки, SMTP-соединения и бюджет скорости.
+
+    Атрибуты:
+        name (str): Название полосы.
+        workers (int): Количество потоков полосы.
+        limiter (RateLimiter): Бюджет скорости полосы.
+        connection_options (dict): Параметры get_connection(), например отдельная учетная запись.
+    """
+
+    def __init__(self, name, workers=1, rate=0, connection=None):
+        self.name = name
+        self.workers = max(workers, 1)
+        self.limiter = RateLimiter(rate)
+        self.connection_options = connection or {}
+        self.queue = queue.Queue()
+        self.threads = []
+        self.lock = threading.Lock()
+
+    @property
+    def from_email(self):
+        return self.connection_options.get('username') or settings.EMAIL_HOST_USER
+
+    def get_connection(self):
+        return get_connection(**self.connection_options)
+
+    def submit(self, email):
+        """Ставит письмо в очередь полосы; потоки запускаются при первом обращении."""
+        if not self.threads:
+            self.start()
+        self.queue.put(email)
+
+    def start(self):
+        with self.lock:
+            if self.threads:
+                return
+            for number in range(self.workers):
+                thread = threading.Thread(target=self.work, name=f'mail-lane-{self.name}-{number}', daemon=True)
+                thread.start()
+                self.threads.append(thread)
+            atexit.register(self.drain)
+
+    def work(self):
+        connection = self.get_connection()
+        while True:
+            email = self.queue.get()
+            try:
+                self.limiter.acquire()
+                email.connection = connection
+                email.send(fail_silently=False)
+            except (smtplib.SMTPException, OSError):
+                logger.exception('Не удалось отправить письмо полосы %s на %s', self.name, email.to)
+                # Соединение могло оборваться: следующее письмо откроет новое
+                connection.close()
+            except Exception:
+                # Ошибка в самом письме (заголовки, кодировка) не должна останавливать поток полосы
+                logger.exception('Не удалось подготовить письмо полосы %s на %s', self.name, email.to)
+            finally:
+                self.queue.task_done()
+            if self.queue.empty():
+                # Простаивающее соединение сервер все равно закроет по таймауту
+                connection.close()
+
+    def drain(self):
+        """Дожидается отправки писем из очереди при завершении процесса, но не дольше DRAIN_TIMEOUT."""
+        deadline = time.monotonic() + DRAIN_TIMEOUT
+        while self.queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.05)
+
+    def dispatch(self, jobs, now=None, allowances=None):
+        """
+        Запускает отправку запусков рассылок в потоках полосы.
+
+        Запуски распределяются между потоками по владельцам, поэтому квоты владельца
+        соблюдаются одним планировщиком, а остатки часовых лимитов allowances общие
+        для планировщиков всех полос.
+
+        Returns:
+            tuple[list[threading.Thread], list[Exception]]: Запущенные потоки и список,
+            в который потоки добавят возникшие ошибки.
+        """
+        schedulers = [FairScheduler(now=now, allowances=allowances) for _ in range(self.workers)]
+        for job in jobs:
+            schedulers[hash(job.owner_id) % self.workers].add(job)
+        errors = []
+        threads = [
+            threading.Thread(target=self.serve, args=(scheduler, errors), name=f'mail-lane-{self.name}-{number}')
+            for number, scheduler in enumerate(schedulers) if scheduler.jobs
+        ]
+        for thread in threads:
+            thread.start()
+        return threads, errors
+
+    def serve(self, scheduler, errors):
+        try:
+            with self.get_connection() as connection:
+                for job in scheduler.jobs:
+                    job.connection = connection
+                    job.limiter = self.limiter
+                scheduler.run()
+        except Exception as e:
+            errors.append(e)
+        finally:
+            connections.close_all()
+
+
+lanes = {}
+lanes_lock = threading.Lock()
+
+
+def get_lane(name):
+    """Возвращает полосу процесса по названию, создавая ее из settings.MAIL_LANES при первом обращении."""
+    if name not in lanes:
+        with lanes_lock:
+            if name not in lanes:
+                lanes[name] = Lane(name, **settings.MAIL_LANES[name])
+    return lanes[name]
+
+
+def send_transactional(subject, message, recipient_list):
+    """
+    Отправляет служебное письмо через полосу transactional.
+
+    Письмо ставится в очередь и отправляется фоновым потоком в течение нескольких секунд;
+    вызывающий код не ждет SMTP-сервер.
+    """
+    lane = get_lane(TRANSACTIONAL)
+    lane.submit(EmailMessage(subject=subject, body=message, from_email=lane.from_email, to=recipient_list))
+
+
+def lane_for(run):
+    """Выбирает полосу для запуска рассылки по размеру снимка аудитории."""
+    return BULK if run.recipients_count >= settings.MAIL_BULK_THRESHOLD else SCHEDULED
+
+
+def dispatch(jobs, now=None):
+    """
+    Отправляет запуски рассылок в полосах scheduled и bulk параллельно и ждет их окончания.
+
+    Остаток часового лимита владельца считается один раз и делится между полосами.
+
+    Raises:
+        Exception: Первая ошибка, возникшая в потоках полос, после их завершения.
+    """
+    by_lane = {SCHEDULED: [], BULK: []}
+    for job in jobs:
+        by_lane[lane_for(job.run)].append(job)
+    now = now or timezone.now()
+    allowances = load_allowances({job.owner_id for job in jobs}, now) if jobs else {}
+    threads, errors = [], []
+    for name, lane_jobs in by_lane.items():
+        if lane_jobs:
+            lane_threads, lane_errors = get_lane(name).dispatch(lane_jobs, now, allowances)
+            threads += lane_threads
+            errors.append(lane_errors)
+    for thread in threads:
+        thread.join()
+    for lane_errors in errors:
+        if lane_errors:
+            raise lane_errors[0]
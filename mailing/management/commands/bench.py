@@ -0,0 +1,49 @@
+import time
+
+from django.core.management import BaseCommand
+
+from mailing.dkim import DKIMSigner, get_signer
+from mailing.models import Message, Newsletter
+from mailing.personalization import CompiledMessage, envelopes, personalize
+
+BODY = (
+    'Здравствуйте!\n\nНовая статья в блоге: https://example.com/blog/1\n'
+    'Подробности по ссылке https://example.com/about\n\nС уважением, SkyService'
+)
+
+
+class Command(BaseCommand):
+    help = 'Измеряет скорость сборки и подписи писем рассылки без отправки и обращений к базе'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=2000, help='Количество писем в каждом сценарии')
+
+    def handle(self, *args, **options):
+        count = options['count']
+        signer = get_signer() or self.ephemeral_signer()
+        newsletter = Newsletter(pk=1)
+        rows = [
+            {'id': i, 'email': f'client{i}@example.com', 'fio': f'Клиент {i}', 'comment': '', 'attributes': {}}
+            for i in range(count)
+        ]
+        scenarios = [
+            ('одинаковое тело', Message(subject='Новости SkyService', body=BODY), None),
+            ('одинаковое тело + DKIM', Message(subject='Новости SkyService', body=BODY), signer),
+            ('персонализация', Message(subject='Новости для {{ fio }}', body='{{ fio }}, ' + BODY), None),
+            ('персонализация + DKIM', Message(subject='Новости для {{ fio }}', body='{{ fio }}, ' + BODY), signer),
+        ]
+        for title, message, scenario_signer in scenarios:
+            envelopes.clear()
+            compiled = CompiledMessage(message)
+            started = time.perf_counter()
+            for row, message_id, email in personalize(newsletter, compiled, rows, signer=scenario_signer):
+                email.message().as_bytes(linesep='\r\n')
+            elapsed = time.perf_counter() - started
+            self.stdout.write(f'{title:<26} {count / elapsed:>10.0f} писем/с  ({elapsed * 1e6 / count:.0f} мкс на письмо)')
+
+    @staticmethod
+    def ephemeral_signer():
+        """Временный ключ для замера, если DKIM не настроен."""
+        from cryptography.hazmat.primitives.asymmetric import rsa
+
+        return DKIMSigner('example.com', 'bench', rsa.generate_private_key(public_exponent=65537, key_size=2048))
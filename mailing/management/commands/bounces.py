@@ -0,0 +1,77 @@
+import os
+
+from django.core.management import BaseCommand, CommandError
+
+from mailing.bounces import apply_bounces, iter_maildir, iter_mbox, mark_maildir_seen, parse_bounce
+
+
+class Command(BaseCommand):
+    help = 'Обрабатывает уведомления о недоставке из локального Maildir или mbox'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Каталог Maildir или mbox-файл с уведомлениями об отказах')
+        parser.add_argument('--batch-size', type=int, default=500, help='Количество писем в одной транзакции')
+        parser.add_argument('--limit', type=int, default=None, help='Максимум писем за один запуск')
+        parser.add_argument(
+            '--checkpoint',
+            help='Файл со смещением для mbox (по умолчанию <path>.offset). Для Maildir '
+                 'контрольной точкой служит перенос писем из new/ в cur/',
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if os.path.isdir(path):
+            if not os.path.isdir(os.path.join(path, 'new')):
+                raise CommandError(f'{path} не является каталогом Maildir')
+            processed, updated = self.handle_maildir(path, options['batch_size'], options['limit'])
+        elif os.path.isfile(path):
+            checkpoint = options['checkpoint'] or f'{path}.offset'
+            processed, updated = self.handle_mbox(path, checkpoint, options['batch_size'], options['limit'])
+        else:
+            raise CommandError(f'{path} не найден')
+        self.stdout.write(f'Обработано писем: {processed}, обновлено логов: {updated}')
+
+    def handle_maildir(self, path, batch_size, limit):
+        processed = updated = 0
+        bounces, paths = [], []
+        for file_path, message in iter_maildir(path, limit):
+            bounces.extend(parse_bounce(message))
+            paths.append(file_path)
+            if len(paths) >= batch_size:
+                updated += apply_bounces(bounces)
+                mark_maildir_seen(paths)
+                processed += len(paths)
+                bounces, paths = [], []
+        updated += apply_bounces(bounces)
+        mark_maildir_seen(paths)
+        return processed + len(paths), updated
+
+    def handle_mbox(self, path, checkpoint, batch_size, limit):
+        offset = 0
+        if os.path.exists(checkpoint):
+            with open(checkpoint) as f:
+                offset = int(f.read().strip() or 0)
+        if offset > os.path.getsize(path):
+            # Файл был ротирован, начинаем сначала
+            offset = 0
+
+        processed = updated = pending = 0
+        bounces = []
+        for offset, message in iter_mbox(path, offset, limit):
+            bounces.extend(parse_bounce(message))
+            pending += 1
+            if pending >= batch_size:
+                updated += apply_bounces(bounces)
+                self.save_checkpoint(checkpoint, offset)
+                processed += pending
+                bounces, pending = [], 0
+        updated += apply_bounces(bounces)
+        self.save_checkpoint(checkpoint, offset)
+        return processed + pending, updated
+
+    @staticmethod
+    def save_checkpoint(checkpoint, offset):
+        tmp_path = f'{checkpoint}.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write(str(offset))
+        os.replace(tmp_path, checkpoint)
@@ -0,0 +1,63 @@
+from datetime import timedelta
+
+from django.core.management import BaseCommand
+from django.utils import timezone
+
+from config.replica import replica_reads
+from mailing.planning import plan
+
+
+class Command(BaseCommand):
+    help = 'Прогноз объема и длительности рассылок без отправки писем и записи логов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=7, help='Горизонт прогноза в днях')
+        parser.add_argument('--rate', type=float, help='Скорость отправки, писем в секунду (по умолчанию - по логам)')
+        parser.add_argument(
+            '--tick', type=int, default=24 * 60,
+            help='Интервал вызовов python manage.py run по расписанию cron, минут (по умолчанию раз в сутки)',
+        )
+        parser.add_argument('--hourly-quota', type=int, help='Лимит провайдера, писем в час')
+        parser.add_argument('--domain-quota', type=int, help='Лимит на один почтовый домен, писем в час')
+        parser.add_argument('--top-domains', type=int, default=3, help='Сколько крупнейших доменов показывать за час')
+
+    def handle(self, *args, **options):
+        with replica_reads():
+            forecast = plan(days=options['days'], rate=options['rate'], tick=timedelta(minutes=options['tick']))
+        if forecast['rate_measured']:
+            source = 'по логам'
+        else:
+            source = 'задана' if options['rate'] else 'по умолчанию'
+        self.stdout.write(f'Скорость отправки: {forecast["rate"]:.2f} писем/с ({source})\n')
+
+        self.stdout.write('Запуски:')
+        for window in forecast['windows']:
+            self.stdout.write(
+                f'  рассылка #{window["newsletter"].pk:<6} '
+                f'{timezone.localtime(window["start"]):%d.%m %H:%M} - '
+                f'{timezone.localtime(window["finish"]):%d.%m %H:%M}  '
+                f'получателей: {window["recipients"]}'
+            )
+        if not forecast['windows']:
+            self.stdout.write('  нет запусков в горизонте прогноза')
+
+        self.stdout.write('\nОбъем по часам:')
+        hourly_quota, domain_quota = options['hourly_quota'], options['domain_quota']
+        for hour, volume in forecast['hourly'].items():
+            domains = sorted(forecast['hourly_domains'][hour].items(), key=lambda item: -item[1])
+            top = ', '.join(f'{domain}: {round(total)}' for domain, total in domains[:options['top_domains']])
+            line = f'  {timezone.localtime(hour):%d.%m %H:00}  {round(volume):>8}  ({top})'
+            warnings = []
+            if hourly_quota and volume > hourly_quota:
+                warnings.append(f'превышен лимит {hourly_quota}/ч')
+            over = [domain for domain, total in domains if domain_quota and total > domain_quota]
+            if over:
+                warnings.append(f'превышен лимит домена: {", ".join(over)}')
+            if warnings:
+                self.stdout.write(self.style.WARNING(f'{line}  {"; ".join(warnings)}'))
+            else:
+                self.stdout.write(line)
+
+        if forecast['windows']:
+            finish = max(window['finish'] for window in forecast['windows'])
+            self.stdout.write(f'\nВсе запуски завершатся к {timezone.localtime(finish):%d.%m.%Y %H:%M}')
@@ -1,7 +1,30 @@
 from django.core.management import BaseCommand
+
 from mailing.cron import send_email
+from mailing.profiling import make_output_dir, profile_call
 
 
 class Command(BaseCommand):
+    help = 'Отправляет запланированные рассылки; с флагами профилирования сохраняет замеры запуска'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--profile', action='store_true', help='Снять профиль cProfile (profile.prof, profile.txt)')
+        parser.add_argument(
+            '--memory', type=int, nargs='?', const=25, default=0, metavar='TOP',
+            help='Сохранить TOP строк с наибольшим выделением памяти по tracemalloc (по умолчанию 25)',
+        )
+        parser.add_argument(
+            '--timings', action='store_true',
+            help='Замерить время фаз отправки: query, render, smtp, flush (timings.json)',
+        )
+        parser.add_argument('--profile-dir', help='Каталог результатов (по умолчанию settings.PROFILE_DIR)')
+
     def handle(self, *args, **options):
-        send_email()
+        if not (options['profile'] or options['memory'] or options['timings']):
+            send_email()
+            return
+        path = make_output_dir(options['profile_dir'])
+        elapsed = profile_call(
+            send_email, path, cpu=options['profile'], memory_top=options['memory'], timings=options['timings'],
+        )
+        self.stdout.write(f'Отправка заняла {elapsed:.2f} с, результаты профилирования: {path}')
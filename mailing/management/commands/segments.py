@@ -0,0 +1,19 @@
+from django.core.management import BaseCommand
+
+from mailing.models import Segment
+from mailing.segments import refresh_segment
+
+
+class Command(BaseCommand):
+    help = 'Полный пересчет состава сегментов (например, после массового импорта клиентов)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('ids', nargs='*', type=int, help='id сегментов (по умолчанию - все)')
+
+    def handle(self, *args, **options):
+        segments = Segment.objects.all()
+        if options['ids']:
+            segments = segments.filter(pk__in=options['ids'])
+        for segment in segments:
+            added, removed = refresh_segment(segment)
+            self.stdout.write(f'{segment}: добавлено {added}, удалено {removed}')
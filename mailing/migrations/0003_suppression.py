@@ -0,0 +1,32 @@
+# Generated by Django 5.0.3 on 2026-10-19 07:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mailing', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Suppression',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('email', models.EmailField(max_length=254, unique=True, verbose_name='почта')),
+                ('reason', models.CharField(choices=[('bounce', 'Жесткий отказ'), ('complaint', 'Жалоба'), ('manual', 'Ручная блокировка')], max_length=10, verbose_name='причина')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='дата добавления')),
+                ('comment', models.TextField(blank=True, null=True, verbose_name='комментарий')),
+            ],
+            options={
+                'verbose_name': 'Блокировка адреса',
+                'verbose_name_plural': 'Список подавления',
+            },
+        ),
+        migrations.AlterField(
+            model_name='newsletter',
+            name='client',
+            field=models.ManyToManyField(blank=True, to='mailing.client', verbose_name='клиент'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.0.3 on 2026-10-19 07:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mailing', '0003_suppression'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='logs',
+            name='bounce_diagnostic',
+            field=models.TextField(blank=True, null=True, verbose_name='диагностика отказа'),
+        ),
+        migrations.AddField(
+            model_name='logs',
+            name='bounce_status',
+            field=models.CharField(blank=True, max_length=10, null=True, verbose_name='код статуса DSN'),
+        ),
+        migrations.AddField(
+            model_name='logs',
+            name='bounce_type',
+            field=models.CharField(blank=True, choices=[('hard', 'Жесткий отказ'), ('soft', 'Временный отказ')], max_length=4, null=True, verbose_name='тип отказа'),
+        ),
+        migrations.AddField(
+            model_name='logs',
+            name='bounced_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='дата обработки отказа'),
+        ),
+        migrations.AddField(
+            model_name='logs',
+            name='message_id',
+            field=models.CharField(blank=True, db_index=True, max_length=255, null=True, verbose_name='Message-ID письма'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.0.3 on 2026-10-19 07:45
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mailing', '0004_logs_bounce'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Event',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('open', 'Открытие'), ('click', 'Переход по ссылке')], max_length=5, verbose_name='тип события')),
+                ('url', models.TextField(blank=True, null=True, verbose_name='ссылка')),
+                ('created_at', models.DateTimeField(verbose_name='дата и время события')),
+                ('client', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to='mailing.client', verbose_name='клиент')),
+                ('newsletter', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to='mailing.newsletter', verbose_name='рассылка')),
+            ],
+            options={
+                'verbose_name': 'Событие',
+                'verbose_name_plural': 'События',
+                'indexes': [models.Index(fields=['newsletter', 'kind'], name='mailing_eve_newslet_7f20e3_idx')],
+            },
+        ),
+    ]
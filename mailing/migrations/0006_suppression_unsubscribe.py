@@ -0,0 +1,18 @@
+# Generated by Django 5.0.3 on 2026-10-19 07:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mailing', '0005_event'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='suppression',
+            name='reason',
+            field=models.CharField(choices=[('bounce', 'Жесткий отказ'), ('complaint', 'Жалоба'), ('manual', 'Ручная блокировка'), ('unsubscribe', 'Отписка')], max_length=11, verbose_name='причина'),
+        ),
+    ]
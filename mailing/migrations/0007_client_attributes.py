@@ -0,0 +1,23 @@
+# Generated by Django 5.0.3 on 2026-10-19 07:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mailing', '0006_suppression_unsubscribe'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='client',
+            name='attributes',
+            field=models.JSONField(blank=True, default=dict, help_text='Поля для персонализации писем, например {"город": "Москва"}', verbose_name='дополнительные поля'),
+        ),
+        migrations.AlterField(
+            model_name='message',
+            name='body',
+            field=models.TextField(help_text='Можно использовать {{ fio }}, {{ email }}, {{ comment }} и дополнительные поля клиента', verbose_name='тело письма'),
+        ),
+    ]
@@ -0,0 +1,91 @@
+# Generated by Django 5.0.3 on 2026-10-19 07:59
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.conf import settings
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+# Поисковые векторы обновляются триггерами при любой записи, в том числе bulk_create и update()
+CLIENT_TRIGGER = """
+CREATE FUNCTION mailing_client_search_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('russian', coalesce(NEW.fio, '')), 'A') ||
+        setweight(to_tsvector('simple', coalesce(NEW.email, '')), 'A') ||
+        setweight(to_tsvector('russian', coalesce(NEW.comment, '')), 'C');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER mailing_client_search_update
+    BEFORE INSERT OR UPDATE OF fio, email, comment ON mailing_client
+    FOR EACH ROW EXECUTE FUNCTION mailing_client_search_update();
+
+UPDATE mailing_client SET fio = fio;
+"""
+
+MESSAGE_TRIGGER = """
+CREATE FUNCTION mailing_message_search_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('russian', coalesce(NEW.subject, '')), 'A') ||
+        setweight(to_tsvector('russian', coalesce(NEW.body, '')), 'B');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER mailing_message_search_update
+    BEFORE INSERT OR UPDATE OF subject, body ON mailing_message
+    FOR EACH ROW EXECUTE FUNCTION mailing_message_search_update();
+
+UPDATE mailing_message SET subject = subject;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mailing', '0007_client_attributes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name='client',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(blank=True, editable=False, null=True, verbose_name='поисковый вектор'),
+        ),
+        migrations.AddField(
+            model_name='message',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(blank=True, editable=False, null=True, verbose_name='поисковый вектор'),
+        ),
+        migrations.AddIndex(
+            model_name='client',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='client_search_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='client',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['email'], name='client_email_trgm_idx', opclasses=['gin_trgm_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='message_search_idx'),
+        ),
+        migrations.RunSQL(
+            CLIENT_TRIGGER,
+            reverse_sql="""
+                DROP TRIGGER mailing_client_search_update ON mailing_client;
+                DROP FUNCTION mailing_client_search_update();
+            """,
+        ),
+        migrations.RunSQL(
+            MESSAGE_TRIGGER,
+            reverse_sql="""
+                DROP TRIGGER mailing_message_search_update ON mailing_message;
+                DROP FUNCTION mailing_message_search_update();
+            """,
+        ),
+    ]
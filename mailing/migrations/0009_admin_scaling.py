@@ -0,0 +1,34 @@
+# Generated by Django 5.0.3 on 2026-10-19 08:01
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Индексы таблицы логов строятся без блокировки записи
+    atomic = False
+
+    dependencies = [
+        ('mailing', '0008_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='logs',
+            name='retry',
+            field=models.BooleanField(default=False, verbose_name='повторить отправку'),
+        ),
+        migrations.AddField(
+            model_name='newsletter',
+            name='is_paused',
+            field=models.BooleanField(default=False, verbose_name='приостановлена'),
+        ),
+        AddIndexConcurrently(
+            model_name='logs',
+            index=models.Index(fields=['attempt_time'], name='logs_attempt_time_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='logs',
+            index=models.Index(condition=models.Q(('retry', True)), fields=['newsletter'], name='logs_retry_idx'),
+        ),
+    ]
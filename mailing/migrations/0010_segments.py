@@ -0,0 +1,61 @@
+# Generated by Django 5.0.3 on 2026-10-19 08:02
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mailing', '0009_admin_scaling'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='client',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name='дата добавления'),
+        ),
+        migrations.CreateModel(
+            name='Segment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, verbose_name='название')),
+                ('email_domain', models.CharField(blank=True, help_text='Например, mail.ru', max_length=255, null=True, verbose_name='почтовый домен')),
+                ('created_from', models.DateTimeField(blank=True, null=True, verbose_name='клиенты, добавленные с')),
+                ('created_to', models.DateTimeField(blank=True, null=True, verbose_name='клиенты, добавленные по')),
+                ('attributes', models.JSONField(blank=True, default=dict, help_text='Клиент входит в сегмент, если все перечисленные поля совпадают, например {"город": "Москва"}', verbose_name='значения дополнительных полей')),
+                ('refreshed_at', models.DateTimeField(blank=True, null=True, verbose_name='дата пересчета')),
+                ('client_owner', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='клиенты пользователя')),
+                ('owner', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL, verbose_name='владелец')),
+            ],
+            options={
+                'verbose_name': 'Сегмент',
+                'verbose_name_plural': 'Сегменты',
+            },
+        ),
+        migrations.AddField(
+            model_name='newsletter',
+            name='segment',
+            field=models.ForeignKey(blank=True, help_text='Получатели сегмента добавляются к выбранным вручную клиентам', null=True, on_delete=django.db.models.deletion.SET_NULL, to='mailing.segment', verbose_name='сегмент'),
+        ),
+        migrations.CreateModel(
+            name='SegmentMember',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('client', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='mailing.client', verbose_name='клиент')),
+                ('segment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='members', to='mailing.segment', verbose_name='сегмент')),
+            ],
+            options={
+                'verbose_name': 'Участник сегмента',
+                'verbose_name_plural': 'Участники сегментов',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='segmentmember',
+            constraint=models.UniqueConstraint(fields=('segment', 'client'), name='segment_member_unique'),
+        ),
+    ]
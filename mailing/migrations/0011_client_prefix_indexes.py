@@ -0,0 +1,28 @@
+# Generated by Django 5.0.3 on 2026-10-19 08:04
+
+import django.contrib.postgres.indexes
+import django.db.models.functions.text
+from django.conf import settings
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Индексы таблицы клиентов строятся без блокировки записи
+    atomic = False
+
+    dependencies = [
+        ('mailing', '0010_segments'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='client',
+            index=models.Index(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Lower('email'), name='text_pattern_ops'), name='client_email_prefix_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='client',
+            index=models.Index(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Lower('fio'), name='text_pattern_ops'), name='client_fio_prefix_idx'),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.0.3 on 2026-10-19 08:06
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mailing', '0011_client_prefix_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Run',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('started_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='время запуска')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='время завершения')),
+                ('recipients_count', models.PositiveIntegerField(default=0, verbose_name='получателей в снимке')),
+                ('newsletter', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='runs', to='mailing.newsletter', verbose_name='рассылка')),
+            ],
+            options={
+                'verbose_name': 'Запуск рассылки',
+                'verbose_name_plural': 'Запуски рассылок',
+            },
+        ),
+        migrations.CreateModel(
+            name='RunRecipient',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('client', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='mailing.client', verbose_name='клиент')),
+                ('run', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recipients', to='mailing.run', verbose_name='запуск')),
+            ],
+            options={
+                'verbose_name': 'Получатель запуска',
+                'verbose_name_plural': 'Получатели запусков',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='runrecipient',
+            constraint=models.UniqueConstraint(fields=('run', 'client'), name='run_recipient_unique'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.0.3 on 2026-10-19 08:07
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mailing', '0012_runs'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='run',
+            name='last_client_id',
+            field=models.BigIntegerField(blank=True, null=True, verbose_name='последний обработанный клиент'),
+        ),
+        migrations.CreateModel(
+            name='SendingQuota',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('weight', models.PositiveSmallIntegerField(default=1, help_text='Во сколько раз больше писем за круг, чем у пользователя с весом 1', verbose_name='вес')),
+                ('concurrency', models.PositiveSmallIntegerField(blank=True, help_text='Пусто - SCHEDULER_CONCURRENCY', null=True, verbose_name='одновременных рассылок')),
+                ('hourly_limit', models.PositiveIntegerField(blank=True, help_text='Пусто - SCHEDULER_HOURLY_LIMIT, 0 - без ограничения', null=True, verbose_name='писем в час')),
+                ('owner', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='sending_quota', to=settings.AUTH_USER_MODEL, verbose_name='пользователь')),
+            ],
+            options={
+                'verbose_name': 'Квота отправки',
+                'verbose_name_plural': 'Квоты отправки',
+            },
+        ),
+    ]
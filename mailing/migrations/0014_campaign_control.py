@@ -0,0 +1,28 @@
+# Generated by Django 5.0.3 on 2026-10-19 08:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mailing', '0013_sending_quota'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='newsletter',
+            name='aborted_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='время отмены запуска'),
+        ),
+        migrations.AddField(
+            model_name='newsletter',
+            name='rate_limit',
+            field=models.FloatField(blank=True, help_text='Пусто - без ограничения', null=True, verbose_name='писем в секунду'),
+        ),
+        migrations.AddField(
+            model_name='run',
+            name='is_aborted',
+            field=models.BooleanField(default=False, verbose_name='отменен'),
+        ),
+    ]
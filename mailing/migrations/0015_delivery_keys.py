@@ -0,0 +1,38 @@
+# Generated by Django 5.0.3 on 2026-10-19 08:16
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mailing', '0014_campaign_control'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='run',
+            name='period',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='период рассылки'),
+        ),
+        migrations.CreateModel(
+            name='Delivery',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.DateTimeField(verbose_name='период рассылки')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='время отправки')),
+                ('client', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='mailing.client', verbose_name='клиент')),
+                ('newsletter', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='mailing.newsletter', verbose_name='рассылка')),
+            ],
+            options={
+                'verbose_name': 'Доставка',
+                'verbose_name_plural': 'Доставки',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='delivery',
+            constraint=models.UniqueConstraint(fields=('newsletter', 'period', 'client'), name='delivery_unique'),
+        ),
+    ]
@@ -0,0 +1,20 @@
+from django.db import migrations
+
+# Адреса, различающиеся только регистром, сводятся к самой ранней блокировке
+LOWER_EMAILS = """
+DELETE FROM mailing_suppression AS duplicate
+    USING mailing_suppression AS kept
+    WHERE lower(duplicate.email) = lower(kept.email) AND duplicate.id > kept.id;
+UPDATE mailing_suppression SET email = lower(email) WHERE email <> lower(email);
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mailing', '0015_delivery_keys'),
+    ]
+
+    operations = [
+        migrations.RunSQL(LOWER_EMAILS, migrations.RunSQL.noop),
+    ]
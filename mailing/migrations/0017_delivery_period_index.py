@@ -0,0 +1,17 @@
+# Generated by Django 5.0.3 on 2026-10-19 08:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mailing', '0016_suppression_lower_email'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='delivery',
+            index=models.Index(fields=['period'], name='delivery_period_idx'),
+        ),
+    ]
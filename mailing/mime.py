@@ -0,0 +1,151 @@
+import base64
+import hashlib
+import re
+from email.parser import BytesHeaderParser
+
+from django.core.mail import get_connection
+
+from mailing.dkim import canonicalize_body
+
+# Максимальная длина строки письма по RFC 5322 и длина подставляемого значения по умолчанию
+LINE_LENGTH_LIMIT = 998
+SLOT_LENGTH_LIMIT = 256
+
+
+class Envelope:
+    """
+    Заранее закодированное письмо с местами для подстановки значений получателя.
+
+    Письмо собирается и кодируется один раз (тема в RFC 2047, тела частей, границы
+    multipart), затем разбивается на неизменяемые куски байтов по меткам вида
+    _<marker>_<ИМЯ>_. Для каждого получателя остается только склеить куски
+    с подставленными заголовками и ссылками.
+
+    Тело письма также канонизируется для DKIM один раз: подставляемые значения
+    не содержат пробелов, поэтому для получателя остается только досчитать
+    SHA-256 от подстановок и кусков после неизменяемого начала.
+
+    Атрибуты:
+        segments (list[bytes]): Неизменяемые куски письма.
+        slots (list[str]): Имена подставляемых значений между кусками.
+        body_segments (list[bytes]): Куски канонизированного тела письма.
+        body_slots (list[str]): Имена подстановок в теле письма.
+    """
+
+    def __init__(self, raw, marker):
+        pattern = self.pattern(marker)
+        parts = pattern.split(raw)
+        self.segments = parts[0::2]
+        self.slots = [name.decode() for name in parts[1::2]]
+
+        body_parts = pattern.split(canonicalize_body(raw.partition(b'\r\n\r\n')[2]))
+        self.body_segments = body_parts[0::2]
+        self.body_slots = [name.decode() for name in body_parts[1::2]]
+        self.body_prefix = hashlib.sha256(self.body_segments[0])
+
+    @staticmethod
+    def pattern(marker):
+        return re.compile(rb'_' + marker.encode() + rb'_([A-Z0-9]+)_')
+
+    @staticmethod
+    def placeholder(marker, name):
+        return f'_{marker}_{name}_'
+
+    @classmethod
+    def build(cls, email_message, marker, slot_lengths=None):
+        """
+        Кодирует письмо с метками вместо значений получателя.
+
+        Args:
+            email_message (EmailMessage): Письмо с метками вместо значений получателя.
+            marker (str): Случайная метка, которой помечены подстановки.
+            slot_lengths (dict[str, int], optional): Максимальная длина значения для каждой подстановки.
+
+        Returns:
+            Envelope | None: None, если части письма закодированы в base64 или
+            quoted-printable либо строки слишком длинные: тогда подстановка
+            в готовые байты невозможна и письмо нужно собирать обычным способом.
+        """
+        message = email_message.message()
+        for part in message.walk():
+            if part.is_multipart():
+                continue
+            if part.get('Content-Transfer-Encoding', '7bit').lower() not in ('7bit', '8bit'):
+                return None
+        raw = message.as_bytes(linesep='\r\n')
+        slot_lengths = slot_lengths or {}
+        pattern = cls.pattern(marker)
+        for line in raw.split(b'\r\n'):
+            length = len(line)
+            for match in pattern.finditer(line):
+                length += slot_lengths.get(match.group(1).decode(), SLOT_LENGTH_LIMIT) - len(match.group(0))
+            if length > LINE_LENGTH_LIMIT:
+                return None
+        return cls(raw, marker)
+
+    def render(self, values):
+        """Собирает байты письма, подставляя значения получателя по именам меток."""
+        chunks = [self.segments[0]]
+        for name, segment in zip(self.slots, self.segments[1:]):
+            chunks.append(values[name].encode())
+            chunks.append(segment)
+        return b''.join(chunks)
+
+    def body_hash(self, values):
+        """Возвращает хеш тела для DKIM (тег bh=) с подставленными значениями получателя."""
+        digest = self.body_prefix.copy()
+        for name, segment in zip(self.body_slots, self.body_segments[1:]):
+            digest.update(values[name].encode())
+            digest.update(segment)
+        return base64.b64encode(digest.digest())
+
+
+class RawMessage:
+    """Готовые байты письма с интерфейсом, который ожидают почтовые бэкенды Django."""
+
+    def __init__(self, raw):
+        self.raw = raw
+
+    def as_bytes(self, unixfrom=False, linesep='\n'):
+        return self.raw if linesep == '\r\n' else self.raw.replace(b'\r\n', linesep.encode())
+
+    def as_string(self, unixfrom=False, linesep='\n'):
+        return self.as_bytes(linesep=linesep).decode('utf-8', 'replace')
+
+    def get_charset(self):
+        return None
+
+    def __getitem__(self, name):
+        return BytesHeaderParser().parsebytes(self.raw)[name]
+
+
+class PrecompiledEmail:
+    """
+    Письмо из готовых байтов, совместимое с EmailMessage для отправки через бэкенды Django.
+
+    Атрибуты:
+        raw (bytes): Полностью собранное письмо.
+        from_email (str): Адрес отправителя для конверта SMTP.
+        to (list[str]): Адреса получателей.
+        subject (str): Тема письма (для логов и тестового бэкенда).
+    """
+    encoding = None
+    cc = bcc = ()
+
+    def __init__(self, raw, from_email, to, subject, connection=None):
+        self.raw = raw
+        self.from_email = from_email
+        self.to = to
+        self.subject = subject
+        self.connection = connection
+
+    def recipients(self):
+        return list(self.to)
+
+    def message(self):
+        return RawMessage(self.raw)
+
+    def send(self, fail_silently=False):
+        if self.connection is None:
+            self.connection = get_connection(fail_silently=fail_silently)
+        return self.connection.send_messages([self])
@@ -1,5 +1,9 @@
 from django.conf import settings
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
+from django.db.models.functions import Lower
+from django.utils import timezone
 
 from config.settings import NULLABLE
 
@@ -8,7 +12,14 @@ class Client(models.Model):
     email = models.EmailField(verbose_name='почта', unique=True)
     fio = models.CharField(max_length=50, verbose_name='ФИО')
     comment = models.TextField(verbose_name='комментарий', **NULLABLE)
+    attributes = models.JSONField(
+        default=dict, blank=True, verbose_name='дополнительные поля',
+        help_text='Поля для персонализации писем, например {"город": "Москва"}',
+    )
     owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, verbose_name='владелец', **NULLABLE)
+    created_at = models.DateTimeField(default=timezone.now, verbose_name='дата добавления')
+    # Заполняется триггером базы данных из fio, email и comment
+    search_vector = SearchVectorField(verbose_name='поисковый вектор', editable=False, **NULLABLE)
 
     def __str__(self):
         return f'ФИО: {self.fio}, почта: {self.email}'
@@ -16,19 +27,73 @@ class Client(models.Model):
     class Meta:
         verbose_name = 'Клиент'
         verbose_name_plural = 'Клиенты'
+        indexes = [
+            GinIndex(fields=['search_vector'], name='client_search_idx'),
+            # Поиск по части адреса (email ILIKE '%...%', см. mailing/search.py, и похожесть триграмм)
+            GinIndex(fields=['email'], name='client_email_trgm_idx', opclasses=['gin_trgm_ops']),
+            # Автодополнение: поиск по началу адреса и ФИО без учета регистра (LIKE 'abc%')
+            models.Index(OpClass(Lower('email'), name='text_pattern_ops'), name='client_email_prefix_idx'),
+            models.Index(OpClass(Lower('fio'), name='text_pattern_ops'), name='client_fio_prefix_idx'),
+        ]
+
+
+class Segment(models.Model):
+    name = models.CharField(max_length=100, verbose_name='название')
+    # Правила отбора; пустое правило не ограничивает сегмент
+    client_owner = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, related_name='+',
+        verbose_name='клиенты пользователя', **NULLABLE,
+    )
+    email_domain = models.CharField(max_length=255, verbose_name='почтовый домен', help_text='Например, mail.ru', **NULLABLE)
+    created_from = models.DateTimeField(verbose_name='клиенты, добавленные с', **NULLABLE)
+    created_to = models.DateTimeField(verbose_name='клиенты, добавленные по', **NULLABLE)
+    attributes = models.JSONField(
+        default=dict, blank=True, verbose_name='значения дополнительных полей',
+        help_text='Клиент входит в сегмент, если все перечисленные поля совпадают, например {"город": "Москва"}',
+    )
+    refreshed_at = models.DateTimeField(verbose_name='дата пересчета', **NULLABLE)
+    owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, verbose_name='владелец', **NULLABLE)
+
+    def __str__(self):
+        return self.name
+
+    class Meta:
+        verbose_name = 'Сегмент'
+        verbose_name_plural = 'Сегменты'
+
+
+class SegmentMember(models.Model):
+    """Материализованный состав сегмента: пересчитывается при изменении клиентов и правил."""
+    segment = models.ForeignKey(Segment, on_delete=models.CASCADE, related_name='members', verbose_name='сегмент')
+    client = models.ForeignKey(Client, on_delete=models.CASCADE, related_name='+', verbose_name='клиент')
+
+    class Meta:
+        verbose_name = 'Участник сегмента'
+        verbose_name_plural = 'Участники сегментов'
+        constraints = [
+            models.UniqueConstraint(fields=['segment', 'client'], name='segment_member_unique'),
+        ]
 
 
 class Message(models.Model):
     subject = models.CharField(max_length=30, verbose_name='Тема письма')
-    body = models.TextField(verbose_name='тело письма')
+    body = models.TextField(
+        verbose_name='тело письма',
+        help_text='Можно использовать {{ fio }}, {{ email }}, {{ comment }} и дополнительные поля клиента',
+    )
     owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, verbose_name='владелец', **NULLABLE)
+    # Заполняется триггером базы данных из subject и body
+    search_vector = SearchVectorField(verbose_name='поисковый вектор', editable=False, **NULLABLE)
 
     def __str__(self):
-        return {self.subject}
+        return self.subject
 
     class Meta:
         verbose_name = 'Сообщение'
         verbose_name_plural = 'Сообщения'
+        indexes = [
+            GinIndex(fields=['search_vector'], name='message_search_idx'),
+        ]
 
 
 class Newsletter(models.Model):
@@ -57,7 +122,15 @@ class Newsletter(models.Model):
     )
     client = models.ManyToManyField(Client, verbose_name='клиент', blank=True)
     message = models.ForeignKey(Message, verbose_name='сообщение', on_delete=models.CASCADE, **NULLABLE)
+    segment = models.ForeignKey(
+        Segment, on_delete=models.SET_NULL, verbose_name='сегмент',
+        help_text='Получатели сегмента добавляются к выбранным вручную клиентам', **NULLABLE,
+    )
     owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, verbose_name='владелец', **NULLABLE)
+    is_paused = models.BooleanField(default=False, verbose_name='приостановлена')
+    rate_limit = models.FloatField(verbose_name='писем в секунду', help_text='Пусто - без ограничения', **NULLABLE)
+    # Запуски, начатые не позже этого момента, прерываются
+    aborted_at = models.DateTimeField(verbose_name='время отмены запуска', **NULLABLE)
 
     def __str__(self):
         return f'Время: {self.start_time} - {self.end_time}, статус рассылки: {self.status}, периодичность рассылки: {self.periodicity}'
@@ -71,10 +144,101 @@ class Newsletter(models.Model):
         ]
 
 
+class Run(models.Model):
+    """Запуск рассылки с неизменяемым снимком аудитории на момент старта."""
+    newsletter = models.ForeignKey(Newsletter, on_delete=models.CASCADE, related_name='runs', verbose_name='рассылка')
+    started_at = models.DateTimeField(default=timezone.now, verbose_name='время запуска')
+    # Окно расписания, к которому относится запуск; входит в ключ идемпотентности Delivery
+    period = models.DateTimeField(verbose_name='период рассылки', **NULLABLE)
+    finished_at = models.DateTimeField(verbose_name='время завершения', **NULLABLE)
+    recipients_count = models.PositiveIntegerField(default=0, verbose_name='получателей в снимке')
+    # Контрольная точка: получатели снимка обходятся по возрастанию id, прерванный запуск продолжается после нее
+    last_client_id = models.BigIntegerField(verbose_name='последний обработанный клиент', **NULLABLE)
+    is_aborted = models.BooleanField(default=False, verbose_name='отменен')
+
+    def __str__(self):
+        return f'Запуск {self.newsletter_id} от {self.started_at}'
+
+    class Meta:
+        verbose_name = 'Запуск рассылки'
+        verbose_name_plural = 'Запуски рассылок'
+
+
+class RunRecipient(models.Model):
+    """Получатель из снимка аудитории запуска; строки только добавляются при старте запуска."""
+    run = models.ForeignKey(Run, on_delete=models.CASCADE, related_name='recipients', verbose_name='запуск')
+    client = models.ForeignKey(Client, on_delete=models.CASCADE, related_name='+', verbose_name='клиент')
+
+    class Meta:
+        verbose_name = 'Получатель запуска'
+        verbose_name_plural = 'Получатели запусков'
+        constraints = [
+            models.UniqueConstraint(fields=['run', 'client'], name='run_recipient_unique'),
+        ]
+
+
+class Delivery(models.Model):
+    """
+    Ключ идемпотентности: письмо рассылки клиенту за период отправлено или отправляется.
+
+    Ключ занимается перед отправкой; уникальный индекс не дает пересекающимся или
+    повторным запускам отправить письмо дважды.
+    """
+    newsletter = models.ForeignKey(Newsletter, on_delete=models.CASCADE, related_name='+', verbose_name='рассылка')
+    client = models.ForeignKey(Client, on_delete=models.CASCADE, related_name='+', verbose_name='клиент')
+    period = models.DateTimeField(verbose_name='период рассылки')
+    created_at = models.DateTimeField(default=timezone.now, verbose_name='время отправки')
+
+    class Meta:
+        verbose_name = 'Доставка'
+        verbose_name_plural = 'Доставки'
+        constraints = [
+            models.UniqueConstraint(fields=['newsletter', 'period', 'client'], name='delivery_unique'),
+        ]
+        indexes = [
+            # Удаление ключей завершенных периодов (mailing.delivery.prune)
+            models.Index(fields=['period'], name='delivery_period_idx'),
+        ]
+
+
+class SendingQuota(models.Model):
+    """Доля пользователя в общей пропускной способности отправки; без записи действуют настройки SCHEDULER_*."""
+    owner = models.OneToOneField(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='sending_quota', verbose_name='пользователь',
+    )
+    weight = models.PositiveSmallIntegerField(
+        default=1, verbose_name='вес', help_text='Во сколько раз больше писем за круг, чем у пользователя с весом 1',
+    )
+    concurrency = models.PositiveSmallIntegerField(
+        verbose_name='одновременных рассылок', help_text='Пусто - SCHEDULER_CONCURRENCY', **NULLABLE,
+    )
+    hourly_limit = models.PositiveIntegerField(
+        verbose_name='писем в час', help_text='Пусто - SCHEDULER_HOURLY_LIMIT, 0 - без ограничения', **NULLABLE,
+    )
+
+    def __str__(self):
+        return f'{self.owner}: вес {self.weight}'
+
+    class Meta:
+        verbose_name = 'Квота отправки'
+        verbose_name_plural = 'Квоты отправки'
+
+
 class Logs(models.Model):
     attempt = models.BooleanField(verbose_name='статус попытки')
     attempt_time = models.DateTimeField(verbose_name='дата и время последней попытки')
     response = models.CharField(max_length=100, verbose_name='ответ почтового сервера', **NULLABLE)
+    message_id = models.CharField(max_length=255, verbose_name='Message-ID письма', db_index=True, **NULLABLE)
+
+    bounce_choices = [
+        ('hard', 'Жесткий отказ'),
+        ('soft', 'Временный отказ'),
+    ]
+    bounce_type = models.CharField(max_length=4, choices=bounce_choices, verbose_name='тип отказа', **NULLABLE)
+    bounce_status = models.CharField(max_length=10, verbose_name='код статуса DSN', **NULLABLE)
+    bounce_diagnostic = models.TextField(verbose_name='диагностика отказа', **NULLABLE)
+    bounced_at = models.DateTimeField(verbose_name='дата обработки отказа', **NULLABLE)
+    retry = models.BooleanField(default=False, verbose_name='повторить отправку')
 
     newsletter = models.ForeignKey(Newsletter, verbose_name='рассылка', null=True, on_delete=models.SET_NULL)
     client = models.ForeignKey(Client, verbose_name='клиент', null=True, on_delete=models.SET_NULL)
@@ -86,6 +250,59 @@ class Logs(models.Model):
     class Meta:
         verbose_name = 'Лог'
         verbose_name_plural = 'Логи'
+        indexes = [
+            models.Index(fields=['attempt_time'], name='logs_attempt_time_idx'),
+            # Частичный индекс: попытки, ожидающие повторной отправки, - малая доля таблицы
+            models.Index(fields=['newsletter'], condition=models.Q(retry=True), name='logs_retry_idx'),
+        ]
+
+
+class Event(models.Model):
+    kind_choices = [
+        ('open', 'Открытие'),
+        ('click', 'Переход по ссылке'),
+    ]
+    kind = models.CharField(max_length=5, choices=kind_choices, verbose_name='тип события')
+    url = models.TextField(verbose_name='ссылка', **NULLABLE)
+    created_at = models.DateTimeField(verbose_name='дата и время события')
+
+    newsletter = models.ForeignKey(Newsletter, verbose_name='рассылка', null=True, on_delete=models.SET_NULL)
+    client = models.ForeignKey(Client, verbose_name='клиент', null=True, on_delete=models.SET_NULL)
+
+    def __str__(self):
+        return f'{self.get_kind_display()}: {self.created_at}'
+
+    class Meta:
+        verbose_name = 'Событие'
+        verbose_name_plural = 'События'
+        indexes = [
+            models.Index(fields=['newsletter', 'kind']),
+        ]
+
+
+class Suppression(models.Model):
+    reason_choices = [
+        ('bounce', 'Жесткий отказ'),
+        ('complaint', 'Жалоба'),
+        ('manual', 'Ручная блокировка'),
+        ('unsubscribe', 'Отписка'),
+    ]
+    email = models.EmailField(verbose_name='почта', unique=True)
+    reason = models.CharField(max_length=11, choices=reason_choices, verbose_name='причина')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='дата добавления')
+    comment = models.TextField(verbose_name='комментарий', **NULLABLE)
+
+    def __str__(self):
+        return f'{self.email} ({self.get_reason_display()})'
+
+    def save(self, *args, **kwargs):
+        # Список подавления сравнивается с адресами клиентов без учета регистра
+        self.email = self.email.lower()
+        super().save(*args, **kwargs)
+
+    class Meta:
+        verbose_name = 'Блокировка адреса'
+        verbose_name_plural = 'Список подавления'
 
 
 class Contact(models.Model):
@@ -0,0 +1,107 @@
+"""
+Область видимости пользователя: какие клиенты, сообщения и рассылки ему доступны.
+
+Область вычисляется один раз (суперпользователь, персонал, права менеджера,
+id владельца), кешируется в сессии на PERMISSION_SCOPE_TTL секунд и применяется
+к queryset'ам как фильтр ORM. Права на изменение и удаление добавляются к строкам
+аннотациями can_change и can_delete, поэтому шаблонам не нужно сравнивать
+владельцев и проверять права для каждой строки.
+"""
+import time
+
+from django.conf import settings
+from django.db.models import BooleanField, ExpressionWrapper, Q, Value
+
+SESSION_KEY = '_mailing_scope'
+# Модели с полем owner, доступ к которым ограничивается областью видимости
+SCOPED_MODELS = ('client', 'message', 'newsletter', 'segment')
+ACTIONS = ('view', 'change', 'delete')
+
+
+def compute_scope(user):
+    """
+    Вычисляет область видимости пользователя.
+
+    Args:
+        user (User): Авторизованный пользователь.
+
+    Returns:
+        dict: id пользователя и, для каждого действия, модели, к которым у него есть доступ
+        независимо от владельца.
+    """
+    permissions = user.get_all_permissions()
+    scope = {'user_id': user.pk, 'expires': time.time() + settings.PERMISSION_SCOPE_TTL}
+    for action in ACTIONS:
+        scope[action] = [
+            model for model in SCOPED_MODELS
+            if user.is_superuser
+            or (action == 'view' and user.is_staff)
+            or f'mailing.{action}_{model}' in permissions
+        ]
+    return scope
+
+
+def get_scope(request):
+    """
+    Возвращает область видимости текущего пользователя.
+
+    Область берется из запроса, затем из сессии и только при их отсутствии
+    (или по истечении срока) вычисляется заново.
+
+    Returns:
+        Scope: Область видимости пользователя.
+    """
+    if not hasattr(request, '_mailing_scope'):
+        scope = request.session.get(SESSION_KEY)
+        if not scope or scope['user_id'] != request.user.pk or scope['expires'] < time.time():
+            scope = compute_scope(request.user)
+            request.session[SESSION_KEY] = scope
+        request._mailing_scope = Scope(scope)
+    return request._mailing_scope
+
+
+class Scope:
+    """
+    Область видимости пользователя, применяемая к queryset'ам моделей с владельцем.
+    """
+
+    def __init__(self, data):
+        self.user_id = data['user_id']
+        self.models = {action: frozenset(data[action]) for action in ACTIONS}
+
+    def allows_all(self, model, action='view'):
+        """Проверяет, доступны ли пользователю все объекты модели, а не только свои."""
+        return model._meta.model_name in self.models[action]
+
+    def condition(self, model, action):
+        if self.allows_all(model, action):
+            return Value(True)
+        return ExpressionWrapper(Q(owner_id=self.user_id), output_field=BooleanField())
+
+    def filter(self, queryset, action='view'):
+        """
+        Ограничивает queryset объектами, доступными пользователю для действия action,
+        и аннотирует строки флагами can_change и can_delete.
+        """
+        if not self.allows_all(queryset.model, action):
+            queryset = queryset.filter(owner_id=self.user_id)
+        return queryset.annotate(
+            can_change=self.condition(queryset.model, 'change'),
+            can_delete=self.condition(queryset.model, 'delete'),
+        )
+
+
+class ScopedQuerysetMixin:
+    """
+    Миксин представлений: queryset ограничивается областью видимости пользователя.
+
+    Объекты вне области не находятся, и DetailView/UpdateView/DeleteView отвечают 404
+    без отдельной проверки владельца.
+
+    Атрибуты:
+        scope_action (str): Действие, для которого проверяется доступ ('view', 'change' или 'delete').
+    """
+    scope_action = 'view'
+
+    def get_queryset(self):
+        return get_scope(self.request).filter(super().get_queryset(), self.scope_action)
@@ -0,0 +1,206 @@
+import secrets
+from collections import OrderedDict
+from email.utils import formatdate
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, make_msgid
+from django.template import Context, Engine
+
+from config.db import stream_values
+from mailing.mime import Envelope, PrecompiledEmail
+from mailing.tracking import click_url, open_url, render_tracked, tracked_bodies
+from mailing.unsubscribe import unsubscribe_headers, unsubscribe_url
+
+# Письма отправляются как обычный текст, HTML-экранирование в шаблонах не нужно
+engine = Engine(autoescape=False)
+
+RECIPIENT_FIELDS = ('id', 'email', 'fio', 'comment', 'attributes')
+
+# Закодированные письма для одинаковых сообщений: ключ - (тема, тело, отправитель)
+ENVELOPE_CACHE_SIZE = 32
+envelopes = OrderedDict()
+MAX_ID = 2 ** 63 - 1
+
+
+class CompiledMessage:
+    """
+    Сообщение рассылки, скомпилированное в шаблоны один раз на запуск.
+
+    Тема и тело поддерживают переменные {{ fio }}, {{ email }}, {{ comment }}
+    и произвольные поля из Client.attributes. Если в тексте нет шаблонных тегов,
+    рендеринг пропускается.
+
+    Атрибуты:
+        subject (Template | str): Шаблон темы письма.
+        body (Template | str): Шаблон тела письма.
+    """
+
+    def __init__(self, message):
+        self.subject = self.compile(message.subject)
+        self.body = self.compile(message.body)
+
+    @property
+    def is_static(self):
+        """Истина, если текст письма одинаков для всех получателей."""
+        return isinstance(self.subject, str) and isinstance(self.body, str)
+
+    @staticmethod
+    def compile(text):
+        if '{{' not in text and '{%' not in text:
+            return text
+        return engine.from_string(text)
+
+    def render(self, context):
+        """Возвращает тему и тело письма для контекста получателя."""
+        context = Context(context, autoescape=False)
+        subject = self.subject if isinstance(self.subject, str) else self.subject.render(context)
+        body = self.body if isinstance(self.body, str) else self.body.render(context)
+        # Заголовок не может содержать перевод строки
+        return ' '.join(subject.split()), body
+
+
+def recipient_context(row):
+    """Контекст шаблона получателя: словарь из values() без создания экземпляров модели."""
+    context = dict(row['attributes'] or {})
+    context.update(fio=row['fio'], email=row['email'], comment=row['comment'] or '')
+    return context
+
+
+def iter_recipients(queryset, chunk_size=2000):
+    """Потоково читает получателей словарями, не загружая всю аудиторию в память."""
+    return stream_values(queryset, RECIPIENT_FIELDS, chunk_size=chunk_size)
+
+
+def with_unsubscribe(text, html, url):
+    """Добавляет ссылку отписки в текстовую и HTML-версии письма."""
+    return text + f'\n\nОтписаться от рассылки: {url}', html + f'<p><a href="{url}">Отписаться от рассылки</a></p>'
+
+
+def get_envelope(subject, body):
+    """
+    Возвращает заранее закодированное письмо для сообщения, одинакового для всех получателей.
+
+    Письмо собирается с метками вместо адреса получателя, Message-ID, даты
+    и ссылок отслеживания и кешируется в памяти процесса.
+
+    Returns:
+        tuple[Envelope | None, list[str]]: Закодированное письмо (None, если его нельзя
+        собрать заранее) и исходные адреса ссылок в порядке меток CLICK<n>.
+    """
+    key = (subject, body, settings.EMAIL_HOST_USER)
+    if key in envelopes:
+        envelopes.move_to_end(key)
+        return envelopes[key]
+
+    marker = secrets.token_hex(4)
+    links = []
+
+    def link(url):
+        links.append(url)
+        return Envelope.placeholder(marker, f'CLICK{len(links) - 1}')
+
+    text, html = render_tracked(body, link, Envelope.placeholder(marker, 'OPEN'))
+    text, html = with_unsubscribe(text, html, Envelope.placeholder(marker, 'UNSUB'))
+    email = EmailMultiAlternatives(
+        subject=subject,
+        body=text,
+        from_email=settings.EMAIL_HOST_USER,
+        to=[Envelope.placeholder(marker, 'TO')],
+        headers={
+            'Message-ID': Envelope.placeholder(marker, 'MID'),
+            'Date': Envelope.placeholder(marker, 'DATE'),
+            **unsubscribe_headers(Envelope.placeholder(marker, 'UNSUB')),
+        },
+    )
+    email.attach_alternative(html, 'text/html')
+
+    # Длины подстановок с запасом на максимальные идентификаторы и адрес
+    slot_lengths = {
+        'UNSUB': len(unsubscribe_url('x' * 254)),
+        'OPEN': len(open_url(MAX_ID, MAX_ID)),
+        **{f'CLICK{index}': len(click_url(MAX_ID, MAX_ID, url)) for index, url in enumerate(links)},
+    }
+    envelopes[key] = Envelope.build(email, marker, slot_lengths), links
+    if len(envelopes) > ENVELOPE_CACHE_SIZE:
+        envelopes.popitem(last=False)
+    return envelopes[key]
+
+
+def build_email(newsletter, subject, body, row, message_id, connection=None):
+    """Собирает письмо получателю обычным способом, с кодированием всех частей."""
+    text, html = tracked_bodies(body, newsletter.pk, row['id'])
+    unsubscribe = unsubscribe_url(row['email'])
+    text, html = with_unsubscribe(text, html, unsubscribe)
+    email = EmailMultiAlternatives(
+        subject=subject,
+        body=text,
+        from_email=settings.EMAIL_HOST_USER,
+        to=[row['email']],
+        headers={'Message-ID': message_id, **unsubscribe_headers(unsubscribe)},
+        connection=connection,
+    )
+    email.attach_alternative(html, 'text/html')
+    return email
+
+
+def sign_email(signer, email, connection=None):
+    """Подписывает собранное обычным способом письмо DKIM."""
+    raw = signer.sign(email.message().as_bytes(linesep='\r\n'))
+    return PrecompiledEmail(raw, email.from_email, email.to, email.subject, connection=connection)
+
+
+def build_precompiled(newsletter, envelope, links, subject, row, message_id, connection=None, signer=None):
+    """
+    Собирает письмо получателю из закодированного заранее письма, подставляя только его значения.
+
+    Подпись DKIM использует хеш тела, досчитанный от канонизированного заранее тела.
+    """
+    values = {
+        'TO': row['email'],
+        'MID': message_id,
+        'DATE': formatdate(localtime=settings.EMAIL_USE_LOCALTIME),
+        'UNSUB': unsubscribe_url(row['email']),
+        'OPEN': open_url(newsletter.pk, row['id']),
+    }
+    for index, url in enumerate(links):
+        values[f'CLICK{index}'] = click_url(newsletter.pk, row['id'], url)
+    raw = envelope.render(values)
+    if signer is not None:
+        raw = signer.sign(raw, envelope.body_hash(values))
+    return PrecompiledEmail(raw, settings.EMAIL_HOST_USER, [row['email']], subject, connection=connection)
+
+
+def personalize(newsletter, compiled, rows, connection=None, signer=None):
+    """
+    Готовит персонализированные письма для отправки.
+
+    Если сообщение одинаково для всех получателей, тема и тела кодируются
+    один раз, а для каждого получателя подставляются только заголовки и ссылки.
+
+    Args:
+        newsletter (Newsletter): Рассылка, от имени которой отправляются письма.
+        compiled (CompiledMessage): Скомпилированное сообщение рассылки.
+        rows (Iterable[dict]): Получатели из iter_recipients.
+        connection: Соединение почтового бэкенда для отправки.
+        signer (DKIMSigner, optional): Подпись DKIM, если письма нужно подписывать.
+
+    Yields:
+        tuple[dict, str, EmailMultiAlternatives | PrecompiledEmail]: Получатель, Message-ID и готовое письмо.
+    """
+    envelope, links = None, []
+    if compiled.is_static:
+        envelope, links = get_envelope(*compiled.render({}))
+
+    for row in rows:
+        # Message-ID сохраняется в логе, чтобы сопоставлять с ним уведомления об отказах
+        message_id = make_msgid()
+        if envelope is not None and row['email'].isascii():
+            email = build_precompiled(
+                newsletter, envelope, links, compiled.subject, row, message_id, connection, signer,
+            )
+        else:
+            subject, body = compiled.render(recipient_context(row))
+            email = build_email(newsletter, subject, body, row, message_id, connection)
+            if signer is not None:
+                email = sign_email(signer, email, connection)
+        yield row, message_id, email
@@ -0,0 +1,150 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db.models import Count, F, Max, Min, Value
+from django.db.models.functions import Lower, StrIndex, Substr, TruncDate
+from django.utils import timezone
+
+from mailing.audience import get_recipients
+from mailing.cron import PERIODS
+from mailing.models import Logs, Newsletter
+
+# Скорость по умолчанию, если в логах нет данных о прошлых запусках (писем в секунду)
+DEFAULT_RATE = 10.0
+# Минимальный размер запуска, по которому можно судить о скорости отправки
+MIN_RUN_SIZE = 50
+# Интервал вызовов send_email (python manage.py run по расписанию cron, по умолчанию раз в сутки)
+TICK = timedelta(days=1)
+
+
+def upcoming_windows(newsletter, now, until, tick=None):
+    """
+    Возвращает моменты запуска рассылки в интервале [now, until).
+
+    Повторяет правила send_email, который вызывается сейчас и далее каждые tick:
+    при вызове, попавшем в период действия после начала рассылки, отправляется одно
+    окно, и начало сдвигается на один период. Просроченная рассылка поэтому догоняет
+    пропущенные периоды по одному за вызов.
+    """
+    tick = tick or TICK
+    period = PERIODS.get(newsletter.periodicity, timedelta())
+    start = newsletter.start_time
+    windows = []
+    moment = now
+    while moment < until and moment < newsletter.end_time:
+        if start < moment:
+            windows.append(moment)
+            start += period
+        moment += tick
+    return windows
+
+
+def audience_by_domain(newsletters):
+    """
+    Считает получателей каждой рассылки по почтовым доменам, по одному агрегатному запросу на рассылку.
+
+    Аудитория та же, что при отправке (get_recipients): выбранные клиенты и участники
+    сегмента без адресов из списка подавления.
+
+    Returns:
+        dict[int, dict[str, int]]: Количество получателей по доменам для каждой рассылки.
+    """
+    audience = {}
+    for newsletter in newsletters:
+        rows = (
+            get_recipients(newsletter)
+            .annotate(domain=Lower(Substr('email', StrIndex('email', Value('@')) + 1)))
+            .values('domain')
+            .annotate(total=Count('id'))
+        )
+        audience[newsletter.pk] = {row['domain']: row['total'] for row in rows}
+    return audience
+
+
+def measured_rate(now, days=7):
+    """
+    Оценивает скорость отправки (писем в секунду) по логам прошлых запусков.
+
+    Запуском считаются попытки одной рассылки за один день; скорость - отношение
+    суммарного числа писем к суммарной длительности таких запусков.
+    """
+    runs = (
+        Logs.objects.filter(attempt_time__gte=now - timedelta(days=days))
+        .annotate(day=TruncDate('attempt_time'))
+        .values('newsletter_id', 'day')
+        .annotate(total=Count('id'), first=Min('attempt_time'), last=Max('attempt_time'))
+        .filter(total__gte=MIN_RUN_SIZE, last__gt=F('first'))
+    )
+    sent = seconds = 0
+    for run in runs:
+        sent += run['total']
+        seconds += (run['last'] - run['first']).total_seconds()
+    return sent / seconds if seconds else None
+
+
+def plan(days=7, rate=None, now=None, tick=None):
+    """
+    Строит прогноз рассылок на ближайшие дни без отправки писем и без записи в базу.
+
+    Запуски обрабатываются последовательно, как в send_email: следующий начинается
+    не раньше окончания предыдущего. Объем каждого запуска распределяется по часам
+    с учетом скорости, а по доменам - пропорционально составу аудитории.
+
+    Args:
+        days (int): Горизонт прогноза в днях.
+        rate (float, optional): Скорость отправки, писем в секунду. По умолчанию - по логам.
+        now (datetime, optional): Момент, от которого строится прогноз.
+        tick (timedelta, optional): Интервал вызовов send_email; первый вызов - now. По умолчанию TICK.
+
+    Returns:
+        dict: windows - список запусков (рассылка, начало, получатели, окончание),
+        hourly - объем по часам, hourly_domains - объем по часам и доменам,
+        rate - использованная скорость и rate_measured - получена ли она из логов.
+    """
+    now = now or timezone.now()
+    until = now + timedelta(days=days)
+    measured = measured_rate(now) if rate is None else None
+    rate = rate or measured or DEFAULT_RATE
+
+    newsletters = Newsletter.objects.filter(message__isnull=False, is_paused=False, end_time__gt=now, start_time__lt=until)
+    schedule = [
+        (window, newsletter)
+        for newsletter in newsletters
+        for window in upcoming_windows(newsletter, now, until, tick)
+    ]
+    schedule.sort(key=lambda item: (item[0], item[1].pk))
+    audience = audience_by_domain({newsletter.pk: newsletter for _, newsletter in schedule}.values())
+
+    windows = []
+    hourly = defaultdict(float)
+    hourly_domains = defaultdict(lambda: defaultdict(float))
+    busy_until = now
+    for window, newsletter in schedule:
+        domains = audience.get(newsletter.pk, {})
+        recipients = sum(domains.values())
+        started = max(window, busy_until)
+        finished = started + timedelta(seconds=recipients / rate)
+        busy_until = finished
+        windows.append({
+            'newsletter': newsletter, 'window': window, 'start': started,
+            'recipients': recipients, 'finish': finished,
+        })
+
+        # Распределение объема запуска по часам
+        position = started
+        while position < finished:
+            hour = position.replace(minute=0, second=0, microsecond=0)
+            chunk_end = min(hour + timedelta(hours=1), finished)
+            volume = (chunk_end - position).total_seconds() * rate
+            hourly[hour] += volume
+            for domain, total in domains.items():
+                hourly_domains[hour][domain] += volume * total / recipients
+            position = chunk_end
+
+    return {
+        'windows': windows,
+        'hourly': dict(sorted(hourly.items())),
+        'hourly_domains': hourly_domains,
+        'rate': rate,
+        'rate_measured': measured is not None,
+    }
@@ -0,0 +1,229 @@
+"""
+Профилирование отправки рассылок (python manage.py run --profile --memory --timings).
+
+Замеры включаются только по флагам команды; без них хуки отправки (phase, timed)
+возвращают объекты без накладных расходов. Результаты каждого запуска пишутся
+в отдельный каталог PROFILE_DIR/<дата-время>:
+
+    profile.prof, profile.txt - cProfile всех потоков отправки (pstats и топ по cumulative);
+    memory.txt - топ строк по выделенной памяти (tracemalloc) и пиковое потребление;
+    timings.json - время фаз отправки: query (чтение получателей и ключей доставки),
+        render (сборка писем), smtp (отправка), flush (запись логов и контрольной точки).
+
+Время фаз - суммарное по всем потокам полос отправки и без вложенных фаз: время
+чтения получателей не входит в render, хотя персонализация запрашивает их сама.
+"""
+import cProfile
+import io
+import json
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+from contextlib import nullcontext
+from datetime import datetime
+
+from django.conf import settings
+
+# Сколько строк выводится в profile.txt и сколько кадров стека хранит tracemalloc
+PROFILE_TOP = 50
+MEMORY_FRAMES = 5
+
+timer = None
+
+
+class PhaseTimer:
+    """
+    Суммарное время фаз отправки по всем потокам.
+
+    Атрибуты:
+        totals (dict[str, float]): Время фаз без вложенных фаз, секунд.
+        counts (dict[str, int]): Количество замеров фаз.
+    """
+
+    def __init__(self):
+        self.totals = {}
+        self.counts = {}
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+    def measure(self, name):
+        return Phase(self, name)
+
+    def add(self, name, elapsed):
+        with self.lock:
+            self.totals[name] = self.totals.get(name, 0.0) + elapsed
+            self.counts[name] = self.counts.get(name, 0) + 1
+
+    def report(self):
+        return {
+            name: {'seconds': round(total, 6), 'count': self.counts[name]}
+            for name, total in sorted(self.totals.items(), key=lambda item: -item[1])
+        }
+
+
+class Phase:
+    """Замер одной фазы; время вложенных фаз вычитается из времени объемлющей."""
+
+    def __init__(self, timer, name):
+        self.timer = timer
+        self.name = name
+        self.children = 0.0
+
+    def __enter__(self):
+        stack = self.timer.local.__dict__.setdefault('stack', [])
+        stack.append(self)
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.started
+        stack = self.timer.local.stack
+        stack.pop()
+        if stack:
+            stack[-1].children += elapsed
+        self.timer.add(self.name, elapsed - self.children)
+
+
+def phase(name):
+    """Контекст замера фазы отправки; без включенных замеров ничего не делает."""
+    return timer.measure(name) if timer is not None else nullcontext()
+
+
+def timed(iterable, name):
+    """
+    Учитывает время получения каждого элемента итератора как фазу name.
+
+    Returns:
+        Iterable: Исходный итератор, если замеры не включены.
+    """
+    if timer is None:
+        return iterable
+    return _timed(iter(iterable), timer, name)
+
+
+def _timed(iterator, phase_timer, name):
+    while True:
+        with phase_timer.measure(name):
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+        yield item
+
+
+class ThreadProfiler:
+    """
+    cProfile для потока, в котором он запущен, и всех потоков, запущенных после него.
+
+    Атрибуты:
+        profiles (list[cProfile.Profile]): Профили потоков; первый - поток запуска.
+    """
+
+    def __init__(self):
+        self.profiles = []
+        self.lock = threading.Lock()
+
+    def start(self):
+        # Профилировщик потока включается при первом событии в нем, до выполнения его кода
+        threading.setprofile(self.start_thread)
+        self.start_thread()
+
+    def start_thread(self, *args):
+        profile = cProfile.Profile()
+        with self.lock:
+            self.profiles.append(profile)
+        profile.enable()
+
+    def stop(self):
+        threading.setprofile(None)
+        self.profiles[0].disable()
+
+    def stats(self):
+        """Объединенная статистика всех потоков."""
+        stats = pstats.Stats(self.profiles[0], stream=io.StringIO())
+        for profile in self.profiles[1:]:
+            stats.add(profile)
+        return stats
+
+
+def make_output_dir(base=None):
+    """
+    Создает каталог результатов запуска с отметкой времени.
+
+    Returns:
+        str: Путь к созданному каталогу.
+    """
+    path = os.path.join(base or settings.PROFILE_DIR, datetime.now().strftime('%Y%m%d-%H%M%S'))
+    suffix, unique = 1, path
+    while os.path.exists(unique):
+        suffix += 1
+        unique = f'{path}-{suffix}'
+    os.makedirs(unique)
+    return unique
+
+
+def write_profile(profiler, path):
+    stats = profiler.stats()
+    stats.dump_stats(os.path.join(path, 'profile.prof'))
+    with open(os.path.join(path, 'profile.txt'), 'w') as output:
+        stats.stream = output
+        stats.sort_stats('cumulative').print_stats(PROFILE_TOP)
+
+
+def write_memory(snapshot, peak, path, top):
+    with open(os.path.join(path, 'memory.txt'), 'w') as output:
+        output.write(f'Пиковое потребление: {peak / 1024:.1f} KiB\n\n')
+        for stat in snapshot.statistics('lineno')[:top]:
+            output.write(f'{stat}\n')
+
+
+def write_timings(phase_timer, elapsed, path):
+    with open(os.path.join(path, 'timings.json'), 'w') as output:
+        json.dump({'total_seconds': round(elapsed, 6), 'phases': phase_timer.report()}, output, indent=2)
+
+
+def profile_call(func, path, cpu=False, memory_top=0, timings=False):
+    """
+    Выполняет func с включенными замерами и записывает результаты в каталог path.
+
+    Args:
+        func (Callable): Профилируемая функция без аргументов.
+        path (str): Каталог результатов.
+        cpu (bool): Снять профиль cProfile.
+        memory_top (int): Сколько строк с наибольшим выделением памяти сохранить; 0 - не отслеживать память.
+        timings (bool): Замерить время фаз отправки.
+
+    Returns:
+        float: Время выполнения func, секунд.
+    """
+    global timer
+    profiler = ThreadProfiler() if cpu else None
+    phase_timer = PhaseTimer() if timings else None
+    if memory_top:
+        tracemalloc.start(MEMORY_FRAMES)
+    timer = phase_timer
+    started = time.perf_counter()
+    if profiler is not None:
+        profiler.start()
+    try:
+        func()
+    finally:
+        if profiler is not None:
+            profiler.stop()
+        elapsed = time.perf_counter() - started
+        timer = None
+        if memory_top:
+            snapshot = tracemalloc.take_snapshot().filter_traces([
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+            ])
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            write_memory(snapshot, peak, path, memory_top)
+        if profiler is not None:
+            write_profile(profiler, path)
+        if phase_timer is not None:
+            write_timings(phase_timer, elapsed, path)
+    return elapsed
@@ -0,0 +1,124 @@
+"""
+Счетчики прогресса идущих рассылок.
+
+Поток отправки публикует счетчики запуска (отправлено, ошибок, осталось, скорость)
+в кеш не чаще раза в PUBLISH_INTERVAL секунд и при остановке запуска. Страница
+рассылки получает их потоком Server-Sent Events; поток читает только кеш и не
+обращается к таблице логов, поэтому число открытых панелей не влияет на нагрузку
+на базу данных. Чтобы счетчики процесса отправки (python manage.py run) были видны
+веб-процессам, кеш должен быть общим (CACHE_ENABLED=True, Redis).
+"""
+import asyncio
+import json
+import time
+
+from django.core.cache import cache
+
+# Как часто поток отправки публикует счетчики, секунд
+PUBLISH_INTERVAL = 1
+# Срок хранения счетчиков после последней публикации, секунд
+PROGRESS_TTL = 24 * 60 * 60
+# Как часто поток событий проверяет счетчики, как часто шлет пустое сообщение при их неизменности
+# и сколько длится одно подключение (браузер переподключается сам), секунд
+STREAM_INTERVAL = 1
+KEEPALIVE_INTERVAL = 15
+STREAM_DURATION = 60 * 60
+
+
+def progress_key(newsletter_id):
+    return f'newsletter-progress:{newsletter_id}'
+
+
+def get_progress(newsletter_id):
+    """Возвращает последние опубликованные счетчики рассылки или None."""
+    return cache.get(progress_key(newsletter_id))
+
+
+async def aget_progress(newsletter_id):
+    return await cache.aget(progress_key(newsletter_id))
+
+
+class ProgressCounter:
+    """
+    Счетчики одного запуска рассылки, которые ведет поток отправки.
+
+    Продолженный запуск подхватывает счетчики из кеша, если они относятся к нему.
+
+    Атрибуты:
+        run (Run): Запуск рассылки.
+        sent (int): Отправлено писем.
+        failed (int): Неудачных попыток.
+        rate (float): Скорость отправки за последний интервал публикации, писем в секунду.
+    """
+
+    def __init__(self, run):
+        self.run = run
+        self.sent = self.failed = 0
+        self.rate = 0.0
+        self.published_at = None
+        previous = get_progress(run.newsletter_id)
+        if previous and previous['run'] == run.pk:
+            self.sent, self.failed = previous['sent'], previous['failed']
+        self.published_count = self.sent + self.failed
+
+    def add(self, success):
+        if success:
+            self.sent += 1
+        else:
+            self.failed += 1
+
+    def publish(self, state='running', force=False):
+        """
+        Публикует счетчики в кеш, если с прошлой публикации прошло PUBLISH_INTERVAL секунд.
+
+        Args:
+            state (str): running, paused, suspended (исчерпан часовой лимит или отправка прервана),
+                finished или aborted.
+            force (bool): Опубликовать независимо от интервала (при остановке запуска).
+        """
+        now = time.monotonic()
+        if not force and self.published_at is not None and now - self.published_at < PUBLISH_INTERVAL:
+            return
+        processed = self.sent + self.failed
+        if self.published_at is None or now - self.published_at >= PUBLISH_INTERVAL:
+            # Скорость считается только по полным интервалам, иначе внеочередная публикация дает выброс
+            if self.published_at is not None:
+                self.rate = (processed - self.published_count) / (now - self.published_at)
+            self.published_at, self.published_count = now, processed
+        cache.set(progress_key(self.run.newsletter_id), {
+            'run': self.run.pk,
+            'state': state,
+            'total': self.run.recipients_count,
+            'sent': self.sent,
+            'failed': self.failed,
+            # Адреса, пропущенные как уже получившие сообщение в этом вызове, остаются в remaining до конца запуска
+            'remaining': 0 if state in ('finished', 'aborted') else max(self.run.recipients_count - processed, 0),
+            'rate': round(self.rate if state == 'running' else 0.0, 1),
+            'updated': time.time(),
+        }, PROGRESS_TTL)
+
+
+async def events(newsletter_id):
+    """
+    Поток Server-Sent Events со счетчиками рассылки.
+
+    Событие отправляется только при изменении счетчиков; в остальное время раз
+    в KEEPALIVE_INTERVAL секунд отправляется комментарий, чтобы прокси не закрыл соединение.
+
+    Yields:
+        str: Строки протокола text/event-stream.
+    """
+    yield f'retry: {STREAM_INTERVAL * 5000}\n\n'
+    last = idle = None
+    started = time.monotonic()
+    while time.monotonic() - started < STREAM_DURATION:
+        progress = await aget_progress(newsletter_id)
+        if progress != last or idle is None:
+            last, idle = progress, 0
+            yield f'data: {json.dumps(progress)}\n\n'
+        else:
+            idle += STREAM_INTERVAL
+            if idle >= KEEPALIVE_INTERVAL:
+                idle = 0
+                yield ': keepalive\n\n'
+        await asyncio.sleep(STREAM_INTERVAL)
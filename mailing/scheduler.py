@@ -0,0 +1,247 @@
+"""
+Справедливое распределение отправки между владельцами рассылок.
+
+Запуски разных владельцев обслуживаются взвешенным круговым обходом: за круг
+владелец отправляет до SCHEDULER_QUANTUM * вес писем, поделенных поровну между
+его активными запусками (не больше concurrency одновременно, остальные ждут
+очереди). Поэтому небольшая рассылка завершается за несколько кругов, даже если
+параллельно идет рассылка на миллион адресов, а владелец, оставшийся в очереди
+один, получает всю пропускную способность. Владелец, исчерпавший часовой лимит,
+выбывает из обхода; его запуски сохраняют контрольную точку и продолжаются при
+следующем вызове send_email. Остаток часового лимита (Allowance) общий для
+планировщиков всех полос отправки, поэтому запуски владельца в разных полосах
+вместе не превышают лимит.
+"""
+import math
+import threading
+from collections import deque
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Count
+from django.utils import timezone
+
+from mailing.models import Logs, SendingQuota
+
+
+class Allowance:
+    """
+    Остаток часового лимита владельца, общий для планировщиков всех полос отправки.
+
+    Планировщик резервирует бюджет круга до отправки и возвращает неизрасходованную часть.
+
+    Атрибуты:
+        remaining (int): Сколько писем владелец еще может отправить в этот час.
+    """
+
+    def __init__(self, remaining):
+        self.remaining = remaining
+        self.lock = threading.Lock()
+
+    @property
+    def exhausted(self):
+        return self.remaining <= 0
+
+    def reserve(self, count):
+        """
+        Резервирует до count писем.
+
+        Returns:
+            int: Зарезервированное количество; 0, если лимит исчерпан.
+        """
+        with self.lock:
+            granted = max(min(count, self.remaining), 0)
+            self.remaining -= granted
+            return granted
+
+    def refund(self, count):
+        with self.lock:
+            self.remaining += count
+
+
+class Tenant:
+    """
+    Очередь запусков одного владельца.
+
+    Атрибуты:
+        owner_id (int | None): Владелец рассылок.
+        weight (int): Вес владельца в круговом обходе.
+        concurrency (int): Сколько запусков владельца обслуживается одновременно.
+        allowance (Allowance | None): Остаток часового лимита владельца; None - без ограничения.
+    """
+
+    def __init__(self, owner_id, weight=1, concurrency=1, allowance=None):
+        self.owner_id = owner_id
+        self.weight = weight
+        self.concurrency = concurrency
+        self.allowance = allowance
+        self.waiting = deque()
+        self.active = []
+
+    def __bool__(self):
+        return bool(self.waiting or self.active)
+
+    @property
+    def paused(self):
+        """Все запуски владельца приостановлены; запуски, еще не получавшие очереди, не в счет."""
+        return all(job.paused for job in [*self.active, *self.waiting])
+
+    def fill(self):
+        """Переводит ожидающие запуски в активные в пределах concurrency."""
+        while self.waiting and len(self.active) < self.concurrency:
+            self.active.append(self.waiting.popleft())
+
+    def serve(self, quantum):
+        """
+        Обслуживает активные запуски владельца в течение одного круга.
+
+        Returns:
+            int: Количество отправленных писем.
+        """
+        budget = quantum * self.weight
+        if self.allowance is not None:
+            budget = self.allowance.reserve(budget)
+            if not budget:
+                return 0
+        self.fill()
+        share = math.ceil(budget / len(self.active))
+        total = 0
+        for job in list(self.active):
+            total += job.step(min(share, budget - total))
+            if job.done:
+                self.active.remove(job)
+            elif job.paused:
+                # Приостановленный запуск уступает место следующему и проверяется снова в свою очередь
+                self.active.remove(job)
+                self.waiting.append(job)
+            if total >= budget:
+                break
+        if self.allowance is not None:
+            self.allowance.refund(budget - total)
+        return total
+
+    def suspend(self):
+        """Сохраняет контрольные точки всех запусков владельца и снимает их с обслуживания."""
+        for job in [*self.active, *self.waiting]:
+            job.suspend()
+        self.active.clear()
+        self.waiting.clear()
+
+
+def hourly_usage(owner_ids, now):
+    """
+    Считает письма, отправленные владельцами за последний час, одним агрегатным запросом.
+
+    Returns:
+        dict[int, int]: Количество попыток отправки по владельцам.
+    """
+    rows = (
+        Logs.objects.filter(attempt_time__gte=now - timedelta(hours=1), newsletter__owner_id__in=owner_ids)
+        .values('newsletter__owner_id')
+        .annotate(total=Count('id'))
+    )
+    return {row['newsletter__owner_id']: row['total'] for row in rows}
+
+
+def load_quotas(owner_ids):
+    return {quota.owner_id: quota for quota in SendingQuota.objects.filter(owner_id__in=owner_ids)}
+
+
+def load_allowances(owner_ids, now, quotas=None):
+    """
+    Считает остаток часового лимита владельцев.
+
+    Returns:
+        dict[int | None, Allowance | None]: Остатки по владельцам; None - без ограничения.
+    """
+    quotas = load_quotas(owner_ids) if quotas is None else quotas
+    limits = {}
+    for owner_id in owner_ids:
+        quota = quotas.get(owner_id)
+        limit = quota.hourly_limit if quota and quota.hourly_limit is not None else settings.SCHEDULER_HOURLY_LIMIT
+        if limit:
+            limits[owner_id] = limit
+    usage = hourly_usage(list(limits), now) if limits else {}
+    return {
+        owner_id: Allowance(limits[owner_id] - usage.get(owner_id, 0)) if owner_id in limits else None
+        for owner_id in owner_ids
+    }
+
+
+def load_tenants(owner_ids, now, allowances=None):
+    """
+    Создает очереди владельцев с их квотами и остатком часового лимита.
+
+    Args:
+        allowances (dict | None): Остатки лимитов, общие с другими планировщиками (load_allowances);
+            по умолчанию считаются заново.
+
+    Returns:
+        dict[int | None, Tenant]: Очереди по владельцам.
+    """
+    quotas = load_quotas(owner_ids)
+    if allowances is None:
+        allowances = load_allowances(owner_ids, now, quotas)
+    tenants = {}
+    for owner_id in owner_ids:
+        quota = quotas.get(owner_id)
+        weight = quota.weight if quota else 1
+        concurrency = quota.concurrency if quota and quota.concurrency else settings.SCHEDULER_CONCURRENCY
+        tenants[owner_id] = Tenant(owner_id, max(weight, 1), max(concurrency, 1), allowances.get(owner_id))
+    return tenants
+
+
+class FairScheduler:
+    """
+    Диспетчер запусков рассылок с круговым обходом владельцев.
+
+    Запуск (Job) должен предоставлять owner_id, флаги done и paused, метод step(limit),
+    отправляющий не больше limit писем и возвращающий их количество, и метод
+    suspend(), сохраняющий прогресс запуска, снятого с обслуживания.
+
+    Атрибуты:
+        quantum (int): Писем на единицу веса владельца за круг.
+        jobs (list): Запуски в порядке добавления.
+        allowances (dict | None): Остатки часовых лимитов, общие с другими планировщиками.
+    """
+
+    def __init__(self, quantum=None, now=None, allowances=None):
+        self.quantum = quantum or settings.SCHEDULER_QUANTUM
+        self.now = now or timezone.now()
+        self.allowances = allowances
+        self.jobs = []
+
+    def add(self, job):
+        self.jobs.append(job)
+
+    def run(self):
+        """
+        Обслуживает запуски, пока все они не завершатся, их владельцы не исчерпают лимит
+        или не останутся только приостановленные запуски.
+
+        Returns:
+            int: Количество отправленных писем.
+        """
+        tenants = load_tenants({job.owner_id for job in self.jobs}, self.now, self.allowances)
+        for job in self.jobs:
+            tenants[job.owner_id].waiting.append(job)
+
+        ring = deque(tenant for tenant in tenants.values() if tenant)
+        total = 0
+        while ring:
+            served = 0
+            for _ in range(len(ring)):
+                tenant = ring.popleft()
+                if tenant.allowance is not None and tenant.allowance.exhausted:
+                    tenant.suspend()
+                    continue
+                served += tenant.serve(self.quantum)
+                if tenant:
+                    ring.append(tenant)
+            if ring and not served and all(tenant.paused for tenant in ring):
+                # Остались только приостановленные запуски: они продолжатся при следующем вызове
+                for tenant in ring:
+                    tenant.suspend()
+                break
+            total += served
+        return total
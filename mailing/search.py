@@ -0,0 +1,125 @@
+"""
+Полнотекстовый поиск по клиентам, сообщениям и постам блога.
+
+Поиск идет по столбцам search_vector (tsvector с GIN-индексом), которые
+поддерживают в актуальном состоянии триггеры базы данных. Для клиентов
+дополнительно ищется часть адреса почты через триграммный индекс, поэтому
+запрос "ivanov@" или "mail.r" находит адрес, хотя это не целое слово.
+"""
+from django.contrib.postgres.search import SearchQuery, SearchRank, TrigramSimilarity
+from django.core.paginator import EmptyPage, PageNotAnInteger, Paginator
+from django.db.models import CharField, F, Lookup, Q
+from django.db.models.functions import Lower
+from django.http import JsonResponse
+
+SEARCH_CONFIG = 'russian'
+PAGE_SIZE = 20
+AUTOCOMPLETE_PAGE_SIZE = 20
+# Минимальная длина запроса для поиска по части адреса: короче триграмма не строится
+MIN_TRIGRAM_QUERY = 3
+
+
+@CharField.register_lookup
+class ILikeContains(Lookup):
+    """
+    Поиск подстроки без учета регистра условием "поле ILIKE '%запрос%'".
+
+    В отличие от icontains (UPPER(поле::text) LIKE UPPER(...)) условие применяется к самому
+    столбцу, поэтому его обслуживает триграммный индекс gin_trgm_ops по этому столбцу.
+    """
+    lookup_name = 'ilike_contains'
+
+    def get_db_prep_lookup(self, value, connection):
+        return '%s', [f'%{connection.ops.prep_for_like_query(value)}%']
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'{lhs} ILIKE {rhs}', [*lhs_params, *rhs_params]
+
+
+def ranked(queryset, query):
+    """
+    Фильтрует queryset по поисковому запросу и сортирует по релевантности.
+
+    Args:
+        queryset (QuerySet): Набор объектов модели со столбцом search_vector.
+        query (str): Запрос пользователя в синтаксисе веб-поиска ("слово -исключить").
+
+    Returns:
+        QuerySet: Найденные объекты с аннотацией rank.
+    """
+    search_query = SearchQuery(query, config=SEARCH_CONFIG, search_type='websearch')
+    return (
+        queryset.filter(search_vector=search_query)
+        .annotate(rank=SearchRank(F('search_vector'), search_query))
+        .order_by('-rank', '-pk')
+    )
+
+
+def search_clients(queryset, query):
+    """
+    Ищет клиентов по ФИО, почте и комментарию, а также по части адреса почты.
+
+    Returns:
+        QuerySet: Найденные клиенты с аннотацией rank.
+    """
+    if len(query) < MIN_TRIGRAM_QUERY:
+        return ranked(queryset, query)
+    search_query = SearchQuery(query, config=SEARCH_CONFIG, search_type='websearch')
+    return (
+        queryset.filter(Q(search_vector=search_query) | Q(email__ilike_contains=query))
+        .annotate(rank=SearchRank(F('search_vector'), search_query) + TrigramSimilarity('email', query))
+        .order_by('-rank', '-pk')
+    )
+
+
+def prefix_search(queryset, query):
+    """
+    Ищет клиентов, у которых адрес почты или ФИО начинается с query, без учета регистра.
+
+    Условие LOWER(поле) LIKE 'запрос%' использует индексы client_email_prefix_idx
+    и client_fio_prefix_idx, поэтому время ответа не зависит от числа клиентов.
+
+    Returns:
+        QuerySet: Найденные клиенты, отсортированные по адресу.
+    """
+    prefix = query.lower()
+    return (
+        queryset.annotate(email_lower=Lower('email'), fio_lower=Lower('fio'))
+        .filter(Q(email_lower__startswith=prefix) | Q(fio_lower__startswith=prefix))
+        .order_by('email')
+    )
+
+
+def search_response(request, queryset, search, fields):
+    """
+    Выполняет поиск по параметру q и возвращает страницу результатов в формате JSON.
+
+    Args:
+        request (HttpRequest): Текущий запрос; параметры q - запрос, page - номер страницы.
+        queryset (QuerySet): Объекты, среди которых выполняется поиск.
+        search (Callable): Функция поиска (ranked или search_clients).
+        fields (tuple): Поля объектов, попадающие в ответ.
+
+    Returns:
+        JsonResponse: Результаты страницы, номер страницы, число страниц и найденных объектов.
+    """
+    query = request.GET.get('q', '').strip()
+    if not query:
+        return JsonResponse({'results': [], 'page': 1, 'num_pages': 1, 'count': 0})
+
+    paginator = Paginator(search(queryset, query).values('pk', 'rank', *fields), PAGE_SIZE)
+    try:
+        page = paginator.page(request.GET.get('page', 1))
+    except PageNotAnInteger:
+        page = paginator.page(1)
+    except EmptyPage:
+        page = paginator.page(paginator.num_pages)
+    results = [{**row, 'rank': round(row['rank'], 4)} for row in page.object_list]
+    return JsonResponse({
+        'results': results,
+        'page': page.number,
+        'num_pages': paginator.num_pages,
+        'count': paginator.count,
+    })
@@ -0,0 +1,132 @@
+"""
+Сегменты аудитории по правилам и их материализованный состав.
+
+Состав сегмента хранится в таблице SegmentMember. При изменении правил сегмент
+пересчитывается целиком двумя запросами (INSERT ... SELECT и DELETE ... NOT EXISTS),
+при сохранении клиента - только строки этого клиента. Отправка рассылки соединяет
+клиентов с готовым составом и не вычисляет правила заново.
+"""
+from django.db import connection, transaction
+from django.db.models import Q
+from django.db.models.signals import post_save
+from django.utils import timezone
+
+from mailing.models import Client, Segment, SegmentMember
+
+
+def segment_filter(segment):
+    """
+    Строит условие отбора клиентов по правилам сегмента.
+
+    Returns:
+        Q: Условие для queryset'а клиентов.
+    """
+    condition = Q()
+    if segment.client_owner_id:
+        condition &= Q(owner_id=segment.client_owner_id)
+    if segment.email_domain:
+        condition &= Q(email__iendswith=f'@{segment.email_domain.lstrip("@")}')
+    if segment.created_from:
+        condition &= Q(created_at__gte=segment.created_from)
+    if segment.created_to:
+        condition &= Q(created_at__lte=segment.created_to)
+    if segment.attributes:
+        condition &= Q(attributes__contains=segment.attributes)
+    return condition
+
+
+def contains(value, rule):
+    """
+    Проверяет вхождение JSON-значения rule в value так же, как оператор @> в PostgreSQL.
+
+    Словарь содержит все ключи rule с вложенными значениями, список - каждый элемент rule
+    хотя бы в одном своем элементе, скаляры совпадают с учетом типа (true не равно 1).
+    """
+    if isinstance(rule, dict):
+        return isinstance(value, dict) and all(
+            key in value and contains(value[key], item) for key, item in rule.items()
+        )
+    if isinstance(rule, list):
+        return isinstance(value, list) and all(any(contains(element, item) for element in value) for item in rule)
+    if isinstance(value, (dict, list)) or isinstance(rule, bool) != isinstance(value, bool):
+        return False
+    return value == rule
+
+
+def matches(segment, client):
+    """
+    Проверяет, подходит ли клиент под правила сегмента, без обращения к базе данных.
+
+    Повторяет segment_filter для одного объекта; дополнительные поля проверяются
+    на вхождение (contains), как attributes__contains в запросе.
+    """
+    if segment.client_owner_id and client.owner_id != segment.client_owner_id:
+        return False
+    if segment.email_domain and not client.email.lower().endswith(f'@{segment.email_domain.lstrip("@").lower()}'):
+        return False
+    if segment.created_from and client.created_at < segment.created_from:
+        return False
+    if segment.created_to and client.created_at > segment.created_to:
+        return False
+    return contains(client.attributes or {}, segment.attributes or {})
+
+
+@transaction.atomic
+def refresh_segment(segment):
+    """
+    Пересчитывает состав сегмента целиком на стороне базы данных.
+
+    Подходящие клиенты добавляются одним INSERT ... SELECT, лишние удаляются
+    одним DELETE; строки, которые не изменились, не затрагиваются.
+
+    Returns:
+        tuple[int, int]: Количество добавленных и удаленных участников.
+    """
+    clients_sql, params = Client.objects.filter(segment_filter(segment)).values('id').query.sql_with_params()
+    members = SegmentMember._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {members} (segment_id, client_id) '
+            f'SELECT %s, matched.id FROM ({clients_sql}) AS matched '
+            f'ON CONFLICT (segment_id, client_id) DO NOTHING',
+            [segment.pk, *params],
+        )
+        added = cursor.rowcount
+        cursor.execute(
+            f'DELETE FROM {members} WHERE segment_id = %s '
+            f'AND NOT EXISTS (SELECT 1 FROM ({clients_sql}) AS matched WHERE matched.id = {members}.client_id)',
+            [segment.pk, *params],
+        )
+        removed = cursor.rowcount
+    Segment.objects.filter(pk=segment.pk).update(refreshed_at=timezone.now())
+    return added, removed
+
+
+def refresh_client(client):
+    """
+    Обновляет участие одного клиента во всех сегментах.
+
+    Правила проверяются в памяти, в базу уходят не больше трех запросов
+    независимо от числа сегментов.
+    """
+    matched = [segment.pk for segment in Segment.objects.all() if matches(segment, client)]
+    SegmentMember.objects.bulk_create(
+        [SegmentMember(segment_id=segment_id, client_id=client.pk) for segment_id in matched],
+        ignore_conflicts=True,
+    )
+    SegmentMember.objects.filter(client_id=client.pk).exclude(segment_id__in=matched).delete()
+
+
+def on_client_saved(sender, instance, **kwargs):
+    refresh_client(instance)
+
+
+def on_segment_saved(sender, instance, **kwargs):
+    # Пересчет после фиксации транзакции: правила уже сохранены
+    transaction.on_commit(lambda: refresh_segment(instance))
+
+
+def connect_signals():
+    """Подключает пересчет сегментов; вызывается из MailingConfig.ready()."""
+    post_save.connect(on_client_saved, sender=Client, dispatch_uid='mailing.segments.client')
+    post_save.connect(on_segment_saved, sender=Segment, dispatch_uid='mailing.segments.segment')
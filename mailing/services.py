@@ -1,31 +1,33 @@
 from blog.models import Blog
 from django.conf import settings
 from django.core.cache import cache
-from django.core.mail import send_mail
 
+from mailing.lanes import send_transactional
+from mailing.models import Suppression
 
-def homepage_cache():
+
+async def ahomepage_cache():
     """
     Функция кеширования случайных статей блога для главной страницы.
 
     Если кэширование включено в настройках проекта (settings.CACHE_ENABLED),
     функция пытается получить случайные статьи из кэша. Если статьи отсутствуют
     в кэше, функция извлекает случайные статьи из базы данных, сохраняет их
-    в кэше и возвращает их.
+    в кэше и возвращает их. Кэш и база данных опрашиваются асинхронно.
 
     Returns:
-        QuerySet: Список случайных статей блога.
+        list[Blog]: Список случайных статей блога.
     """
+    key = 'random_article'
     if settings.CACHE_ENABLED:
-        key = 'random_article'
-        random_article = cache.get(key)
-        if random_article is None:
-            random_article = Blog.objects.order_by('?')[:3]
-            cache.set(key, random_article)
-        else:
-            random_article = Blog.objects.order_by('?')[:3]
+        random_article = await cache.aget(key)
+        if random_article is not None:
+            return random_article
 
-        return random_article
+    random_article = [article async for article in Blog.objects.order_by('?')[:3]]
+    if settings.CACHE_ENABLED:
+        await cache.aset(key, random_article)
+    return random_article
 
 
 def send_newpassword(email, new_password):
@@ -36,12 +38,30 @@ def send_newpassword(email, new_password):
         email (str): Email адрес получателя.
         new_password (str): Новый сгенерированный пароль.
 
-    Отправляет email с уведомлением о смене пароля и новым паролем,
-    используя функцию send_mail Django.
+    Отправляет email с уведомлением о смене пароля и новым паролем
+    через приоритетную полосу служебных писем, не дожидаясь рассылок.
     """
-    send_mail(
+    send_transactional(
         subject='Вы сменили пароль',
         message=f'Ваш новый пароль: {new_password}',
-        from_email=settings.EMAIL_HOST_USER,
         recipient_list=[email]
     )
+
+
+def suppress_emails(emails, reason, comment=None):
+    """
+    Функция добавления адресов в список подавления.
+
+    Args:
+        emails (Iterable[str]): Адреса, на которые больше нельзя отправлять письма.
+        reason (str): Причина блокировки ('bounce', 'complaint', 'manual' или 'unsubscribe').
+        comment (str, optional): Пояснение к блокировке.
+
+    Адреса приводятся к нижнему регистру: список подавления сравнивается с адресами
+    клиентов без учета регистра. Уже заблокированные адреса пропускаются, вставка
+    выполняется одним запросом.
+    """
+    Suppression.objects.bulk_create(
+        [Suppression(email=email, reason=reason, comment=comment) for email in {email.lower() for email in emails}],
+        ignore_conflicts=True,
+    )
@@ -1,3 +1,258 @@
-# from django.test import TestCase
+import random
+import smtplib
+import socketserver
+import threading
+import time
+from unittest import mock
 
-# Create your tests here.
+from django.core.mail import EmailMessage, get_connection
+from django.test import SimpleTestCase, override_settings
+
+from mailing import scheduler, transport
+
+
+class StandInSMTPHandler(socketserver.StreamRequestHandler):
+    """Минимальный SMTP-диалог: принимает письма или отвечает ошибкой в зависимости от режима сервера."""
+
+    def reply(self, line):
+        self.wfile.write(f'{line}\r\n'.encode())
+
+    def handle(self):
+        server = self.server
+        server.connections += 1
+        self.reply('220 stand-in ESMTP')
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode().strip().upper()
+            if command.startswith(('EHLO', 'HELO')):
+                self.reply('250 stand-in')
+            elif command.startswith('MAIL'):
+                time.sleep(server.delay)
+                self.reply('451 4.3.0 Try again later' if server.mode == 'tempfail' else '250 OK')
+            elif command.startswith('RCPT'):
+                self.reply('550 5.1.1 No such user' if server.mode == 'reject_rcpt' else '250 OK')
+            elif command == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                data = []
+                for data_line in self.rfile:
+                    if data_line == b'.\r\n':
+                        break
+                    data.append(data_line)
+                server.messages.append(b''.join(data))
+                self.reply('250 OK')
+            elif command == 'QUIT':
+                self.reply('221 Bye')
+                return
+            elif command in ('RSET', 'NOOP'):
+                self.reply('250 OK')
+            else:
+                self.reply('502 Command not implemented')
+
+
+class StandInSMTPServer(socketserver.ThreadingTCPServer):
+    """
+    Локальный SMTP-сервер для тестов.
+
+    Атрибуты:
+        mode (str): ok - принимать письма, tempfail - отклонять отправителя кодом 451,
+            reject_rcpt - отклонять получателей кодом 550.
+        delay (float): Задержка ответа на MAIL FROM, секунд.
+        messages (list[bytes]): Принятые письма.
+        connections (int): Количество принятых соединений.
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, mode='ok', delay=0.0):
+        super().__init__(('127.0.0.1', 0), StandInSMTPHandler)
+        self.mode = mode
+        self.delay = delay
+        self.messages = []
+        self.connections = 0
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+
+class RouterBackendTest(SimpleTestCase):
+    """Маршрутизация писем между SMTP-серверами: веса, переключение при сбоях и выключатель."""
+
+    def setUp(self):
+        transport.relays.clear()
+        self.addCleanup(transport.relays.clear)
+        random.seed(0)
+
+    def start_server(self, **kwargs):
+        server = StandInSMTPServer(**kwargs)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return server
+
+    @staticmethod
+    def relay(name, port, weight=1):
+        return {
+            'name': name, 'host': '127.0.0.1', 'port': port, 'weight': weight,
+            'username': '', 'password': '', 'use_ssl': False, 'use_tls': False,
+        }
+
+    @staticmethod
+    def unused_port():
+        server = StandInSMTPServer()
+        port = server.port
+        server.server_close()
+        return port
+
+    def send(self, count, connection=None):
+        connection = connection or get_connection('mailing.transport.RouterBackend')
+        with connection:
+            return sum(
+                EmailMessage('Тема', 'Текст', 'from@example.com', [f'client{i}@example.com'], connection=connection).send()
+                for i in range(count)
+            )
+
+    def test_weighted_distribution(self):
+        main, reserve = self.start_server(), self.start_server()
+        with override_settings(EMAIL_RELAYS=[self.relay('main', main.port, 3), self.relay('reserve', reserve.port, 1)]):
+            self.assertEqual(self.send(200), 200)
+        self.assertEqual(len(main.messages) + len(reserve.messages), 200)
+        self.assertGreater(len(main.messages), 120)
+        self.assertLess(len(main.messages), 180)
+
+    def test_connections_reused_until_close(self):
+        main, reserve = self.start_server(), self.start_server()
+        with override_settings(EMAIL_RELAYS=[self.relay('main', main.port), self.relay('reserve', reserve.port)]):
+            self.assertEqual(self.send(20), 20)
+        self.assertEqual(len(main.messages) + len(reserve.messages), 20)
+        self.assertEqual((main.connections, reserve.connections), (1, 1))
+
+    def test_failover_on_temporary_failure_opens_circuit(self):
+        broken, healthy = self.start_server(mode='tempfail'), self.start_server()
+        with override_settings(EMAIL_RELAYS=[self.relay('broken', broken.port, 100), self.relay('healthy', healthy.port)]):
+            self.assertEqual(self.send(20), 20)
+        self.assertEqual(len(healthy.messages), 20)
+        self.assertEqual(transport.relays['broken'].state, transport.OPEN)
+        self.assertEqual(transport.relays['broken'].failures, transport.FAILURE_THRESHOLD)
+
+    def test_failover_on_connection_refused(self):
+        healthy = self.start_server()
+        with override_settings(EMAIL_RELAYS=[self.relay('down', self.unused_port(), 100), self.relay('healthy', healthy.port)]):
+            self.assertEqual(self.send(10), 10)
+        self.assertEqual(len(healthy.messages), 10)
+        self.assertEqual(transport.relays['down'].state, transport.OPEN)
+
+    def test_half_open_probe_closes_circuit(self):
+        flaky, healthy = self.start_server(mode='tempfail'), self.start_server()
+        with override_settings(EMAIL_RELAYS=[self.relay('flaky', flaky.port, 100), self.relay('healthy', healthy.port)]):
+            self.send(10)
+            self.assertEqual(transport.relays['flaky'].state, transport.OPEN)
+            flaky.mode = 'ok'
+            with mock.patch.object(transport, 'COOLDOWN', 0):
+                self.send(1)
+        self.assertEqual(transport.relays['flaky'].state, transport.CLOSED)
+        self.assertEqual(len(flaky.messages), 1)
+
+    def test_failed_probe_reopens_circuit(self):
+        flaky, healthy = self.start_server(mode='tempfail'), self.start_server()
+        with override_settings(EMAIL_RELAYS=[self.relay('flaky', flaky.port), self.relay('healthy', healthy.port)]):
+            relay = transport.configured_relays()[0]
+            relay.state, relay.opened_at = transport.OPEN, 0.0
+            self.assertEqual(self.send(1), 1)
+        self.assertEqual(relay.state, transport.OPEN)
+        self.assertEqual(len(healthy.messages), 1)
+
+    def test_all_relays_down(self):
+        first, second = self.start_server(mode='tempfail'), self.start_server(mode='tempfail')
+        with override_settings(EMAIL_RELAYS=[self.relay('first', first.port), self.relay('second', second.port)]):
+            with self.assertRaises(smtplib.SMTPException):
+                self.send(1)
+            self.assertEqual(self.send(1, get_connection('mailing.transport.RouterBackend', fail_silently=True)), 0)
+        # Серверы, не принимающие соединения: ошибка соединения приводится к SMTPException
+        refused = [self.relay('down1', self.unused_port()), self.relay('down2', self.unused_port())]
+        with override_settings(EMAIL_RELAYS=refused):
+            with self.assertRaises(smtplib.SMTPException) as raised:
+                self.send(1)
+        self.assertIsInstance(raised.exception.__cause__, ConnectionRefusedError)
+
+    def test_recipient_refused_does_not_fail_over(self):
+        strict, healthy = self.start_server(mode='reject_rcpt'), self.start_server()
+        with override_settings(EMAIL_RELAYS=[self.relay('strict', strict.port, 100), self.relay('healthy', healthy.port)]):
+            with self.assertRaises(smtplib.SMTPRecipientsRefused):
+                self.send(1)
+        self.assertEqual(healthy.messages, [])
+        self.assertEqual(transport.relays['strict'].state, transport.CLOSED)
+
+    def test_slow_relay_gets_less_traffic(self):
+        slow, fast = self.start_server(delay=0.05), self.start_server()
+        with override_settings(EMAIL_RELAYS=[self.relay('slow', slow.port), self.relay('fast', fast.port)]):
+            with mock.patch.object(transport, 'LATENCY_TARGET', 0.01):
+                self.assertEqual(self.send(60), 60)
+        self.assertGreater(len(fast.messages), 2 * len(slow.messages))
+
+
+class StubJob:
+    """Запуск для планировщика без базы данных: отправляет recipients писем, приостановленный не отправляет ничего."""
+
+    def __init__(self, owner_id, recipients, paused=False):
+        self.owner_id = owner_id
+        self.remaining = recipients
+        self.paused = paused
+        self.done = False
+        self.suspended = False
+
+    def step(self, limit):
+        if self.paused:
+            return 0
+        count = min(limit, self.remaining)
+        self.remaining -= count
+        self.done = not self.remaining
+        return count
+
+    def suspend(self):
+        self.suspended = True
+
+
+class FairSchedulerTest(SimpleTestCase):
+    """Круговой обход запусков: пустые и приостановленные запуски не останавливают остальные."""
+
+    def run_jobs(self, jobs, concurrency=2):
+        tenants = {job.owner_id: scheduler.Tenant(job.owner_id, concurrency=concurrency) for job in jobs}
+        fair = scheduler.FairScheduler(quantum=100)
+        for job in jobs:
+            fair.add(job)
+        with mock.patch.object(scheduler, 'load_tenants', return_value=tenants):
+            return fair.run()
+
+    def test_empty_runs_do_not_suspend_waiting_run(self):
+        jobs = [StubJob(1, 0), StubJob(1, 0), StubJob(1, 500)]
+        self.assertEqual(self.run_jobs(jobs), 500)
+        self.assertEqual([(job.remaining, job.done, job.suspended) for job in jobs], [(0, True, False)] * 3)
+
+    def test_paused_runs_do_not_suspend_waiting_run(self):
+        paused = [StubJob(1, 100, paused=True), StubJob(1, 100, paused=True)]
+        job = StubJob(1, 500)
+        self.assertEqual(self.run_jobs([*paused, job]), 500)
+        self.assertTrue(job.done)
+        self.assertTrue(all(job.suspended and not job.done for job in paused))
+
+    def test_only_paused_runs_are_suspended(self):
+        jobs = [StubJob(1, 100, paused=True), StubJob(2, 100, paused=True)]
+        self.assertEqual(self.run_jobs(jobs), 0)
+        self.assertTrue(all(job.suspended for job in jobs))
+
+    def test_allowance_shared_between_schedulers(self):
+        allowance = scheduler.Allowance(150)
+        jobs = [StubJob(1, 500), StubJob(1, 500)]
+        sent = 0
+        for job in jobs:
+            fair = scheduler.FairScheduler(quantum=100, allowances={1: allowance})
+            fair.add(job)
+            tenants = {1: scheduler.Tenant(1, allowance=allowance)}
+            with mock.patch.object(scheduler, 'load_tenants', return_value=tenants):
+                sent += fair.run()
+        self.assertEqual(sent, 150)
+        self.assertEqual(allowance.remaining, 0)
+        self.assertTrue(all(job.suspended for job in jobs))
@@ -0,0 +1,114 @@
+import base64
+import re
+
+from django.conf import settings
+from django.core import signing
+from django.db.models import Count, Q
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.html import escape, linebreaks
+
+from mailing.buffers import BatchBuffer
+from mailing.models import Client, Event, Logs, Newsletter
+
+SALT = 'mailing.tracking'
+URL_RE = re.compile(r'https?://[^\s<>"\']+')
+PIXEL = base64.b64decode('R0lGODlhAQABAIAAAAAAAP///yH5BAEAAAAALAAAAAABAAEAAAIBRAA7')
+
+
+def make_token(*values):
+    """Подписывает значения для ссылки отслеживания, чтобы проверять их без запроса к базе."""
+    return signing.dumps(values, salt=SALT, compress=True)
+
+
+def read_token(token):
+    """Возвращает подписанные значения или None, если подпись неверна."""
+    try:
+        return signing.loads(token, salt=SALT)
+    except signing.BadSignature:
+        return None
+
+
+def open_url(newsletter_id, client_id):
+    return settings.SITE_URL + reverse('mailing:track_open', args=[make_token(newsletter_id, client_id)])
+
+
+def click_url(newsletter_id, client_id, url):
+    return settings.SITE_URL + reverse('mailing:track_click', args=[make_token(newsletter_id, client_id, url)])
+
+
+def render_tracked(body, link, pixel):
+    """
+    Готовит текстовую и HTML-версии письма с отслеживанием.
+
+    Все ссылки заменяются результатом link(url), в HTML-версию добавляется
+    пиксель отслеживания открытия с адресом pixel.
+
+    Returns:
+        tuple[str, str]: Текстовая и HTML-версии тела письма.
+    """
+    text_parts, html_parts = [], []
+    position = 0
+    for match in URL_RE.finditer(body):
+        url = link(match.group(0))
+        text_parts += [body[position:match.start()], url]
+        html_parts += [escape(body[position:match.start()]), f'<a href="{url}">{escape(match.group(0))}</a>']
+        position = match.end()
+    text_parts.append(body[position:])
+    html_parts.append(escape(body[position:]))
+    text = ''.join(text_parts)
+    html = linebreaks(''.join(html_parts), autoescape=False)
+    html += f'<img src="{pixel}" width="1" height="1" alt="">'
+    return text, html
+
+
+def tracked_bodies(body, newsletter_id, client_id):
+    """Версии письма с отслеживанием для конкретного получателя."""
+    return render_tracked(
+        body, lambda url: click_url(newsletter_id, client_id, url), open_url(newsletter_id, client_id),
+    )
+
+
+def flush_events(batch):
+    """Пакетно сохраняет события, пропуская ссылки на уже удаленные рассылки и клиентов."""
+    newsletter_ids = set(Newsletter.objects.filter(pk__in={item[1] for item in batch}).values_list('pk', flat=True))
+    client_ids = set(Client.objects.filter(pk__in={item[2] for item in batch}).values_list('pk', flat=True))
+    Event.objects.bulk_create([
+        Event(
+            kind=kind, newsletter_id=newsletter_id if newsletter_id in newsletter_ids else None,
+            client_id=client_id if client_id in client_ids else None, url=url, created_at=created_at,
+        )
+        for kind, newsletter_id, client_id, url, created_at in batch
+    ])
+
+
+events = BatchBuffer(
+    flush_events,
+    interval=settings.TRACKING_FLUSH_INTERVAL,
+    batch_size=settings.TRACKING_BATCH_SIZE,
+)
+
+
+def record_event(kind, newsletter_id, client_id, url=None):
+    """Ставит событие в буфер; запись в базу выполняет фоновый поток."""
+    events.append((kind, newsletter_id, client_id, url, timezone.now()))
+
+
+async def anewsletter_stats(newsletter):
+    """
+    Функция расчета показателей вовлеченности рассылки.
+
+    Запросы выполняются через асинхронный ORM, функция вызывается из асинхронных представлений.
+
+    Returns:
+        dict: Количество доставленных писем, уникальных открытий и переходов, а также их доли в процентах.
+    """
+    sent = await Logs.objects.filter(newsletter=newsletter, attempt=True).acount()
+    stats = await Event.objects.filter(newsletter=newsletter).aaggregate(
+        opens=Count('client', distinct=True, filter=Q(kind='open')),
+        clicks=Count('client', distinct=True, filter=Q(kind='click')),
+    )
+    stats['sent'] = sent
+    stats['open_rate'] = round(stats['opens'] * 100 / sent, 1) if sent else 0
+    stats['click_rate'] = round(stats['clicks'] * 100 / sent, 1) if sent else 0
+    return stats
@@ -0,0 +1,252 @@
+"""
+Отправка писем через несколько SMTP-серверов с балансировкой и переключением при сбоях.
+
+RouterBackend - почтовый бэкенд Django (settings.EMAIL_BACKEND). Для каждого письма
+сервер выбирается случайно пропорционально его весу, умноженному на оценку здоровья:
+долю успешных отправок и задержку по последним HEALTH_WINDOW попыткам. Если сервер
+не принял письмо, оно сразу отправляется через следующий. После FAILURE_THRESHOLD
+ошибок подряд (или доли ошибок от ERROR_RATE_THRESHOLD) цепь сервера размыкается,
+и он не используется COOLDOWN секунд; затем через него пробно отправляется одно
+письмо, и при успехе сервер возвращается в работу.
+
+Состояние серверов общее для всех соединений процесса, поэтому сбой, замеченный
+одним потоком отправки, сразу учитывают остальные.
+"""
+import random
+import smtplib
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+from django.core.mail.backends.base import BaseEmailBackend
+from django.core.mail.backends.smtp import EmailBackend
+
+# Количество последних попыток, по которым оценивается здоровье сервера
+HEALTH_WINDOW = 50
+# Минимум попыток в окне, после которого учитывается доля ошибок
+MIN_SAMPLES = 10
+ERROR_RATE_THRESHOLD = 0.5
+FAILURE_THRESHOLD = 5
+# Время, на которое размыкается цепь сервера, секунд
+COOLDOWN = 30
+# Задержка отправки, при которой оценка здоровья снижается вдвое, секунд
+LATENCY_TARGET = 1.0
+# Минимальная оценка здоровья: сервер с ошибками получает малую долю писем, а не выпадает совсем
+MIN_SCORE = 0.01
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half-open'
+
+
+class Relay:
+    """
+    SMTP-сервер с оценкой здоровья и автоматическим выключателем (circuit breaker).
+
+    Атрибуты:
+        name (str): Название сервера в логах и статистике.
+        options (dict): Параметры EmailBackend (host, port, username, password, use_ssl, use_tls, timeout).
+        weight (float): Доля писем относительно других серверов.
+        state (str): Состояние цепи: closed - работает, open - выключен, half-open - пробная отправка.
+    """
+
+    def __init__(self, name, weight=1, **options):
+        self.name = name
+        self.weight = weight
+        self.options = options
+        self.outcomes = deque(maxlen=HEALTH_WINDOW)
+        self.latency = 0.0
+        self.failures = 0
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.lock = threading.Lock()
+
+    @property
+    def error_rate(self):
+        if not self.outcomes:
+            return 0.0
+        return self.outcomes.count(False) / len(self.outcomes)
+
+    @property
+    def score(self):
+        """Оценка здоровья от MIN_SCORE до 1: доля успешных отправок с поправкой на задержку."""
+        return max((1 - self.error_rate) / (1 + self.latency / LATENCY_TARGET), MIN_SCORE)
+
+    def available(self, now=None):
+        """
+        Проверяет, можно ли отправить письмо через сервер.
+
+        По истечении COOLDOWN разомкнутая цепь пропускает одно пробное письмо; если его
+        результат не получен еще за COOLDOWN, пропускается следующее.
+        """
+        now = now or time.monotonic()
+        with self.lock:
+            if self.state != CLOSED and now - self.opened_at >= COOLDOWN:
+                self.state = HALF_OPEN
+                self.opened_at = now
+                return True
+            return self.state == CLOSED
+
+    def record(self, success, latency=None):
+        """Учитывает результат отправки и переключает состояние цепи."""
+        with self.lock:
+            self.outcomes.append(success)
+            if success:
+                self.failures = 0
+                if latency is not None:
+                    # Экспоненциальное скользящее среднее задержки
+                    self.latency = latency if not self.latency else 0.8 * self.latency + 0.2 * latency
+                if self.state == HALF_OPEN:
+                    self.state = CLOSED
+                    self.outcomes.clear()
+                    self.outcomes.append(True)
+                return
+            self.failures += 1
+            if (
+                self.state == HALF_OPEN
+                or self.failures >= FAILURE_THRESHOLD
+                or (len(self.outcomes) >= MIN_SAMPLES and self.error_rate >= ERROR_RATE_THRESHOLD)
+            ):
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+
+    def stats(self):
+        return {
+            'name': self.name,
+            'state': self.state,
+            'weight': self.weight,
+            'score': round(self.score, 3),
+            'error_rate': round(self.error_rate, 3),
+            'latency': round(self.latency, 3),
+        }
+
+
+relays = {}
+relays_lock = threading.Lock()
+
+
+def configured_relays():
+    """
+    Возвращает серверы из settings.EMAIL_RELAYS (или единственный сервер EMAIL_HOST).
+
+    Состояние серверов создается один раз на процесс.
+    """
+    config = settings.EMAIL_RELAYS or [{
+        'name': settings.EMAIL_HOST,
+        'host': settings.EMAIL_HOST,
+        'port': settings.EMAIL_PORT,
+        'username': settings.EMAIL_HOST_USER,
+        'password': settings.EMAIL_HOST_PASSWORD,
+        'use_ssl': settings.EMAIL_USE_SSL,
+    }]
+    result = []
+    with relays_lock:
+        for options in config:
+            options = dict(options)
+            name = options.pop('name', None) or f'{options["host"]}:{options.get("port")}'
+            if name not in relays:
+                relays[name] = Relay(name, **options)
+            result.append(relays[name])
+    return result
+
+
+def choose(candidates):
+    """Выбирает сервер случайно пропорционально весу и оценке здоровья."""
+    weights = [relay.weight * relay.score for relay in candidates]
+    return random.choices(candidates, weights=weights)[0]
+
+
+def relay_stats():
+    """Состояние всех серверов процесса для мониторинга."""
+    return [relay.stats() for relay in configured_relays()]
+
+
+class RouterBackend(BaseEmailBackend):
+    """
+    Почтовый бэкенд, распределяющий письма между несколькими SMTP-серверами.
+
+    Соединения с серверами открываются при первой отправке через них и переиспользуются
+    до close(). Учетная запись, переданная в get_connection(username=..., password=...),
+    заменяет учетные записи серверов.
+
+    Атрибуты:
+        relays (list[Relay]): Настроенные серверы.
+        credentials (dict): Учетная запись, заменяющая учетные записи серверов.
+    """
+
+    def __init__(self, fail_silently=False, username=None, password=None, **kwargs):
+        super().__init__(fail_silently=fail_silently)
+        self.relays = configured_relays()
+        self.credentials = {
+            key: value for key, value in {'username': username, 'password': password}.items() if value is not None
+        }
+        self.backends = {}
+
+    def backend(self, relay):
+        if relay.name not in self.backends:
+            options = {'timeout': settings.EMAIL_TIMEOUT, **relay.options, **self.credentials}
+            self.backends[relay.name] = EmailBackend(fail_silently=False, **options)
+        return self.backends[relay.name]
+
+    def close(self):
+        for backend in self.backends.values():
+            self.discard(backend)
+
+    @staticmethod
+    def discard(backend):
+        """Закрывает соединение с сервером, не обращая внимания на ошибки оборванного соединения."""
+        try:
+            backend.close()
+        except (smtplib.SMTPException, OSError):
+            backend.connection = None
+
+    def send_messages(self, email_messages):
+        sent = 0
+        for message in email_messages:
+            try:
+                sent += self.route(message)
+            except (smtplib.SMTPException, OSError):
+                if not self.fail_silently:
+                    raise
+        return sent
+
+    def route(self, message):
+        """
+        Отправляет письмо через доступные серверы по очереди, пока один из них его не примет.
+
+        Returns:
+            int: 1, если письмо отправлено.
+
+        Raises:
+            smtplib.SMTPException: Все серверы недоступны или отклонили письмо.
+            smtplib.SMTPRecipientsRefused: Сервер отклонил всех получателей; другие серверы не пробуются.
+        """
+        candidates = [relay for relay in self.relays if relay.available()]
+        error = smtplib.SMTPException('Нет доступных SMTP-серверов')
+        while candidates:
+            # Пробное письмо после размыкания цепи отправляется через этот сервер в первую очередь
+            probes = [relay for relay in candidates if relay.state == HALF_OPEN]
+            relay = probes[0] if probes else choose(candidates)
+            candidates.remove(relay)
+            backend = self.backend(relay)
+            started = time.monotonic()
+            try:
+                # Соединение открывается при первом письме через сервер и остается открытым до close()
+                backend.open()
+                backend.send_messages([message])
+            except smtplib.SMTPRecipientsRefused:
+                # Адрес отклонен, сервер исправен: другой сервер ответит так же
+                relay.record(True)
+                raise
+            except (smtplib.SMTPException, OSError) as e:
+                relay.record(False)
+                self.discard(backend)
+                error = e
+                continue
+            relay.record(True, time.monotonic() - started)
+            return 1
+        if isinstance(error, smtplib.SMTPException):
+            raise error
+        # Ошибки соединения (OSError) приводятся к SMTPException, которую обрабатывают вызывающие
+        raise smtplib.SMTPException(f'Ни один SMTP-сервер не принял письмо: {error}') from error
@@ -0,0 +1,44 @@
+from django.conf import settings
+from django.core import signing
+from django.urls import reverse
+
+from mailing.buffers import BatchBuffer
+from mailing.services import suppress_emails
+
+SALT = 'mailing.unsubscribe'
+
+
+def make_token(email):
+    """Подписывает адрес получателя: токен бессрочный и проверяется без обращения к базе."""
+    return signing.dumps(email, salt=SALT, compress=True)
+
+
+def read_token(token):
+    """Возвращает адрес из токена или None, если подпись неверна."""
+    try:
+        return signing.loads(token, salt=SALT)
+    except signing.BadSignature:
+        return None
+
+
+def unsubscribe_url(email):
+    return settings.SITE_URL + reverse('mailing:unsubscribe', args=[make_token(email)])
+
+
+def unsubscribe_headers(url):
+    """Заголовки отписки в один клик (RFC 2369 и RFC 8058)."""
+    return {
+        'List-Unsubscribe': f'<{url}>',
+        'List-Unsubscribe-Post': 'List-Unsubscribe=One-Click',
+    }
+
+
+def flush_opt_outs(batch):
+    suppress_emails(batch, 'unsubscribe', comment='Отписка по ссылке из письма')
+
+
+opt_outs = BatchBuffer(
+    flush_opt_outs,
+    interval=settings.TRACKING_FLUSH_INTERVAL,
+    batch_size=settings.TRACKING_BATCH_SIZE,
+)
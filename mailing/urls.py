@@ -5,7 +5,9 @@ from mailing.apps import MailingConfig
 from mailing.views import (
     Homepage, ContactTemplateView, ClientListView, ClientCreateView, ClientDetailView, ClientUpdateView,
     ClientDeleteView, MessageCreateView, MessageListView, MessageDetailView, MessageUpdateView, MessageDeleteView,
-    NewsletterCreateView, NewsletterUpdateView, NewsletterListView, NewsletterDetailView, NewsletterDeleteView, LogsListView
+    NewsletterCreateView, NewsletterUpdateView, NewsletterListView, NewsletterDetailView, NewsletterDeleteView, LogsListView,
+    track_open, track_click, unsubscribe, db_stats, client_search, message_search, client_autocomplete,
+    newsletter_control, newsletter_progress,
 )
 
 app_name = MailingConfig.name
@@ -19,18 +21,29 @@ urlpatterns = [
     path('view_client/<int:pk>', ClientDetailView.as_view(), name='view_client'),
     path('edit_client/<int:pk>', ClientUpdateView.as_view(), name='edit_client'),
     path('delete_client/<int:pk>', ClientDeleteView.as_view(), name='delete_client'),
+    path('client_search/', client_search, name='client_search'),
+    path('client_autocomplete/', client_autocomplete, name='client_autocomplete'),
 
     path('message/create', MessageCreateView.as_view(), name='create_message'),
     path('message/list', MessageListView.as_view(), name='list_message'),
     path('message/view/<int:pk>', MessageDetailView.as_view(), name='view_message'),
     path('message/edit/<int:pk>', MessageUpdateView.as_view(), name='edit_message'),
     path('message/delete/<int:pk>', MessageDeleteView.as_view(), name='delete_message'),
+    path('message/search', message_search, name='search_message'),
 
     path('newsletter/create', NewsletterCreateView.as_view(), name='create_newsletter'),
     path('newsletter/edit/<int:pk>', NewsletterUpdateView.as_view(), name='edit_newsletter'),
     path('newsletter/list', NewsletterListView.as_view(), name='list_newsletter'),
     path('newsletter/view/<int:pk>', NewsletterDetailView.as_view(), name='view_newsletter'),
     path('newsletter/delete/<int:pk>', NewsletterDeleteView.as_view(), name='delete_newsletter'),
+    path('newsletter/control/<int:pk>', newsletter_control, name='control_newsletter'),
+    path('newsletter/progress/<int:pk>', newsletter_progress, name='progress_newsletter'),
 
     path('logs/', LogsListView.as_view(), name='logs_list'),
+
+    path('t/o/<str:token>', track_open, name='track_open'),
+    path('t/c/<str:token>', track_click, name='track_click'),
+    path('unsubscribe/<str:token>', unsubscribe, name='unsubscribe'),
+
+    path('db_stats/', db_stats, name='db_stats'),
 ]
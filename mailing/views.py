@@ -1,24 +1,45 @@
+from asgiref.sync import sync_to_async
+from django.contrib.admin.views.decorators import staff_member_required
+from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.http import Http404
-from django.shortcuts import render
+from django.contrib.auth.views import redirect_to_login
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.shortcuts import render, redirect
 from django.urls import reverse_lazy
-from django.views.generic import TemplateView, CreateView, UpdateView, ListView, DetailView, DeleteView
-from mailing.services import homepage_cache
-
-from mailing.models import Client, Message, Newsletter, Contact, Logs
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_http_methods
+from django.views.generic import View, TemplateView, CreateView, UpdateView, ListView, DetailView, DeleteView
+from config.asyncviews import arender
+from config.db import connection_stats
+from config.replica import ReplicaReadMixin
+from mailing import control, progress
+from mailing.permissions import ScopedQuerysetMixin, get_scope
+from mailing.search import AUTOCOMPLETE_PAGE_SIZE, prefix_search, ranked, search_clients, search_response
+from mailing.services import ahomepage_cache
+from mailing import unsubscribe as unsubscribe_tokens
+from mailing.tracking import PIXEL, anewsletter_stats, read_token, record_event
+
+from mailing.models import Client, Message, Newsletter, Contact, Logs, Segment
 from mailing.forms import ClientForm, MessageForm, NewsletterForm
 
 
-class Homepage(TemplateView):
+class Homepage(View):
     """
     Представление для главной страницы.
 
+    Асинхронное: кэш и база данных опрашиваются без блокировки рабочего потока.
     Отображает базовый шаблон 'mailing/base.html' с дополнительным контекстом:
     - title: Заголовок страницы ('Mailing')
-    - filtred_list: Результат кеширования случайных статей блога, полученный с помощью homepage_cache
+    - filtred_list: Результат кеширования случайных статей блога, полученный с помощью ahomepage_cache
+
+    Атрибуты:
+        template_name (str): Имя шаблона для отображения ('mailing/base.html').
     """
     template_name = 'mailing/base.html'
-    extra_context = {'title': 'Mailing', 'filttred_list': homepage_cache}
+
+    async def get(self, request):
+        context = {'title': 'Mailing', 'filtred_list': await ahomepage_cache()}
+        return await arender(request, self.template_name, context)
 
 
 class ClientCreateView(LoginRequiredMixin, CreateView):
@@ -47,33 +68,29 @@ class ClientCreateView(LoginRequiredMixin, CreateView):
         return super().form_valid(form)
 
 
-class ClientUpdateView(LoginRequiredMixin, UpdateView):
+class ClientUpdateView(LoginRequiredMixin, ScopedQuerysetMixin, UpdateView):
     """
     Представление для обновления информации о клиенте.
 
     Требует, чтобы пользователь был авторизован для доступа.
     Использует общее представление 'UpdateView' для формы обновления информации о клиенте.
+    Изменять можно только клиентов из области видимости пользователя.
 
     Атрибуты:
         model (Client): Модель клиента, с которой работает представление.
         fields (tuple): Поля модели, которые будут доступны для обновления.
         success_url (str): URL для перенаправления после успешного обновления информации о клиенте.
         login_url (str): URL для перенаправления на страницу входа, если пользователь не авторизован.
+        scope_action (str): Действие, для которого проверяется доступ.
     """
     model = Client
-    fields = ('fio', 'email', 'comment',)
+    fields = ('fio', 'email', 'comment', 'attributes',)
     success_url = reverse_lazy('mailing:client_list')
     login_url = 'users:login'
-
-    def get_object(self, queryset=None):
-        self.object = super().get_object(queryset)
-        if self.object.owner == self.request.user or self.request.user.is_superuser:
-            return self.object
-        else:
-            raise Http404
+    scope_action = 'change'
 
 
-class ClientListView(LoginRequiredMixin, ListView):
+class ClientListView(LoginRequiredMixin, ScopedQuerysetMixin, ReplicaReadMixin, ListView):
     """
     Представление для списка клиентов.
 
@@ -89,20 +106,13 @@ class ClientListView(LoginRequiredMixin, ListView):
     success_url = reverse_lazy('mailing:client_list')
     login_url = 'users:login'
 
-    def get_queryset(self):
-        queryset = super().get_queryset()
-        queryset = queryset.filter(id=self.kwargs.get('pk'))
-        if not self.request.user.is_staff:
-            queryset = queryset.filter(owner=self.request.user)
-        return queryset
-
     def get_context_data(self, *args, **kwargs):
         context_data = super().get_context_data(*args, **kwargs)
-        context_data['clients_list'] = Client.objects.all()
+        context_data['clients_list'] = self.object_list
         return context_data
 
 
-class ClientDetailView(LoginRequiredMixin, DetailView):
+class ClientDetailView(LoginRequiredMixin, ScopedQuerysetMixin, DetailView):
     """
     Представление для детальной информации о клиенте.
 
@@ -117,7 +127,7 @@ class ClientDetailView(LoginRequiredMixin, DetailView):
     login_url = 'users:login'
 
 
-class ClientDeleteView(LoginRequiredMixin, DeleteView):
+class ClientDeleteView(LoginRequiredMixin, ScopedQuerysetMixin, DeleteView):
     """
     Представление для удаления клиента.
 
@@ -128,10 +138,12 @@ class ClientDeleteView(LoginRequiredMixin, DeleteView):
         model (Client): Модель клиента, с которой работает представление.
         success_url (str): URL для перенаправления после успешного удаления клиента.
         login_url (str): URL для перенаправления на страницу входа, если пользователь не авторизован.
+        scope_action (str): Действие, для которого проверяется доступ.
     """
     model = Client
     success_url = reverse_lazy('mailing:client_list')
     login_url = 'users:login'
+    scope_action = 'delete'
 
 
 class MessageCreateView(LoginRequiredMixin, CreateView):
@@ -160,7 +172,7 @@ class MessageCreateView(LoginRequiredMixin, CreateView):
         return super().form_valid(form)
 
 
-class MessageUpdateView(LoginRequiredMixin, UpdateView):
+class MessageUpdateView(LoginRequiredMixin, ScopedQuerysetMixin, UpdateView):
     """
     Представление для обновления сообщения.
 
@@ -172,20 +184,16 @@ class MessageUpdateView(LoginRequiredMixin, UpdateView):
         form_class (MessageForm): Класс формы для обновления сообщения.
         success_url (str): URL для перенаправления после успешного обновления сообщения.
         login_url (str): URL для перенаправления на страницу входа, если пользователь не авторизован.
+        scope_action (str): Действие, для которого проверяется доступ.
     """
     model = Message
     form_class = MessageForm
     success_url = reverse_lazy('mailing:list_message')
     login_url = 'users:login'
-
-    def get_object(self, queryset=None):
-        self.object = super().get_object(queryset)
-        if self.object.owner != self.request.user:
-            raise Http404
-        return self.object
+    scope_action = 'change'
 
 
-class MessageListView(LoginRequiredMixin, ListView):
+class MessageListView(LoginRequiredMixin, ScopedQuerysetMixin, ListView):
     """
     Представление для списка сообщений.
 
@@ -203,11 +211,11 @@ class MessageListView(LoginRequiredMixin, ListView):
 
     def get_context_data(self, *args, **kwargs):
         context_data = super().get_context_data(*args, **kwargs)
-        context_data['messages_list'] = Message.objects.all()
+        context_data['messages_list'] = self.object_list
         return context_data
 
 
-class MessageDetailView(LoginRequiredMixin, DetailView):
+class MessageDetailView(LoginRequiredMixin, ScopedQuerysetMixin, DetailView):
     """
     Представление для детальной информации о сообщении.
 
@@ -221,7 +229,7 @@ class MessageDetailView(LoginRequiredMixin, DetailView):
     model = Message
 
 
-class MessageDeleteView(LoginRequiredMixin, DeleteView):
+class MessageDeleteView(LoginRequiredMixin, ScopedQuerysetMixin, DeleteView):
     """
     Представление для удаления сообщения.
 
@@ -232,13 +240,28 @@ class MessageDeleteView(LoginRequiredMixin, DeleteView):
         model (Message): Модель сообщения, с которой работает представление.
         success_url (str): URL для перенаправления после успешного удаления сообщения.
         login_url (str): URL для перенаправления на страницу входа, если пользователь не авторизован.
+        scope_action (str): Действие, для которого проверяется доступ.
     """
     model = Message
     success_url = reverse_lazy('mailing:list_message')
     login_url = 'users:login'
+    scope_action = 'delete'
+
+
+class NewsletterAudienceMixin:
+    """
+    Миксин форм рассылки: клиенты и сегменты выбираются только из области видимости пользователя.
+    """
 
+    def get_form(self, form_class=None):
+        form = super().get_form(form_class)
+        scope = get_scope(self.request)
+        form.fields['client'].queryset = scope.filter(Client.objects.all())
+        form.fields['segment'].queryset = scope.filter(Segment.objects.all())
+        return form
 
-class NewsletterCreateView(LoginRequiredMixin, CreateView):
+
+class NewsletterCreateView(LoginRequiredMixin, NewsletterAudienceMixin, CreateView):
     """
     Представление для создания нового информационного бюллетеня.
 
@@ -264,7 +287,7 @@ class NewsletterCreateView(LoginRequiredMixin, CreateView):
         return super().form_valid(form)
 
 
-class NewsletterUpdateView(LoginRequiredMixin, UpdateView):
+class NewsletterUpdateView(LoginRequiredMixin, ScopedQuerysetMixin, NewsletterAudienceMixin, UpdateView):
     """
     Представление для обновления информационного бюллетеня.
 
@@ -273,24 +296,19 @@ class NewsletterUpdateView(LoginRequiredMixin, UpdateView):
 
     Атрибуты:
         model (Newsletter): Модель информационного бюллетеня, с которой работает представление.
-        fields (tuple): Поля модели, доступные для обновления.
+        form_class (NewsletterForm): Класс формы для обновления информационного бюллетеня.
         success_url (str): URL для перенаправления после успешного обновления информационного бюллетеня.
         login_url (str): URL для перенаправления на страницу входа, если пользователь не авторизован.
+        scope_action (str): Действие, для которого проверяется доступ.
     """
     model = Newsletter
-    fields = ('start_time', 'end_time', 'periodicity', 'status', 'client', 'message')
+    form_class = NewsletterForm
     success_url = reverse_lazy('mailing:list_newsletter')
     login_url = 'users:login'
-
-    def get_object(self, queryset=None):
-        self.object = super().get_object(queryset)
-        if self.object.owner == self.request.user or self.request.user.is_superuser:
-            return self.object
-        else:
-            raise Http404
+    scope_action = 'change'
 
 
-class NewsletterListView(LoginRequiredMixin, ListView):
+class NewsletterListView(LoginRequiredMixin, ScopedQuerysetMixin, ReplicaReadMixin, ListView):
     """
     Представление для списка информационных бюллетеней.
 
@@ -308,40 +326,52 @@ class NewsletterListView(LoginRequiredMixin, ListView):
 
     def get_context_data(self, *args, **kwargs):
         context_data = super().get_context_data(*args, **kwargs)
-        context_data['newsletters_list'] = Newsletter.objects.all()
-        unique_clients = Client.objects.all().count()
+        context_data['newsletters_list'] = self.object_list
+        unique_clients = get_scope(self.request).filter(Client.objects.all()).count()
         context_data['clients'] = unique_clients
         return context_data
 
     def get_queryset(self):
-        queryset = super().get_queryset()
-        queryset = queryset.filter(id=self.kwargs.get('pk'))
-        if not self.request.user.is_staff:
-            queryset = queryset.filter(owner=self.request.user)
-        return queryset
+        return super().get_queryset().select_related('message')
 
 
-class NewsletterDetailView(DetailView):
+class NewsletterDetailView(View):
     """
     Представление для детальной информации об информационном бюллетене.
 
-    Требует, чтобы пользователь был авторизован для доступа.
-    Использует общее представление 'DetailView' для отображения детальной информации об информационном бюллетене.
+    Требует, чтобы пользователь был авторизован для доступа; рассылка ищется
+    в области видимости пользователя (см. mailing/permissions.py).
+    Асинхронное: рассылка, её клиенты и показатели вовлеченности загружаются
+    через асинхронный ORM до рендеринга шаблона.
 
     Атрибуты:
-        model (Newsletter): Модель информационного бюллетеня, с которой работает представление.
+        template_name (str): Имя шаблона для отображения.
+        login_url (str): URL для перенаправления на страницу входа, если пользователь не авторизован.
     """
-    model = Newsletter
+    template_name = 'mailing/newsletter_detail.html'
+    login_url = 'users:login'
 
-    def get_queryset(self):
-        queryset = super().get_queryset()
-        queryset = queryset.filter(id=self.kwargs.get('pk'))
-        if not self.request.user.is_staff:
-            queryset = queryset.filter(owner=self.request.user)
-        return queryset
+    async def get(self, request, pk):
+        user = await request.auser()
+        if not user.is_authenticated:
+            return redirect_to_login(request.get_full_path(), self.login_url)
+
+        scope = await sync_to_async(get_scope)(request)
+        queryset = scope.filter(Newsletter.objects.select_related('message').prefetch_related('client'))
+        try:
+            newsletter = await queryset.aget(pk=pk)
+        except Newsletter.DoesNotExist:
+            raise Http404
 
+        context = {
+            'object': newsletter,
+            'newsletter': newsletter,
+            'stats': await anewsletter_stats(newsletter),
+        }
+        return await arender(request, self.template_name, context)
 
-class NewsletterDeleteView(LoginRequiredMixin, DeleteView):
+
+class NewsletterDeleteView(LoginRequiredMixin, ScopedQuerysetMixin, DeleteView):
     """
     Представление для удаления информационного бюллетеня.
 
@@ -352,10 +382,12 @@ class NewsletterDeleteView(LoginRequiredMixin, DeleteView):
         model (Newsletter): Модель информационного бюллетеня, с которой работает представление.
         success_url (str): URL для перенаправления после успешного удаления информационного бюллетеня.
         login_url (str): URL для перенаправления на страницу входа, если пользователь не авторизован.
+        scope_action (str): Действие, для которого проверяется доступ.
     """
     model = Newsletter
     success_url = reverse_lazy('mailing:list_newsletter')
     login_url = 'users:login'
+    scope_action = 'delete'
 
 
 class ContactTemplateView(TemplateView):
@@ -384,12 +416,13 @@ class ContactTemplateView(TemplateView):
         return render(request, self.template_name)
 
 
-class LogsListView(LoginRequiredMixin, ListView):
+class LogsListView(LoginRequiredMixin, ReplicaReadMixin, ListView):
     """
     Представление для списка логов.
 
     Требует, чтобы пользователь был авторизован для доступа.
     Использует общее представление 'ListView' для отображения списка логов.
+    Запросы на чтение выполняются на реплике базы данных, если она настроена.
 
     Атрибуты:
         model (Logs): Модель логов, с которой работает представление.
@@ -407,3 +440,165 @@ class LogsListView(LoginRequiredMixin, ListView):
         context_data['successful_count'] = Logs.objects.filter(attempt=True).count()
         context_data['unsuccessful_count'] = Logs.objects.filter(attempt=False).count()
         return context_data
+
+
+async def track_open(request, token):
+    """
+    Отдает пиксель отслеживания и регистрирует открытие письма.
+
+    Подпись токена проверяется без обращения к базе данных, событие только
+    ставится в буфер, который пакетно записывает фоновый поток, поэтому
+    представление асинхронное и не занимает рабочий поток.
+    """
+    values = read_token(token)
+    # Токены открытия и перехода подписаны одной солью и различаются числом значений
+    if values is not None and len(values) == 2:
+        record_event('open', *values)
+    response = HttpResponse(PIXEL, content_type='image/gif')
+    response['Cache-Control'] = 'no-store'
+    return response
+
+
+async def track_click(request, token):
+    """
+    Регистрирует переход по ссылке из письма и перенаправляет на исходный адрес.
+    """
+    values = read_token(token)
+    if values is None or len(values) != 3:
+        raise Http404
+    newsletter_id, client_id, url = values
+    record_event('click', newsletter_id, client_id, url)
+    return redirect(url)
+
+
+@csrf_exempt
+def unsubscribe(request, token):
+    """
+    Отписка получателя от рассылок.
+
+    GET показывает страницу подтверждения, POST (в том числе отписка в один клик
+    по заголовку List-Unsubscribe-Post) ставит адрес в очередь на добавление в список
+    подавления. Токен проверяется по подписи, без обращения к базе данных.
+    """
+    email = unsubscribe_tokens.read_token(token)
+    if email is None:
+        raise Http404
+    if request.method == 'POST':
+        unsubscribe_tokens.opt_outs.append(email)
+        return render(request, 'mailing/unsubscribe.html', {'email': email, 'done': True})
+    return render(request, 'mailing/unsubscribe.html', {'email': email})
+
+
+@staff_member_required
+def db_stats(request):
+    """
+    Статистика соединений с базой данных для персонала в формате JSON.
+
+    Счетчики относятся к процессу, обработавшему запрос: сколько соединений он открыл
+    и какая доля запросов обслужена уже открытым соединением.
+    """
+    return JsonResponse(connection_stats())
+
+
+async def newsletter_progress(request, pk):
+    """
+    Прогресс рассылки потоком Server-Sent Events: отправлено, ошибок, осталось и скорость.
+
+    Счетчики читаются из кеша, куда их публикует поток отправки (mailing/progress.py);
+    база данных опрашивается один раз - для проверки доступа к рассылке.
+    """
+    user = await request.auser()
+    if not user.is_authenticated:
+        return HttpResponse(status=403)
+
+    scope = await sync_to_async(get_scope)(request)
+    if not await scope.filter(Newsletter.objects.filter(pk=pk)).aexists():
+        raise Http404
+
+    response = StreamingHttpResponse(progress.events(pk), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Отключение буферизации ответа в nginx
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@login_required(login_url='users:login')
+@require_http_methods(['GET', 'POST'])
+def newsletter_control(request, pk):
+    """
+    Управление идущей рассылкой (JSON).
+
+    GET возвращает текущую запись управления. POST с параметром action меняет ее:
+    pause, resume, throttle (с параметром rate - писем в секунду, пустое значение снимает
+    ограничение) или abort. Потоки отправки применяют изменение в течение нескольких секунд.
+    Доступно пользователям с правом изменения рассылки.
+    """
+    newsletters = get_scope(request).filter(Newsletter.objects.filter(pk=pk), 'change')
+    if not newsletters.exists():
+        raise Http404
+
+    if request.method == 'POST':
+        action = request.POST.get('action')
+        if action not in control.ACTIONS:
+            return JsonResponse({'error': f'Неизвестное действие: {action}'}, status=400)
+        if action == 'throttle':
+            try:
+                rate = float(request.POST['rate']) if request.POST.get('rate') else None
+            except ValueError:
+                return JsonResponse({'error': 'rate должно быть числом'}, status=400)
+            if rate is not None and rate <= 0:
+                return JsonResponse({'error': 'rate должно быть больше нуля'}, status=400)
+            control.throttle(newsletters, rate)
+        else:
+            getattr(control, action)(newsletters)
+
+    return JsonResponse({'id': pk, **control.get_control(pk)})
+
+
+@login_required(login_url='users:login')
+def client_search(request):
+    """
+    Полнотекстовый поиск клиентов из области видимости пользователя (JSON, по страницам).
+    """
+    queryset = get_scope(request).filter(Client.objects.all())
+    return search_response(request, queryset, search_clients, ('fio', 'email'))
+
+
+@login_required(login_url='users:login')
+def message_search(request):
+    """
+    Полнотекстовый поиск сообщений из области видимости пользователя (JSON, по страницам).
+    """
+    queryset = get_scope(request).filter(Message.objects.all())
+    return search_response(request, queryset, ranked, ('subject',))
+
+
+async def client_autocomplete(request):
+    """
+    Автодополнение клиентов для выбора получателей рассылки (JSON, по страницам).
+
+    Ищет по началу адреса почты или ФИО среди клиентов из области видимости
+    пользователя. Вместо подсчета общего числа результатов выбирается на одну строку
+    больше страницы, чтобы определить, есть ли следующая.
+    """
+    user = await request.auser()
+    if not user.is_authenticated:
+        return JsonResponse({'results': [], 'page': 1, 'has_more': False}, status=403)
+
+    query = request.GET.get('q', '').strip()
+    try:
+        page = max(int(request.GET.get('page', 1)), 1)
+    except ValueError:
+        page = 1
+    if not query:
+        return JsonResponse({'results': [], 'page': page, 'has_more': False})
+
+    scope = await sync_to_async(get_scope)(request)
+    queryset = prefix_search(scope.filter(Client.objects.all()), query).values('id', 'email', 'fio')
+    offset = (page - 1) * AUTOCOMPLETE_PAGE_SIZE
+    rows = [row async for row in queryset[offset:offset + AUTOCOMPLETE_PAGE_SIZE + 1]]
+    return JsonResponse({
+        'results': rows[:AUTOCOMPLETE_PAGE_SIZE],
+        'page': page,
+        'has_more': len(rows) > AUTOCOMPLETE_PAGE_SIZE,
+    })
@@ -0,0 +1,45 @@
+// Автодополнение выбора клиентов рассылки (см. ClientAutocompleteWidget)
+document.addEventListener('DOMContentLoaded', function () {
+    document.querySelectorAll('select[data-autocomplete-url]').forEach(function (select) {
+        var input = document.createElement('input');
+        input.type = 'search';
+        input.className = 'form-control mb-1';
+        input.placeholder = 'Начните вводить почту или ФИО';
+        select.parentNode.insertBefore(input, select);
+
+        var timer = null;
+        var page = 1;
+
+        function load(append) {
+            var url = select.dataset.autocompleteUrl + '?q=' + encodeURIComponent(input.value.trim()) + '&page=' + page;
+            fetch(url, {credentials: 'same-origin'})
+                .then(function (response) { return response.json(); })
+                .then(function (data) {
+                    // Выбранные клиенты остаются в списке, найденные добавляются после них
+                    Array.from(select.options).forEach(function (option) {
+                        if (!option.selected && !append) option.remove();
+                    });
+                    data.results.forEach(function (client) {
+                        if (select.querySelector('option[value="' + client.id + '"]')) return;
+                        select.add(new Option('ФИО: ' + client.fio + ', почта: ' + client.email, client.id));
+                    });
+                    select.dataset.hasMore = data.has_more ? '1' : '';
+                });
+        }
+
+        input.addEventListener('input', function () {
+            clearTimeout(timer);
+            page = 1;
+            timer = setTimeout(function () { load(false); }, 250);
+        });
+
+        // Следующая страница подгружается при прокрутке списка до конца
+        select.addEventListener('scroll', function () {
+            if (select.dataset.hasMore && select.scrollTop + select.clientHeight >= select.scrollHeight - 5) {
+                select.dataset.hasMore = '';
+                page += 1;
+                load(true);
+            }
+        });
+    });
+});
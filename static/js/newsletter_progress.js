@@ -0,0 +1,22 @@
+// Прогресс текущего запуска рассылки из потока Server-Sent Events (см. mailing/progress.py)
+document.addEventListener('DOMContentLoaded', function () {
+    var STATES = {
+        running: 'идет отправка',
+        paused: 'приостановлен',
+        suspended: 'продолжится при следующем запуске',
+        finished: 'завершен',
+        aborted: 'отменен'
+    };
+    document.querySelectorAll('[data-progress-url]').forEach(function (block) {
+        var source = new EventSource(block.dataset.progressUrl);
+        source.onmessage = function (event) {
+            var progress = JSON.parse(event.data);
+            block.hidden = !progress;
+            if (!progress) return;
+            block.querySelectorAll('[data-field]').forEach(function (field) {
+                var value = progress[field.dataset.field];
+                field.textContent = field.dataset.field === 'state' ? STATES[value] || value : value;
+            });
+        };
+    });
+});
@@ -1,14 +1,13 @@
 import secrets
 from random import random
 
-from django.conf import settings
 from django.contrib.auth.mixins import LoginRequiredMixin, PermissionRequiredMixin, UserPassesTestMixin
-from django.core.mail import send_mail
 from django.shortcuts import redirect, get_object_or_404
 from django.urls import reverse_lazy, reverse
 from django.views.generic import CreateView, UpdateView, DetailView, DeleteView, ListView
 from users.forms import UserRegisterForm, UserProfileForm
 
+from mailing.lanes import send_transactional
 from mailing.services import send_newpassword
 from users.models import User
 
@@ -35,7 +34,7 @@ class RegisterView(CreateView):
         Обработка валидности формы для регистрации пользователя.
 
         Генерирует токен регистрации, устанавливает пользователя как неактивного,
-        отправляет электронное письмо со ссылкой для подтверждения.
+        отправляет электронное письмо со ссылкой для подтверждения через полосу служебных писем.
         """
         new_user = form.save()
         new_user.is_active = False
@@ -44,10 +43,9 @@ class RegisterView(CreateView):
         new_user.save()
         host = self.request.get_host()
         url = f'http://{host}/users/confirm/{token}'
-        send_mail(
+        send_transactional(
             subject='Подтверждение регистрации',
             message=f'Перейдите по ссылке для подтверждения регистрации {url}!',
-            from_email=settings.EMAIL_HOST_USER,
             recipient_list=[new_user.email]
         )
         return super().form_valid(form)